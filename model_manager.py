@@ -1,12 +1,13 @@
 import argparse
+import glob
 import logging
 import traceback
 import yaml
 logging.getLogger("sagemaker.config").setLevel(logging.WARNING)
 logging.getLogger("botocore.credentials").setLevel(logging.WARNING)
 import os
-from src.sagemaker.create_model import deploy_huggingface_model, deploy_model
-from src.sagemaker.fine_tune_model import fine_tune_model
+# Heavy dependencies (sagemaker, transformers, ...) are imported in the code
+# path that needs them so the CLI starts quickly.
 from src.schemas.deployment import Deployment
 from src.schemas.model import Model
 
@@ -32,9 +33,96 @@ if __name__ == '__main__':
     )
     parser.add_argument(
         "--deploy",
-        help="path to YAML deployment configuration file",
+        help="paths to YAML deployment configuration files or directories of them. Several are deployed concurrently.",
+        nargs="+",
         type=str
     )
+    parser.add_argument(
+        "--delete",
+        help="delete every endpoint whose name matches this glob pattern, along with its endpoint config and model",
+        type=str
+    )
+    parser.add_argument(
+        "--older-than",
+        help="with --delete, only delete endpoints created longer ago than this, e.g. 12h or 7d",
+        type=str
+    )
+    parser.add_argument(
+        "-y",
+        "--yes",
+        help="don't ask for confirmation before deleting",
+        action="store_true")
+    parser.add_argument(
+        "--query-file",
+        help="JSONL file of queries to send to --endpoint, one per line. Rerun with the same --output to resume.",
+        type=str
+    )
+    parser.add_argument(
+        "--transform",
+        help="path to a YAML deployment configuration file. Scores --query-file (local or S3) with a Batch Transform job instead of an endpoint.",
+        type=str
+    )
+    parser.add_argument(
+        "--endpoint",
+        help="endpoint to query with --query-file",
+        type=str
+    )
+    parser.add_argument(
+        "--output",
+        help="with --query-file, where to write the responses (defaults to <query-file>.out.jsonl)",
+        type=str
+    )
+    parser.add_argument(
+        "--concurrency",
+        help="with --query-file, the most queries in flight at once",
+        type=int
+    )
+    parser.add_argument(
+        "--rate",
+        help="with --query-file, the most queries per second. Lowered automatically when the endpoint throttles.",
+        type=float
+    )
+    parser.add_argument(
+        "--unordered",
+        help="with --query-file, write responses as they arrive instead of in input order",
+        action="store_true")
+    parser.add_argument(
+        "--bench",
+        help="load test --endpoint: closed-loop at --concurrency clients, or open-loop at --rate queries per second",
+        action="store_true")
+    parser.add_argument(
+        "--duration",
+        help="with --bench, seconds to measure for",
+        type=float,
+        default=30
+    )
+    parser.add_argument(
+        "--warmup",
+        help="with --bench, seconds to send queries for before measuring",
+        type=float,
+        default=5
+    )
+    parser.add_argument(
+        "--prompt-tokens",
+        help="with --bench, prompt length in tokens: a number, a range like 64:512 or a list like 64,256,1024",
+        type=str,
+        default="128"
+    )
+    parser.add_argument(
+        "--max-new-tokens",
+        help="with --bench, max_new_tokens per query, in the same format as --prompt-tokens",
+        type=str,
+        default="128"
+    )
+    parser.add_argument(
+        "--model",
+        help="with --bench, the model to benchmark on a multi-model --endpoint",
+        type=str
+    )
+    parser.add_argument(
+        "--stream",
+        help="with --bench, stream responses and measure time to first token (TGI endpoints)",
+        action="store_true")
     parser.add_argument(
         "--train",
         help="path to YAML training configuration file",
@@ -54,28 +142,101 @@ if __name__ == '__main__':
         loglevel = logging.INFO
 
     if args.hf is not None:
+        from src.sagemaker.create_model import deploy_huggingface_model
         instance_type = args.instance or "ml.m5.xlarge"
         predictor = deploy_huggingface_model(args.hf, instance_type)
         quit()
 
     if args.deploy is not None:
+        from src.sagemaker.create_model import deploy_model, deploy_multi_model
+        from src.sagemaker.rollout import deploy_models
         try:
-            deployment = None
-            model = None
-            with open(args.deploy) as config:
-                configuration = yaml.safe_load(config)
+            paths = []
+            for path in args.deploy:
+                if os.path.isdir(path):
+                    paths.extend(sorted(glob.glob(os.path.join(path, "*.yaml"))))
+                else:
+                    paths.append(path)
+
+            configs = []
+            multi_model_configs = []
+            for path in paths:
+                with open(path) as config:
+                    configuration = yaml.safe_load(config)
+
+                # Skip training configs in directories
+                if configuration is None or configuration.get('deployment') is None:
+                    continue
                 deployment = configuration['deployment']
+                if deployment.multi_model:
+                    multi_model_configs.append(
+                        (deployment, configuration['models']))
+                    continue
 
-                # TODO: Support multi-model endpoints
                 model = configuration['models'][0]
-            deploy_model(deployment, model)
+                configs.append((deployment, model))
+
+            if len(configs) == 1:
+                deploy_model(*configs[0])
+            elif len(configs) > 1:
+                deploy_models(configs)
+
+            for deployment, models in multi_model_configs:
+                deploy_multi_model(deployment, models)
         except:
             traceback.print_exc()
             print("File not found")
 
         quit()
 
+    if args.delete is not None:
+        from src.sagemaker.delete_model import delete_sagemaker_model, list_all_endpoints, parse_age, select_endpoints
+        older_than = parse_age(args.older_than) if args.older_than else None
+        endpoint_names = select_endpoints(
+            list_all_endpoints(), args.delete, older_than)
+        if len(endpoint_names) > 0 and not args.yes:
+            import inquirer
+            print("\n".join(endpoint_names))
+            if not inquirer.confirm(f"Delete these {len(endpoint_names)} endpoints?", default=False):
+                quit()
+        delete_sagemaker_model(endpoint_names)
+        quit()
+
+    if args.transform is not None:
+        if args.query_file is None:
+            parser.error("--transform requires --query-file")
+        from src.sagemaker.transform import transform
+        try:
+            with open(args.transform) as config:
+                configuration = yaml.safe_load(config)
+            transform(configuration['deployment'],
+                      configuration['models'][0], args.query_file, args.output)
+        except:
+            traceback.print_exc()
+            print("File not found")
+
+        quit()
+
+    if args.bench:
+        if args.endpoint is None:
+            parser.error("--bench requires --endpoint")
+        from src.sagemaker.bench import bench
+        bench(args.endpoint, model_id=args.model, output_path=args.output, prompt_tokens=args.prompt_tokens,
+              max_new_tokens=args.max_new_tokens, duration=args.duration, warmup=args.warmup,
+              concurrency=args.concurrency or 8, rate=args.rate, stream=args.stream)
+        quit()
+
+    if args.query_file is not None:
+        from src.sagemaker.batch_query import QUERY_CONCURRENCY, query_file
+        if args.endpoint is None:
+            parser.error("--query-file requires --endpoint")
+        query_file(args.query_file, args.endpoint, args.output,
+                   concurrency=args.concurrency or QUERY_CONCURRENCY, rate=args.rate, ordered=not args.unordered)
+        quit()
+
     if args.train is not None:
+        # Also registers the !Training yaml tag
+        from src.sagemaker.fine_tune_model import fine_tune_model
         try:
             train = None
             model = None
@@ -1,16 +1,53 @@
+import asyncio
 import uvicorn
 import os
+from contextlib import asynccontextmanager
 from dotenv import dotenv_values
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from src import metrics
 from src.config import get_config_for_endpoint, get_endpoints_for_model
+from src.router import Router
+from src.sagemaker.async_inference import AsyncInference, AsyncStatus, get_async_result, get_async_status, get_async_store, submit_async_request
+from src.sagemaker.batching import MicroBatcher
 from src.sagemaker.resources import get_sagemaker_endpoint
-from src.sagemaker.query_endpoint import make_query_request
+from src.sagemaker.response_cache import get_response_cache_from_env
+from src.sagemaker.query_endpoint import QueryRequest, build_query_request_async, invoke_query_request_async
+from src.sagemaker.runtime import close_async_runtime
+from src.sagemaker.streaming import is_tgi_model, stream_chat_completion
+from src.schemas.deployment import Deployment
+from src.schemas.model import Model
 from src.schemas.query import Query, ChatCompletion
 from src.session import session
-from litellm import completion
+from src.tracing import TracingMiddleware, set_attributes, start_span
+from typing import Optional, Tuple
 
 os.environ["AWS_REGION_NAME"] = session.region_name
-app = FastAPI()
+
+# Opt-in: coalesce concurrent queries to list-capable endpoints into one invoke
+batcher = MicroBatcher() if os.environ.get(
+    "MODEL_MANAGER_BATCHING", "").lower() in ("1", "true") else None
+
+# Opt-in: serve repeated deterministic queries from cache
+response_cache = get_response_cache_from_env()
+
+# Spreads chat completions across every endpoint serving the requested model
+router = Router()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_async_runtime()
+    metrics.mark_process_dead()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
+if response_cache is not None:
+    response_cache.on_lookup = metrics.record_cache_lookup
 
 
 class NotDeployedException(Exception):
@@ -22,36 +59,155 @@ def get_endpoint(endpoint_name: str):
     return get_sagemaker_endpoint(endpoint_name)
 
 
+@app.get("/metrics")
+def get_metrics():
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(
+            status_code=404, detail="Metrics are off, install prometheus-client to turn them on")
+    body, content_type = metrics.render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+def get_query_config(endpoint_name: str, query: Query) -> Optional[Tuple[Deployment, Model]]:
+    with metrics.time_config_lookup("endpoint"):
+        config = get_config_for_endpoint(endpoint_name)
+    if config is None:
+        return None
+
+    # Multi-model endpoints route to the model named in the request
+    model = config.get_model(query.model)
+    if model is None:
+        model_ids = [model.id for model in config.models]
+        if query.model is None:
+            raise HTTPException(
+                status_code=400, detail=f"{endpoint_name} serves several models, pick one with `model`: {model_ids}")
+        raise HTTPException(
+            status_code=404, detail=f"{query.model} isn't served by {endpoint_name}, expected one of {model_ids}")
+    return (config.deployment, model)
+
+
+async def get_async_inference(endpoint_name: str, inference_id: str) -> AsyncInference:
+    # The store is sqlite, keep it off the event loop
+    inference = await asyncio.to_thread(get_async_store().get, inference_id)
+    if inference is None or inference.endpoint_name != endpoint_name:
+        raise HTTPException(
+            status_code=404, detail=f"No async request {inference_id} for {endpoint_name}")
+    return inference
+
+
 @app.post("/endpoint/{endpoint_name}/query")
-def query_endpoint(endpoint_name: str, query: Query):
-    config = get_config_for_endpoint(endpoint_name)
+async def query_endpoint(endpoint_name: str, query: Query):
     if query.context is None:
         query.context = ''
+    config = get_query_config(endpoint_name, query)
+    if config is not None and config[0].async_inference:
+        raise HTTPException(
+            status_code=400, detail=f"{endpoint_name} is an async endpoint, submit to /endpoint/{endpoint_name}/async")
+
+    labels = metrics.get_labels(endpoint_name, config)
+
+    async def fetch(request: Optional[QueryRequest] = None):
+        with metrics.track_invoke(labels):
+            if batcher is not None:
+                return await batcher.query(endpoint_name, query, config)
+            request = request or await build_query_request_async(endpoint_name, query, config)
+            return await invoke_query_request_async(endpoint_name, request)
+
+    if response_cache is not None:
+        return await response_cache.get_or_query(endpoint_name, query, config, fetch)
+    return await fetch()
 
-    # Support multi-model endpoints
-    config = (config.deployment, config.models[0])
-    return make_query_request(endpoint_name, query, config)
+
+@app.post("/endpoint/{endpoint_name}/async", status_code=202)
+async def submit_async_query(endpoint_name: str, query: Query):
+    """ Queue a query on an async endpoint and return a handle to poll """
+    if query.context is None:
+        query.context = ''
+    config = get_query_config(endpoint_name, query)
+    if config is None or not config[0].async_inference:
+        raise HTTPException(
+            status_code=400, detail=f"{endpoint_name} isn't an async inference endpoint")
+
+    request = await build_query_request_async(endpoint_name, query, config)
+    with metrics.track_invoke(metrics.get_labels(endpoint_name, config)):
+        inference = await asyncio.to_thread(submit_async_request, endpoint_name, config[0], request)
+    return {"inference_id": inference.inference_id, "status": AsyncStatus.InProgress}
+
+
+@app.get("/endpoint/{endpoint_name}/async/{inference_id}")
+async def get_async_query_status(endpoint_name: str, inference_id: str):
+    inference = await get_async_inference(endpoint_name, inference_id)
+    status = await asyncio.to_thread(get_async_status, inference)
+    return {"inference_id": inference_id, "status": status, "submitted_at": inference.submitted_at}
+
+
+@app.get("/endpoint/{endpoint_name}/async/{inference_id}/result")
+async def get_async_query_result(endpoint_name: str, inference_id: str):
+    inference = await get_async_inference(endpoint_name, inference_id)
+    status, result = await asyncio.to_thread(get_async_result, inference)
+    if status == AsyncStatus.InProgress:
+        return JSONResponse(status_code=202, content={"inference_id": inference_id, "status": status})
+    if status == AsyncStatus.Failed:
+        raise HTTPException(status_code=502, detail=result)
+    return result
 
 
 @app.post("/chat/completions")
-def chat_completion(chat_completion: ChatCompletion):
+async def chat_completion(chat_completion: ChatCompletion):
     model_id = chat_completion.model
 
     # Validate model is for completion tasks
-    endpoints = get_endpoints_for_model(model_id)
+    with metrics.time_config_lookup("model"):
+        endpoints = get_endpoints_for_model(model_id)
     if len(endpoints) == 0:
         raise NotDeployedException
 
+    # Async endpoints only take queued requests, so chat goes to the real-time ones
+    realtime_endpoints = [endpoint for endpoint in endpoints if not endpoint.deployment.async_inference]
+    if len(realtime_endpoints) == 0:
+        endpoint_name = endpoints[0].deployment.endpoint_name
+        raise HTTPException(
+            status_code=400, detail=f"{model_id} is only served by async endpoints, submit to /endpoint/{endpoint_name}/async")
+
     messages = chat_completion.messages
-    # Currently using the first available endpoint.
-    endpoint_name = endpoints[0].deployment.endpoint_name
-
-    res = completion(
-        model=f"sagemaker/{endpoint_name}",
-        messages=messages,
-        temperature=0.9,
-        hf_model_name=model_id,
-    )
+    endpoint = router.select(realtime_endpoints)
+    endpoint_name = endpoint.deployment.endpoint_name
+
+    model = endpoint.get_model(model_id)
+    labels = metrics.get_labels(endpoint_name, (endpoint.deployment, model))
+    if chat_completion.stream:
+        if not is_tgi_model(model):
+            raise HTTPException(
+                status_code=400, detail="Streaming is only supported for Hugging Face text-generation (TGI) endpoints")
+
+        async def stream():
+            with router.track(endpoint_name), metrics.track_invoke(labels):
+                async for event in stream_chat_completion(endpoint_name, (endpoint.deployment, model), messages):
+                    yield event
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    # litellm can't set TargetModel on its requests
+    if endpoint.deployment.multi_model:
+        raise HTTPException(
+            status_code=400, detail="Multi-model endpoints only support streaming chat completions")
+
+    # litellm takes seconds to import, so keep it off the worker start up path
+    from litellm import acompletion
+    with router.track(endpoint_name), metrics.track_litellm(labels) as responses:
+        with start_span("litellm.acompletion", **{"model_manager.endpoint": endpoint_name,
+                                                    "model_manager.model": model_id}) as span:
+            res = await acompletion(
+                model=f"sagemaker/{endpoint_name}",
+                messages=messages,
+                temperature=0.9,
+                hf_model_name=model_id,
+            )
+            usage = getattr(res, "usage", None)
+            if usage is not None:
+                set_attributes(span, **{"gen_ai.usage.input_tokens": usage.prompt_tokens,
+                                        "gen_ai.usage.output_tokens": usage.completion_tokens})
+        responses.append(res)
 
     return res
 
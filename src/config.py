@@ -1,65 +1,219 @@
 import glob
+import os
+import threading
+import time
 import yaml
 from src.yaml import dumper
 from src.schemas.model import Model
 from src.schemas.deployment import Deployment
+from src.sagemaker.endpoint_index import get_endpoint_index
+from src.tracing import set_attributes, start_span
 from typing import Dict, Tuple, List, NamedTuple, Optional
 
+DEFAULT_CONFIG_PATH = "./configs/*.yaml"
+
 
 class ModelDeployment(NamedTuple):
     deployment: Deployment
     models: List[Model]
 
+    def get_model(self, model_id: Optional[str] = None) -> Optional[Model]:
+        """ The model with `model_id`, or the only model when no id is given """
+        if model_id is None:
+            return self.models[0] if len(self.models) == 1 else None
+        return next((model for model in self.models if model.id == model_id), None)
 
-def get_deployment_configs(path: Optional[str] = None) -> List[ModelDeployment]:
-    if path is None:
-        path = "./configs/*.yaml"
 
-    configurations = glob.glob(path)
-    configs = []
+class ConfigRegistry:
+    """ In-memory index of deployment configs keyed by endpoint name and model id.
+
+    The config directory is rescanned at most once every `refresh_interval`
+    seconds, and a file is only re-parsed when its inode, mtime or size
+    changes, so lookups are dict reads that don't touch disk.
+    """
 
-    for configuration in configurations:
-        with open(configuration) as config:
+    def __init__(self, path: str = DEFAULT_CONFIG_PATH, refresh_interval: float = 1.0):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._last_scan: Optional[float] = None
+        # filename -> (stat signature, parsed config or None for non-deployment files)
+        self._files: Dict[str, Tuple[Tuple[int, int, int], Optional[ModelDeployment]]] = {}
+        self._by_endpoint: Dict[str, ModelDeployment] = {}
+        self._by_model: Dict[str, Dict[str, ModelDeployment]] = {}
+
+    @staticmethod
+    def _signature(filename: str) -> Tuple[int, int, int]:
+        stat = os.stat(filename)
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def _load(filename: str) -> Optional[ModelDeployment]:
+        with open(filename) as config:
             configuration = yaml.safe_load(config)
-            if configuration is None:
-                continue
+        if configuration is None:
+            return None
+
+        # Filter out training configs
+        if configuration.get('deployment') is None:
+            return None
+
+        return ModelDeployment(
+            deployment=configuration['deployment'], models=configuration['models'])
+
+    def _index(self, filename: str, config: Optional[ModelDeployment]):
+        if config is None:
+            return
+        self._by_endpoint[config.deployment.endpoint_name] = config
+        for model in config.models:
+            self._by_model.setdefault(model.id, {})[filename] = config
+
+    def _unindex(self, filename: str):
+        entry = self._files.pop(filename, None)
+        if entry is None or entry[1] is None:
+            return
+        config = entry[1]
+        if self._by_endpoint.get(config.deployment.endpoint_name) is config:
+            del self._by_endpoint[config.deployment.endpoint_name]
+        for model in config.models:
+            endpoints = self._by_model.get(model.id, {})
+            endpoints.pop(filename, None)
+            if not endpoints:
+                self._by_model.pop(model.id, None)
+
+    def refresh(self, force: bool = False):
+        """ Pick up added, changed and removed config files """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_scan is not None and now - self._last_scan < self.refresh_interval:
+                return
+            self._last_scan = now
+
+            filenames = set(glob.glob(self.path))
+            for filename in list(self._files):
+                if filename not in filenames:
+                    self._unindex(filename)
+
+            for filename in sorted(filenames):
+                try:
+                    signature = self._signature(filename)
+                except FileNotFoundError:
+                    self._unindex(filename)
+                    continue
+
+                entry = self._files.get(filename)
+                if entry is not None and entry[0] == signature:
+                    continue
+
+                self._unindex(filename)
+                config = self._load(filename)
+                self._files[filename] = (signature, config)
+                self._index(filename, config)
+
+    def invalidate(self, filename: Optional[str] = None):
+        """ Drop a single file (or everything) so it is re-read on the next lookup """
+        with self._lock:
+            if filename is None:
+                for name in list(self._files):
+                    self._unindex(name)
+            else:
+                self._unindex(filename)
+            self._last_scan = None
 
-            # Filter out training configs
-            if configuration.get('deployment') is None:
-                continue
+    def put(self, filename: str, config: ModelDeployment):
+        """ Register a config that was just written to `filename` """
+        with self._lock:
+            self._unindex(filename)
+            self._files[filename] = (self._signature(filename), config)
+            self._index(filename, config)
 
-            deployment = configuration['deployment']
-            models = configuration['models']
-            configs.append(ModelDeployment(
-                deployment=deployment, models=models))
+    def configs(self) -> List[ModelDeployment]:
+        self.refresh()
+        # refresh and put may change the dicts from another thread mid-iteration
+        with self._lock:
+            return [config for _, config in self._files.values() if config is not None]
 
-    return configs
+    def get_config_for_endpoint(self, endpoint_name: str) -> Optional[ModelDeployment]:
+        self.refresh()
+        return self._by_endpoint.get(endpoint_name)
+
+    def get_endpoints_for_model(self, model_id: str) -> List[ModelDeployment]:
+        self.refresh()
+        with self._lock:
+            return list(self._by_model.get(model_id, {}).values())
+
+    def get_filenames_for_endpoint(self, endpoint_name: str) -> List[str]:
+        self.refresh()
+        with self._lock:
+            return [filename for filename, (_, config) in self._files.items()
+                    if config is not None and config.deployment.endpoint_name == endpoint_name]
+
+
+_registries: Dict[str, ConfigRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_config_registry(path: Optional[str] = None) -> ConfigRegistry:
+    if path is None:
+        path = DEFAULT_CONFIG_PATH
+
+    with _registries_lock:
+        registry = _registries.get(path)
+        if registry is None:
+            registry = _registries[path] = ConfigRegistry(path)
+    return registry
+
+
+def get_deployment_configs(path: Optional[str] = None) -> List[ModelDeployment]:
+    return get_config_registry(path).configs()
 
 
 def get_endpoints_for_model(model_id: str, path: Optional[str] = None) -> List[ModelDeployment]:
-    configs = get_deployment_configs(path)
-    endpoints = []
-    for config in configs:
-        models = [model.id for model in config.models]
-        if model_id in models:
-            # TODO: Check if endpoint is still active
-            endpoints.append(config)
+    # TODO: Check if endpoint is still active
+    with start_span("get_endpoints_for_model", **{"model_manager.model": model_id}) as span:
+        endpoints = get_config_registry(path).get_endpoints_for_model(model_id)
+        set_attributes(span, **{"model_manager.endpoint_count": len(endpoints)})
     return endpoints
 
 
-def get_config_for_endpoint(endpoint_name: str) -> Optional[ModelDeployment]:
-    configs = get_deployment_configs()
-    for config in configs:
-        if config.deployment.endpoint_name == endpoint_name:
-            return config
-    return None
+def get_config_for_endpoint(endpoint_name: str, path: Optional[str] = None) -> Optional[ModelDeployment]:
+    with start_span("get_config_for_endpoint", **{"model_manager.endpoint": endpoint_name}) as span:
+        config = get_config_registry(path).get_config_for_endpoint(endpoint_name)
+        set_attributes(span, **{"model_manager.found": config is not None})
+    return config
+
 
+def write_config(deployment: Deployment, *models: Model):
+    filename = f"./configs/{deployment.endpoint_name}.yaml"
+    out = {
+        "deployment": deployment,
+        "models": list(models),
+    }
 
-def write_config(deployment: Deployment, model: Model):
-    with open(f"./configs/{deployment.endpoint_name}.yaml", 'w') as config:
-        out = {
-            "deployment": deployment,
-            "models": [model],
-        }
+    # Write to a temp file and rename so readers never see a partial config
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, 'w') as config:
         config.write(yaml.dump(out, Dumper=dumper))
+    os.replace(tmp_filename, filename)
+
+    get_config_registry().put(filename, ModelDeployment(
+        deployment=deployment.model_copy(), models=[model.model_copy() for model in models]))
+
+    # Multi-model endpoints are only resolved through their config
+    if len(models) == 1:
+        get_endpoint_index().put(deployment.endpoint_name, models[0])
     return
+
+
+def delete_config(endpoint_name: str, path: Optional[str] = None) -> List[str]:
+    """ Remove the config files for a deleted endpoint and return their names """
+    get_endpoint_index().delete(endpoint_name)
+    registry = get_config_registry(path)
+    filenames = registry.get_filenames_for_endpoint(endpoint_name)
+    for filename in filenames:
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+        registry.invalidate(filename)
+    return filenames
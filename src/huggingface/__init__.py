@@ -1,5 +1,4 @@
 from enum import StrEnum
-from huggingface_hub import HfApi
 
 
 class HuggingFaceTask(StrEnum):
@@ -41,4 +40,20 @@ AVAILABLE_PIPELINES = ["feature-extraction",
                        "text2text-generation", "text-generation", "zero-shot-classification", "conversational",
                        "image-classification", "translation_XX_to_YY"]
 
-hf_api = HfApi()
+_hf_api = None
+
+
+def get_hf_api():
+    """ huggingface_hub.HfApi pulls in its http stack, so only build it on first use """
+    global _hf_api
+    if _hf_api is None:
+        from huggingface_hub import HfApi
+        _hf_api = HfApi()
+    return _hf_api
+
+
+def __getattr__(name: str):
+    # Keeps `from src.huggingface import hf_api` working
+    if name == "hf_api":
+        return get_hf_api()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
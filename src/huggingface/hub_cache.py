@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from dotenv import dotenv_values
+from urllib.parse import quote
+from src.utils.cache import SqliteCache, TTLCache, get_cache_dir
+from typing import Any, Dict, Optional, Tuple
+
+HUGGING_FACE_HUB_TOKEN = dotenv_values(".env").get("HUGGING_FACE_HUB_KEY")
+
+# How long hub metadata is used before it's revalidated with its ETag
+HUB_CACHE_TTL = float(os.environ.get("MODEL_MANAGER_HUB_CACHE_TTL", 3600))
+
+# model_info fields worth keeping, the rest can be large (e.g. cardData)
+MODEL_INFO_FIELDS = ("id", "sha", "pipeline_tag", "library_name", "tags",
+                     "transformersInfo", "siblings", "lastModified")
+
+
+def is_offline() -> bool:
+    return os.environ.get("HF_HUB_OFFLINE", "").lower() in ("1", "true", "yes")
+
+
+def fetch_model_info(model_id: str, revision: Optional[str] = None,
+                     etag: Optional[str] = None) -> Tuple[int, Optional[str], Optional[Dict[str, Any]]]:
+    """ GET the hub's model_info JSON. Returns (status, etag, data); data is None on 304 """
+    from huggingface_hub import constants
+    from huggingface_hub.utils import build_hf_headers, get_session
+
+    url = f"{constants.ENDPOINT}/api/models/{model_id}"
+    if revision is not None:
+        url += f"/revision/{quote(revision, safe='')}"
+
+    headers = build_hf_headers(token=HUGGING_FACE_HUB_TOKEN)
+    if etag is not None:
+        headers["If-None-Match"] = etag
+
+    response = get_session().get(url, headers=headers, timeout=10)
+    if response.status_code == 304:
+        return 304, etag, None
+    response.raise_for_status()
+
+    data = response.json()
+    return response.status_code, response.headers.get("ETag"), {
+        field: data.get(field) for field in MODEL_INFO_FIELDS}
+
+
+class HubMetadataCache:
+    """ Hugging Face Hub model_info keyed by repo id and revision.
+
+    Entries live in an in-memory LRU backed by sqlite, so they survive
+    restarts. After `ttl` seconds an entry is revalidated with its ETag,
+    which costs a 304 instead of a full response when nothing changed. If
+    the hub can't be reached, or HF_HUB_OFFLINE is set, stale entries are
+    served instead of failing.
+    """
+
+    def __init__(self, ttl: float = HUB_CACHE_TTL, path: Optional[str] = None, maxsize: int = 1024):
+        self.ttl = ttl
+        # Freshness is tracked per entry, stale ones are still needed offline
+        self.memory = TTLCache(maxsize=maxsize)
+        self.disk = SqliteCache(path or os.path.join(
+            get_cache_dir(), "hub.sqlite"), maxsize=maxsize * 10)
+
+    @staticmethod
+    def key(model_id: str, revision: Optional[str] = None) -> str:
+        return f"{model_id}@{revision or 'main'}"
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.memory.get(key)
+        if entry is None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+        return entry
+
+    def _store(self, key: str, entry: Dict[str, Any]):
+        self.memory.set(key, entry)
+        self.disk.set(key, entry)
+
+    def model_info(self, model_id: str, revision: Optional[str] = None) -> Dict[str, Any]:
+        key = self.key(model_id, revision)
+        entry = self._load(key)
+        if entry is not None and (time.time() - entry["fetched_at"] < self.ttl or is_offline()):
+            return entry["data"]
+        if entry is None and is_offline():
+            raise LookupError(
+                f"{model_id} isn't cached and HF_HUB_OFFLINE is set")
+
+        try:
+            status, etag, data = fetch_model_info(
+                model_id, revision, entry["etag"] if entry is not None else None)
+        except Exception:
+            if entry is not None:
+                return entry["data"]
+            raise
+
+        if status == 304:
+            entry = {**entry, "fetched_at": time.time()}
+        else:
+            entry = {"etag": etag, "fetched_at": time.time(), "data": data}
+        self._store(key, entry)
+        return entry["data"]
+
+    def pipeline_task(self, model_id: str, revision: Optional[str] = None) -> Optional[str]:
+        model_info = self.model_info(model_id, revision)
+        transformers_info = model_info.get("transformersInfo") or {}
+        return transformers_info.get("pipeline_tag") or model_info.get("pipeline_tag")
+
+
+_hub_cache: Optional[HubMetadataCache] = None
+_hub_cache_lock = threading.Lock()
+
+
+def get_hub_cache() -> HubMetadataCache:
+    global _hub_cache
+    with _hub_cache_lock:
+        if _hub_cache is None:
+            _hub_cache = HubMetadataCache()
+    return _hub_cache
@@ -0,0 +1,82 @@
+import json
+import os
+from botocore.exceptions import ClientError
+from dotenv import dotenv_values
+from src.huggingface import get_hf_api
+from src.schemas.model import Model
+from src.session import get_client
+from src.utils.aws_utils import construct_s3_uri
+from src.utils.s3_upload import ArtifactUploader
+from typing import List, Optional
+
+HUGGING_FACE_HUB_TOKEN = dotenv_values(".env").get("HUGGING_FACE_HUB_KEY")
+
+# Parallel file downloads from the hub
+HF_DOWNLOAD_WORKERS = int(os.environ.get(
+    "MODEL_MANAGER_HF_DOWNLOAD_WORKERS", 16))
+
+# Written last, so a prefix with a marker holds the complete snapshot
+STAGED_MARKER = ".model_manager_staged.json"
+
+# Weights for other frameworks that the serving containers never load
+IGNORE_PATTERNS = ["*.msgpack", "*.h5", "*.ot", "*.tflite", "*.onnx", "*.mlmodel"]
+TORCH_PATTERNS = ["*.bin", "*.pt", "*.pth"]
+
+
+def get_staged_prefix(model_id: str, commit: str) -> str:
+    return f"huggingface/{model_id}/{commit}/"
+
+
+def get_ignore_patterns(filenames: List[str]) -> List[str]:
+    # Prefer safetensors when a repo ships both
+    if any(filename.endswith(".safetensors") for filename in filenames):
+        return IGNORE_PATTERNS + TORCH_PATTERNS
+    return IGNORE_PATTERNS
+
+
+def is_staged(bucket: str, prefix: str, client=None) -> bool:
+    client = client or get_client('s3')
+    try:
+        client.head_object(Bucket=bucket, Key=f"{prefix}{STAGED_MARKER}")
+    except ClientError as error:
+        if error.response['Error']['Code'] in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+    return True
+
+
+def stage_huggingface_model(model: Model, bucket: str, uploader: Optional[ArtifactUploader] = None,
+                            client=None) -> str:
+    """ Copy a hub snapshot to S3 once per commit and return its prefix uri.
+
+    The revision is resolved to a commit, so tags and branches that point at
+    an already staged commit skip the download entirely. Files are fetched in
+    parallel through the local hub cache, so re-staging on the same machine
+    doesn't download them again either.
+    """
+    from huggingface_hub import snapshot_download
+
+    client = client or get_client('s3')
+    model_info = get_hf_api().model_info(
+        model.id, revision=model.revision, token=HUGGING_FACE_HUB_TOKEN)
+    prefix = get_staged_prefix(model.id, model_info.sha)
+    if is_staged(bucket, prefix, client):
+        return construct_s3_uri(bucket, prefix)
+
+    filenames = [sibling.rfilename for sibling in model_info.siblings or []]
+    snapshot = snapshot_download(
+        model.id,
+        revision=model_info.sha,
+        token=HUGGING_FACE_HUB_TOKEN,
+        ignore_patterns=get_ignore_patterns(filenames),
+        max_workers=HF_DOWNLOAD_WORKERS,
+    )
+
+    uploader = uploader or ArtifactUploader(bucket, client=client)
+    uploader.upload(snapshot, prefix, content_addressed=False)
+    client.put_object(Bucket=bucket, Key=f"{prefix}{STAGED_MARKER}", Body=json.dumps({
+        "model_id": model.id,
+        "revision": model.revision,
+        "commit": model_info.sha,
+    }).encode("utf-8"))
+    return construct_s3_uri(bucket, prefix)
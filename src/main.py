@@ -3,11 +3,9 @@ import logging
 import threading
 from InquirerPy import prompt
 from src.sagemaker import EC2Instance
-from src.sagemaker.create_model import deploy_model
 from src.sagemaker.delete_model import delete_sagemaker_model
 from src.sagemaker.resources import list_sagemaker_endpoints, select_instance, list_service_quotas_async
 from src.sagemaker.query_endpoint import make_query_request
-from src.sagemaker.search_jumpstart_models import search_sagemaker_jumpstart_model
 from src.utils.rich_utils import print_error, print_success
 from src.schemas.deployment import Deployment, Destination
 from src.schemas.model import Model, ModelSource
@@ -32,15 +30,15 @@ def main(args, loglevel):
     print("[magenta]Model Manager by OpenFoundry.")
     print("[magenta]Star us on Github ☆! [blue]https://github.com/openfoundry-ai/model_manager")
 
-    # list_service_quotas is a pretty slow API and it's paginated.
-    # Use async here and store the result in instances
+    # list_service_quotas is a pretty slow API and it's paginated. It's cached
+    # on disk, but the first run still has to page through it, so use a thread
+    # here and store the result in instances
     instances = []
     instance_thread = threading.Thread(
         target=list_service_quotas_async, args=[instances])
     instance_thread.start()
 
     while True:
-        active_endpoints = list_sagemaker_endpoints()
         questions = [
             inquirer.List(
                 'action',
@@ -53,6 +51,8 @@ def main(args, loglevel):
             break
 
         action = answers['action']
+        if action in (Actions.LIST, Actions.DELETE, Actions.QUERY):
+            active_endpoints = list_sagemaker_endpoints()
 
         match action:
             case Actions.LIST:
@@ -108,8 +108,19 @@ def main(args, loglevel):
                 query = Query(query=answers['query'])
                 config = get_config_for_endpoint(endpoint)
 
-                # support multi-model endpoints
-                config = (config.deployment, config.models[0])
+                if config is not None:
+                    model = config.models[0]
+                    if len(config.models) > 1:
+                        questions = [
+                            inquirer.List('model',
+                                          message="Which model would you like to query?",
+                                          choices=[model.id for model in config.models])
+                        ]
+                        answers = inquirer.prompt(questions)
+                        if answers is None:
+                            continue
+                        model = config.get_model(answers['model'])
+                    config = (config.deployment, model)
                 make_query_request(endpoint, query, config)
             case Actions.EXIT:
                 quit()
@@ -124,6 +135,10 @@ class ModelType(StrEnum):
 
 
 def build_and_deploy_model(instances, instance_thread):
+    # The sagemaker SDK is slow to import, so only load it when deploying
+    from src.sagemaker.create_model import deploy_model
+    from src.sagemaker.search_jumpstart_models import search_sagemaker_jumpstart_model
+
     questions = [
         inquirer.List(
             'model_type',
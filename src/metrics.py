@@ -0,0 +1,194 @@
+import os
+import time
+from botocore.exceptions import ClientError
+from contextlib import contextmanager
+from src.schemas.deployment import Deployment
+from src.schemas.model import Model
+from src.utils.aws_utils import is_throttled
+from typing import Any, NamedTuple, Optional, Tuple
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+# Metrics are on whenever prometheus-client is installed, set to 0 to turn them off
+METRICS_ENABLED = prometheus_client is not None and os.environ.get(
+    "MODEL_MANAGER_METRICS", "true").lower() not in ("0", "false", "off")
+
+# uvicorn workers each write their samples here and /metrics merges them
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# Seconds, from cache hits up to long generations
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120)
+# Config lookups are dict reads unless the config directory is rescanned
+LOOKUP_BUCKETS = (.00005, .0001, .00025, .0005, .001, .0025, .005, .01, .025, .1)
+
+INVOKE_LABELS = ("endpoint", "model", "instance_type")
+
+
+class MetricLabels(NamedTuple):
+    endpoint: str
+    model: str
+    instance_type: str
+
+
+def get_labels(endpoint_name: str, config: Optional[Tuple[Deployment, Model]]) -> MetricLabels:
+    """ Labels from the resolved deployment config, endpoints without a config only get their name """
+    if config is None:
+        return MetricLabels(endpoint_name, "", "")
+    deployment, model = config
+    return MetricLabels(endpoint_name, model.id, deployment.instance_type or "")
+
+
+def get_error_type(error: Exception) -> str:
+    """ The AWS error code for client errors, e.g. ThrottlingException or ModelError, else the exception class """
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code') or type(error).__name__
+    return type(error).__name__
+
+
+if METRICS_ENABLED:
+    from prometheus_client import Counter, Gauge, Histogram
+
+    REQUEST_LATENCY = Histogram(
+        "model_manager_request_duration_seconds", "Total time to handle a request",
+        ("method", "route", "status"), buckets=LATENCY_BUCKETS)
+    INVOKE_LATENCY = Histogram(
+        "model_manager_invoke_duration_seconds", "Time spent invoking the SageMaker endpoint",
+        INVOKE_LABELS, buckets=LATENCY_BUCKETS)
+    LITELLM_OVERHEAD = Histogram(
+        "model_manager_litellm_overhead_seconds", "Time litellm spends around the endpoint call",
+        INVOKE_LABELS, buckets=LATENCY_BUCKETS)
+    CONFIG_LOOKUP = Histogram(
+        "model_manager_config_lookup_duration_seconds", "Time to resolve a deployment config",
+        ("by",), buckets=LOOKUP_BUCKETS)
+    IN_FLIGHT = Gauge(
+        "model_manager_in_flight_requests", "Endpoint invocations in flight",
+        INVOKE_LABELS, multiprocess_mode="livesum")
+    ERRORS = Counter(
+        "model_manager_invoke_errors", "Failed endpoint invocations",
+        INVOKE_LABELS + ("error",))
+    THROTTLES = Counter(
+        "model_manager_invoke_throttles", "Endpoint invocations rejected by throttling",
+        INVOKE_LABELS)
+    CACHE_LOOKUPS = Counter(
+        "model_manager_response_cache_lookups", "Response cache lookups by result",
+        ("endpoint", "result"))
+
+
+@contextmanager
+def time_config_lookup(by: str):
+    """ `by` is "endpoint" or "model" """
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        CONFIG_LOOKUP.labels(by).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def track_invoke(labels: MetricLabels):
+    """ Wrap an endpoint invocation to record it in flight, then its latency or error """
+    if not METRICS_ENABLED:
+        yield
+        return
+    in_flight = IN_FLIGHT.labels(*labels)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as error:
+        ERRORS.labels(*labels, get_error_type(error)).inc()
+        if is_throttled(error):
+            THROTTLES.labels(*labels).inc()
+        raise
+    else:
+        INVOKE_LATENCY.labels(*labels).observe(time.perf_counter() - start)
+    finally:
+        in_flight.dec()
+
+
+@contextmanager
+def track_litellm(labels: MetricLabels):
+    """ Like track_invoke for a litellm completion, which reports its own overhead on the response.
+
+    The context manager yields a list the response is appended to. Older
+    litellm versions don't report overhead, then the whole call counts as
+    the invoke.
+    """
+    if not METRICS_ENABLED:
+        yield []
+        return
+    responses = []
+    with track_invoke(labels):
+        start = time.perf_counter()
+        yield responses
+        elapsed = time.perf_counter() - start
+    if responses:
+        hidden_params = getattr(responses[0], "_hidden_params", None) or {}
+        overhead_ms = hidden_params.get("litellm_overhead_time_ms")
+        if overhead_ms is not None:
+            LITELLM_OVERHEAD.labels(*labels).observe(min(overhead_ms / 1000, elapsed))
+
+
+def record_cache_lookup(endpoint_name: str, result: str):
+    """ `result` is "hit", "miss", "coalesced" onto an in-flight miss, or "skipped" for queries that can't be cached """
+    if METRICS_ENABLED:
+        CACHE_LOOKUPS.labels(endpoint_name, result).inc()
+
+
+class MetricsMiddleware:
+    """ ASGI middleware timing every request by method, route template and status.
+
+    Routes are labelled by their template, e.g. /endpoint/{endpoint_name}/query,
+    so label values stay bounded. It's plain ASGI rather than a Starlette
+    BaseHTTPMiddleware so streamed responses pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not METRICS_ENABLED or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router puts the matched route in the scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(
+                time.perf_counter() - start)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """ The exposition body and its content type, merged across workers in multiprocess mode """
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+
+    registry: Any = REGISTRY
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """ Drops this worker's live gauges from the merged metrics when it exits """
+    if METRICS_ENABLED and MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,123 @@
+import itertools
+import os
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from enum import StrEnum
+from src.config import ModelDeployment
+from typing import Dict, List, Optional
+
+ROUTING_POLICY = os.environ.get(
+    "MODEL_MANAGER_ROUTING_POLICY", "least-outstanding")
+
+
+class EndpointStats:
+    def __init__(self):
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.consecutive_errors = 0
+        self.ejected_until = 0.0
+
+
+class RoutingPolicy(ABC):
+    """ Picks one endpoint out of the healthy endpoints serving a model """
+
+    @abstractmethod
+    def choose(self, endpoints: List[ModelDeployment], stats: Dict[str, EndpointStats]) -> ModelDeployment:
+        pass
+
+
+class RoundRobin(RoutingPolicy):
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def choose(self, endpoints, stats):
+        return endpoints[next(self._counter) % len(endpoints)]
+
+
+class LeastOutstandingRequests(RoutingPolicy):
+    def choose(self, endpoints, stats):
+        return min(endpoints, key=lambda endpoint: stats[endpoint.deployment.endpoint_name].in_flight)
+
+
+class LatencyEWMA(RoutingPolicy):
+    """ Lowest expected wait: EWMA latency scaled by the requests already queued on the endpoint """
+
+    def choose(self, endpoints, stats):
+        def cost(endpoint: ModelDeployment) -> float:
+            endpoint_stats = stats[endpoint.deployment.endpoint_name]
+            # Endpoints without samples yet are tried first
+            if endpoint_stats.latency_ewma is None:
+                return 0.0
+            return endpoint_stats.latency_ewma * (endpoint_stats.in_flight + 1)
+        return min(endpoints, key=cost)
+
+
+class Policy(StrEnum):
+    RoundRobin = "round-robin"
+    LeastOutstanding = "least-outstanding"
+    LatencyEWMA = "latency-ewma"
+
+
+POLICIES = {
+    Policy.RoundRobin: RoundRobin,
+    Policy.LeastOutstanding: LeastOutstandingRequests,
+    Policy.LatencyEWMA: LatencyEWMA,
+}
+
+
+class Router:
+    """ Spreads requests for a model across every endpoint serving it.
+
+    Keeps per-endpoint in-flight counts and latency, and ejects an endpoint for
+    `ejection_seconds` after `max_errors` consecutive failures. If every
+    endpoint is ejected, all of them are considered again.
+    """
+
+    def __init__(self, policy: Optional[RoutingPolicy] = None, ewma_alpha: float = 0.3,
+                 max_errors: int = 3, ejection_seconds: float = 30.0):
+        self.policy = policy or POLICIES[Policy(ROUTING_POLICY)]()
+        self.ewma_alpha = ewma_alpha
+        self.max_errors = max_errors
+        self.ejection_seconds = ejection_seconds
+        self._stats: Dict[str, EndpointStats] = {}
+
+    def stats(self, endpoint_name: str) -> EndpointStats:
+        stats = self._stats.get(endpoint_name)
+        if stats is None:
+            stats = self._stats[endpoint_name] = EndpointStats()
+        return stats
+
+    def select(self, endpoints: List[ModelDeployment]) -> ModelDeployment:
+        if len(endpoints) == 0:
+            raise ValueError("No endpoints to route to")
+
+        now = time.monotonic()
+        healthy = [endpoint for endpoint in endpoints
+                   if self.stats(endpoint.deployment.endpoint_name).ejected_until <= now]
+        return self.policy.choose(healthy or endpoints, self._stats)
+
+    @contextmanager
+    def track(self, endpoint_name: str):
+        """ Wrap a request to `endpoint_name` to record its in-flight count, latency and errors """
+        stats = self.stats(endpoint_name)
+        stats.in_flight += 1
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            stats.consecutive_errors += 1
+            if stats.consecutive_errors >= self.max_errors:
+                stats.ejected_until = time.monotonic() + self.ejection_seconds
+            raise
+        else:
+            latency = time.monotonic() - start
+            if stats.latency_ewma is None:
+                stats.latency_ewma = latency
+            else:
+                stats.latency_ewma = self.ewma_alpha * latency + \
+                    (1 - self.ewma_alpha) * stats.latency_ewma
+            stats.consecutive_errors = 0
+            stats.ejected_until = 0.0
+        finally:
+            stats.in_flight -= 1
@@ -0,0 +1,99 @@
+import gzip
+import os
+import tarfile
+from src.schemas.model import ArtifactFormat, Model
+from src.utils.aws_utils import is_s3_uri
+from src.utils.s3_upload import ArtifactUploader, list_artifact_files
+from typing import Any, Dict, Optional, Union
+
+GB = 1024 * 1024 * 1024
+
+# Local artifacts at least this large are deployed uncompressed by default
+UNCOMPRESSED_THRESHOLD = float(os.environ.get(
+    "MODEL_MANAGER_UNCOMPRESSED_THRESHOLD_GB", 1)) * GB
+
+
+def get_artifact_size(location: str) -> int:
+    return sum(os.path.getsize(path) for path, _ in list_artifact_files(location))
+
+
+def get_artifact_format(model: Model) -> ArtifactFormat:
+    if model.artifact_format is not None:
+        return model.artifact_format
+
+    if is_s3_uri(model.location):
+        # An S3 prefix can only be served uncompressed
+        return ArtifactFormat.Uncompressed if model.location.endswith("/") else ArtifactFormat.Compressed
+    if get_artifact_size(model.location) >= UNCOMPRESSED_THRESHOLD:
+        return ArtifactFormat.Uncompressed
+    return ArtifactFormat.Compressed
+
+
+def package_model(location: str, output_dir: str) -> str:
+    """ Tar and gzip a model directory into `output_dir`/model.tar.gz.
+
+    The archive is reproducible, so packaging the same files twice gives the
+    same bytes and the content-addressed upload is skipped: entries are in
+    sorted order and timestamps and owners are zeroed.
+    """
+    if os.path.isfile(location):
+        return location
+
+    archive = os.path.join(output_dir, "model.tar.gz")
+    with open(archive, "wb") as output, \
+            gzip.GzipFile(filename="", mode="wb", fileobj=output, mtime=0) as compressed, \
+            tarfile.open(fileobj=compressed, mode="w", format=tarfile.PAX_FORMAT) as tar:
+        for path, relpath in list_artifact_files(location):
+            info = tar.gettarinfo(path, arcname=relpath)
+            info.mtime = 0
+            info.uid = info.gid = 0
+            info.uname = info.gname = ""
+            info.mode = 0o755 if info.mode & 0o111 else 0o644
+            with open(path, "rb") as file:
+                tar.addfile(info, file)
+    return archive
+
+
+def unpack_model(location: str, output_dir: str) -> str:
+    """ Extract a model.tar.gz into `output_dir` """
+    if os.path.isdir(location):
+        return location
+
+    with tarfile.open(location, "r:*") as tar:
+        tar.extractall(output_dir, filter="data")
+    return output_dir
+
+
+def stage_model_artifact(model: Model, bucket: Optional[str] = None, work_dir: Optional[str] = None,
+                         uploader: Optional[ArtifactUploader] = None) -> str:
+    """ Upload a local model in the format it will be served in and return its S3 uri.
+
+    Uncompressed artifacts are uploaded as a prefix ending in '/', compressed
+    ones as a single model.tar.gz. `work_dir` holds any archive built on the
+    way. Models already on S3 are used in place.
+    """
+    if is_s3_uri(model.location):
+        if get_artifact_format(model) == ArtifactFormat.Uncompressed and not model.location.endswith("/"):
+            return f"{model.location}/"
+        return model.location
+
+    uploader = uploader or ArtifactUploader(bucket)
+    if get_artifact_format(model) == ArtifactFormat.Uncompressed:
+        location = unpack_model(model.location, work_dir)
+    else:
+        location = package_model(model.location, work_dir)
+    return uploader.upload(location, f"models/{model.id}")
+
+
+def get_model_data(s3_path: str) -> Union[str, Dict[str, Any]]:
+    """ `model_data` for the SageMaker SDK. S3 prefixes are loaded without decompression. """
+    if not s3_path.endswith("/"):
+        return s3_path
+
+    return {
+        "S3DataSource": {
+            "S3Uri": s3_path,
+            "S3DataType": "S3Prefix",
+            "CompressionType": "None",
+        }
+    }
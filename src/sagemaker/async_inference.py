@@ -0,0 +1,290 @@
+import datetime
+import json
+import os
+import threading
+import time
+import uuid
+from botocore.exceptions import ClientError
+from enum import StrEnum
+from src.schemas.deployment import Deployment
+from src.session import get_client
+from src.utils.aws_utils import construct_s3_uri
+from src.utils.cache import SqliteCache, get_cache_dir
+from typing import Any, NamedTuple, Optional, Tuple
+
+# Queued requests per instance that autoscaling aims for
+ASYNC_BACKLOG_TARGET = float(os.environ.get(
+    "MODEL_MANAGER_ASYNC_BACKLOG_TARGET", 5))
+
+# Async results are kept around for polling for this long
+ASYNC_RESULT_TTL = 7 * 24 * 60 * 60
+
+# The variant the SageMaker SDK deploys to
+VARIANT_NAME = "AllTraffic"
+
+SCALABLE_DIMENSION = 'sagemaker:variant:DesiredInstanceCount'
+
+
+class AsyncStatus(StrEnum):
+    InProgress = "InProgress"
+    Completed = "Completed"
+    Failed = "Failed"
+
+
+class AsyncInference(NamedTuple):
+    inference_id: str
+    endpoint_name: str
+    output_location: str
+    failure_location: Optional[str]
+    submitted_at: str
+
+
+def split_s3_uri(uri: str) -> Tuple[str, str]:
+    bucket, _, key = uri.removeprefix("s3://").partition("/")
+    return bucket, key
+
+
+def get_async_output_path(deployment: Deployment, bucket: str) -> str:
+    return deployment.async_output_path or construct_s3_uri(
+        bucket, f"async-inference/{deployment.endpoint_name}")
+
+
+def get_async_inference_config(deployment: Deployment, bucket: Optional[str] = None):
+    """ The SageMaker SDK's AsyncInferenceConfig for a deployment, or None for real-time endpoints """
+    if not deployment.async_inference:
+        return None
+    from sagemaker.async_inference import AsyncInferenceConfig
+    from src.session import get_sagemaker_session
+
+    bucket = bucket or get_sagemaker_session().default_bucket()
+
+    # Written back to the config so the server knows where to put requests
+    deployment.async_output_path = get_async_output_path(
+        deployment, bucket).rstrip('/')
+    return AsyncInferenceConfig(
+        output_path=f"{deployment.async_output_path}/output",
+        failure_path=f"{deployment.async_output_path}/failures",
+        max_concurrent_invocations_per_instance=deployment.max_concurrent_invocations,
+    )
+
+
+def get_scaling_resource_id(endpoint_name: str, variant_name: str = VARIANT_NAME) -> str:
+    return f"endpoint/{endpoint_name}/variant/{variant_name}"
+
+
+def get_backlog_policy_name(endpoint_name: str) -> str:
+    return f"{endpoint_name}-backlog"
+
+
+def get_scale_from_zero_policy_name(endpoint_name: str) -> str:
+    return f"{endpoint_name}-scale-from-zero"
+
+
+def get_backlog_alarm_name(endpoint_name: str) -> str:
+    return f"{endpoint_name}-has-backlog-without-capacity"
+
+
+def configure_scale_to_zero(endpoint_name: str, max_capacity: int, variant_name: str = VARIANT_NAME):
+    """ Let an async endpoint scale between 0 and `max_capacity` instances with its queue.
+
+    Backlog per instance is tracked to add and remove instances, but that
+    metric doesn't exist at 0 instances, so an alarm on
+    HasBacklogWithoutCapacity brings the first instance back.
+    """
+    autoscaling = get_client('application-autoscaling')
+    resource_id = get_scaling_resource_id(endpoint_name, variant_name)
+    dimension = SCALABLE_DIMENSION
+    autoscaling.register_scalable_target(
+        ServiceNamespace='sagemaker', ResourceId=resource_id, ScalableDimension=dimension,
+        MinCapacity=0, MaxCapacity=max_capacity)
+
+    autoscaling.put_scaling_policy(
+        PolicyName=get_backlog_policy_name(endpoint_name), ServiceNamespace='sagemaker', ResourceId=resource_id,
+        ScalableDimension=dimension, PolicyType='TargetTrackingScaling',
+        TargetTrackingScalingPolicyConfiguration={
+            'TargetValue': ASYNC_BACKLOG_TARGET,
+            'CustomizedMetricSpecification': {
+                'MetricName': 'ApproximateBacklogSizePerInstance',
+                'Namespace': 'AWS/SageMaker',
+                'Dimensions': [{'Name': 'EndpointName', 'Value': endpoint_name}],
+                'Statistic': 'Average',
+            },
+            'ScaleInCooldown': 600,
+            'ScaleOutCooldown': 300,
+        })
+
+    policy_arn = autoscaling.put_scaling_policy(
+        PolicyName=get_scale_from_zero_policy_name(endpoint_name), ServiceNamespace='sagemaker', ResourceId=resource_id,
+        ScalableDimension=dimension, PolicyType='StepScaling',
+        StepScalingPolicyConfiguration={
+            'AdjustmentType': 'ChangeInCapacity',
+            'MetricAggregationType': 'Average',
+            'Cooldown': 300,
+            'StepAdjustments': [{'MetricIntervalLowerBound': 0, 'ScalingAdjustment': 1}],
+        })['PolicyARN']
+
+    get_client('cloudwatch').put_metric_alarm(
+        AlarmName=get_backlog_alarm_name(endpoint_name),
+        MetricName='HasBacklogWithoutCapacity',
+        Namespace='AWS/SageMaker',
+        Dimensions=[{'Name': 'EndpointName', 'Value': endpoint_name}],
+        Statistic='Average',
+        Period=60,
+        EvaluationPeriods=2,
+        DatapointsToAlarm=2,
+        Threshold=1,
+        ComparisonOperator='GreaterThanOrEqualToThreshold',
+        TreatMissingData='missing',
+        AlarmActions=[policy_arn],
+    )
+
+
+def remove_scale_to_zero(endpoint_name: str, variant_name: str = VARIANT_NAME) -> bool:
+    """ Undo configure_scale_to_zero, which deleting the endpoint leaves behind.
+
+    Endpoints that were never registered for scaling cost a single describe
+    call. Returns whether anything was removed.
+    """
+    autoscaling = get_client('application-autoscaling')
+    resource_id = get_scaling_resource_id(endpoint_name, variant_name)
+    targets = autoscaling.describe_scalable_targets(
+        ServiceNamespace='sagemaker', ResourceIds=[resource_id], ScalableDimension=SCALABLE_DIMENSION)['ScalableTargets']
+    if len(targets) == 0:
+        return False
+
+    get_client('cloudwatch').delete_alarms(
+        AlarmNames=[get_backlog_alarm_name(endpoint_name)])
+    for policy_name in (get_backlog_policy_name(endpoint_name), get_scale_from_zero_policy_name(endpoint_name)):
+        try:
+            autoscaling.delete_scaling_policy(
+                PolicyName=policy_name, ServiceNamespace='sagemaker', ResourceId=resource_id,
+                ScalableDimension=SCALABLE_DIMENSION)
+        except ClientError as error:
+            if error.response['Error']['Code'] != 'ObjectNotFoundException':
+                raise
+    autoscaling.deregister_scalable_target(
+        ServiceNamespace='sagemaker', ResourceId=resource_id, ScalableDimension=SCALABLE_DIMENSION)
+    return True
+
+
+def configure_async_endpoint(deployment: Deployment):
+    """ Called once an endpoint is InService """
+    if deployment.async_inference and deployment.scale_to_zero:
+        configure_scale_to_zero(
+            deployment.endpoint_name, deployment.instance_count)
+
+
+def submit_async_request(endpoint_name: str, deployment: Deployment, request) -> AsyncInference:
+    """ Upload a QueryRequest's body to S3 and queue it on an async endpoint """
+    if not deployment.async_inference or deployment.async_output_path is None:
+        raise ValueError(
+            f"{endpoint_name} isn't an async inference endpoint")
+
+    inference_id = str(uuid.uuid4())
+    input_location = f"{deployment.async_output_path.rstrip('/')}/input/{inference_id}"
+    bucket, key = split_s3_uri(input_location)
+    get_client('s3').put_object(Bucket=bucket, Key=key, Body=request.body,
+                                ContentType=request.content_type)
+
+    response = get_client('sagemaker-runtime').invoke_endpoint_async(
+        EndpointName=endpoint_name,
+        ContentType=request.content_type,
+        Accept=request.accept,
+        InputLocation=input_location,
+        InferenceId=inference_id,
+    )
+    inference = AsyncInference(
+        inference_id=inference_id,
+        endpoint_name=endpoint_name,
+        output_location=response['OutputLocation'],
+        failure_location=response.get('FailureLocation'),
+        submitted_at=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    )
+    get_async_store().put(inference)
+    return inference
+
+
+def read_s3_object(uri: str) -> Optional[bytes]:
+    bucket, key = split_s3_uri(uri)
+    try:
+        return get_client('s3').get_object(Bucket=bucket, Key=key)['Body'].read()
+    except ClientError as error:
+        if error.response['Error']['Code'] in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+
+def s3_object_exists(uri: str) -> bool:
+    bucket, key = split_s3_uri(uri)
+    try:
+        get_client('s3').head_object(Bucket=bucket, Key=key)
+    except ClientError as error:
+        if error.response['Error']['Code'] in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+    return True
+
+
+def get_async_status(inference: AsyncInference) -> AsyncStatus:
+    if s3_object_exists(inference.output_location):
+        return AsyncStatus.Completed
+    if inference.failure_location is not None and s3_object_exists(inference.failure_location):
+        return AsyncStatus.Failed
+    return AsyncStatus.InProgress
+
+
+def get_async_result(inference: AsyncInference) -> Tuple[AsyncStatus, Any]:
+    """ (status, parsed result) once completed, (status, error message) once failed """
+    output = read_s3_object(inference.output_location)
+    if output is not None:
+        try:
+            return AsyncStatus.Completed, json.loads(output)
+        except ValueError:
+            return AsyncStatus.Completed, output.decode("utf-8", errors="replace")
+
+    if inference.failure_location is not None:
+        failure = read_s3_object(inference.failure_location)
+        if failure is not None:
+            return AsyncStatus.Failed, failure.decode("utf-8", errors="replace")
+    return AsyncStatus.InProgress, None
+
+
+def wait_for_async_result(inference: AsyncInference, initial_delay: float = 1, max_delay: float = 30,
+                          backoff: float = 1.5, timeout: Optional[float] = None) -> Tuple[AsyncStatus, Any]:
+    delay = initial_delay
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        status, result = get_async_result(inference)
+        if status != AsyncStatus.InProgress:
+            return status, result
+        if deadline is not None and time.monotonic() + delay > deadline:
+            return status, result
+        time.sleep(delay)
+        delay = min(max_delay, delay * backoff)
+
+
+class AsyncInferenceStore:
+    """ Submitted async requests by inference id, so any server process can poll them """
+
+    def __init__(self, path: Optional[str] = None):
+        self.store = SqliteCache(path or os.path.join(
+            get_cache_dir(), "async.sqlite"), ttl=ASYNC_RESULT_TTL)
+
+    def get(self, inference_id: str) -> Optional[AsyncInference]:
+        entry = self.store.get(inference_id)
+        return AsyncInference(**entry) if entry is not None else None
+
+    def put(self, inference: AsyncInference):
+        self.store.set(inference.inference_id, inference._asdict())
+
+
+_async_store: Optional[AsyncInferenceStore] = None
+_async_store_lock = threading.Lock()
+
+
+def get_async_store() -> AsyncInferenceStore:
+    global _async_store
+    with _async_store_lock:
+        if _async_store is None:
+            _async_store = AsyncInferenceStore()
+    return _async_store
@@ -0,0 +1,274 @@
+import asyncio
+import json
+import math
+import os
+import random
+import time
+from collections import deque
+from rich.progress import BarColumn, MofNCompleteColumn, Progress, TextColumn, TimeRemainingColumn
+from src.config import get_config_for_endpoint
+from src.console import console
+from src.sagemaker.query_endpoint import build_query_request_async, get_invoke_kwargs
+from src.sagemaker.runtime import close_async_runtime, get_async_runtime
+from src.schemas.query import Query
+from src.utils.aws_utils import is_throttled
+from src.utils.rich_utils import print_success
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+QUERY_CONCURRENCY = int(os.environ.get("MODEL_MANAGER_QUERY_CONCURRENCY", 64))
+
+# Attempts per record when the endpoint throttles us
+MAX_ATTEMPTS = 8
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 20.0
+
+# The output is fsynced this often, so a crash loses at most this many records
+CHECKPOINT_INTERVAL = 1000
+
+def percentile(values: List[float], p: float) -> float:
+    """ Nearest rank percentile of sorted `values` """
+    if len(values) == 0:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(values)))
+    return values[rank - 1]
+
+
+class AdaptiveRateLimiter:
+    """ Spaces requests out to a target rate that adapts to throttling.
+
+    Starts unlimited, or at `rate` requests/s. Throttling halves the rate
+    (at most once per `cooldown` seconds, so one burst of throttled requests
+    counts once) and every success raises it by about `increase` requests/s
+    per second, up to `max_rate`.
+    """
+
+    def __init__(self, rate: Optional[float] = None, max_rate: Optional[float] = None,
+                 min_rate: float = 1.0, increase: float = 1.0, cooldown: float = 1.0):
+        self.rate = rate
+        self.max_rate = max_rate or rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self.cooldown = cooldown
+        self._next = 0.0
+        self._last_throttle = float("-inf")
+        self._recent = deque()
+
+    def measured_rate(self, now: float) -> float:
+        while self._recent and now - self._recent[0] > 1.0:
+            self._recent.popleft()
+        return len(self._recent)
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self.rate is None:
+                break
+            wait = self._next - now
+            if wait <= 0:
+                self._next = max(self._next, now) + 1 / self.rate
+                break
+            await asyncio.sleep(wait)
+        self._recent.append(now)
+
+    def on_success(self):
+        if self.rate is None:
+            return
+        self.rate += self.increase / self.rate
+        if self.max_rate is not None:
+            self.rate = min(self.rate, self.max_rate)
+
+    def on_throttle(self):
+        now = asyncio.get_running_loop().time()
+        if now - self._last_throttle < self.cooldown:
+            return
+        self._last_throttle = now
+        current = self.rate if self.rate is not None else self.measured_rate(now)
+        self.rate = max(self.min_rate, current / 2)
+
+
+class BatchQueryReport(NamedTuple):
+    succeeded: int
+    failed: int
+    skipped: int
+    throttled: int
+    elapsed: float
+    latencies: List[float]
+
+    @property
+    def throughput(self) -> float:
+        return (self.succeeded + self.failed) / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def read_records(input_path: str) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+    """ (id, record) per non-empty line. Records without an "id" are identified by their line number """
+    with open(input_path) as file:
+        for line_number, line in enumerate(file):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"query": record}
+            yield record.pop("id", line_number), record
+
+
+def read_completed_ids(output_path: str) -> Set[Any]:
+    """ Ids already in the output, after dropping a line cut off by a crash """
+    if not os.path.exists(output_path):
+        return set()
+
+    completed = set()
+    offset = 0
+    with open(output_path, "rb+") as file:
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            completed.add(json.loads(line)["id"])
+            offset += len(line)
+        file.truncate(offset)
+    return completed
+
+
+async def query_file_async(input_path: str, endpoint_name: str, output_path: str,
+                           concurrency: int = QUERY_CONCURRENCY, rate: Optional[float] = None,
+                           ordered: bool = True, show_progress: bool = True) -> BatchQueryReport:
+    """ Query an endpoint with every record of a JSONL file and write the responses to `output_path`.
+
+    Each input line is a Query, optionally with an "id". Each output line is
+    {"id": ..., "response": ...} or {"id": ..., "error": ...}, in input order
+    unless `ordered` is False. Records already in the output are skipped, so
+    rerunning after a crash resumes where it stopped.
+    """
+    config = get_config_for_endpoint(endpoint_name)
+    completed = read_completed_ids(output_path)
+    total = sum(1 for _ in read_records(input_path))
+
+    runtime = get_async_runtime()
+    limiter = AdaptiveRateLimiter(rate)
+    in_flight = asyncio.Semaphore(concurrency)
+    # Bounds the responses held back waiting for an earlier, slower one
+    window = asyncio.Semaphore(concurrency * 8)
+
+    pending: Dict[int, str] = {}
+    next_to_write = 0
+    written = 0
+    succeeded = failed = throttled = 0
+    latencies: List[float] = []
+
+    output = open(output_path, "a")
+
+    def write(line: str):
+        nonlocal written
+        output.write(line)
+        written += 1
+        if written % CHECKPOINT_INTERVAL == 0:
+            output.flush()
+            os.fsync(output.fileno())
+
+    def finish(sequence: int, line: str):
+        nonlocal next_to_write
+        if not ordered:
+            write(line)
+            window.release()
+            return
+        pending[sequence] = line
+        while next_to_write in pending:
+            write(pending.pop(next_to_write))
+            next_to_write += 1
+            window.release()
+
+    async def invoke(record: Dict[str, Any]) -> Dict[str, Any]:
+        nonlocal throttled
+        # Records must carry their own context, there's no one to prompt
+        query = Query(**{"context": "", **record})
+        query_config = None
+        if config is not None:
+            model = config.get_model(query.model)
+            if model is None:
+                raise ValueError(
+                    f"Endpoint {endpoint_name} has no model {query.model}")
+            query_config = (config.deployment, model)
+        request = await build_query_request_async(endpoint_name, query, query_config)
+
+        for attempt in range(MAX_ATTEMPTS):
+            await limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = await runtime.invoke_endpoint(**get_invoke_kwargs(endpoint_name, request))
+            except Exception as error:
+                if not is_throttled(error) or attempt == MAX_ATTEMPTS - 1:
+                    raise
+                throttled += 1
+                limiter.on_throttle()
+                await asyncio.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)))
+                continue
+
+            latencies.append(time.perf_counter() - start)
+            # botocore retried throttled calls itself
+            if response.get('ResponseMetadata', {}).get('RetryAttempts'):
+                limiter.on_throttle()
+            else:
+                limiter.on_success()
+            return json.loads(response['Body'])
+
+    async def run(sequence: int, record_id: Any, record: Dict[str, Any]):
+        nonlocal succeeded, failed
+        try:
+            result = {"id": record_id, "response": await invoke(record)}
+            succeeded += 1
+        except Exception as error:
+            result = {"id": record_id, "error": str(error)}
+            failed += 1
+        finally:
+            in_flight.release()
+        finish(sequence, json.dumps(result) + "\n")
+        progress.advance(progress_task)
+
+    columns = [TextColumn("{task.description}"), BarColumn(),
+               MofNCompleteColumn(), TimeRemainingColumn()]
+    start = time.perf_counter()
+    try:
+        with Progress(*columns, console=console, disable=not show_progress) as progress:
+            progress_task = progress.add_task(f"Querying {endpoint_name}", total=total,
+                                     completed=len(completed))
+            tasks = set()
+            sequence = 0
+            for record_id, record in read_records(input_path):
+                if record_id in completed:
+                    continue
+                await window.acquire()
+                await in_flight.acquire()
+                task = asyncio.create_task(run(sequence, record_id, record))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                sequence += 1
+            await asyncio.gather(*tasks)
+    finally:
+        output.flush()
+        os.fsync(output.fileno())
+        output.close()
+        await close_async_runtime()
+
+    return BatchQueryReport(succeeded, failed, len(completed), throttled,
+                            time.perf_counter() - start, sorted(latencies))
+
+
+def print_report(report: BatchQueryReport):
+    latencies = report.latencies
+    console.print(
+        f"{report.succeeded} succeeded, {report.failed} failed, {report.skipped} already done, "
+        f"{report.throttled} throttled retries")
+    console.print(
+        f"{report.throughput:.1f} req/s, latency p50 {percentile(latencies, 50) * 1000:.0f} ms, "
+        f"p90 {percentile(latencies, 90) * 1000:.0f} ms, p99 {percentile(latencies, 99) * 1000:.0f} ms")
+
+
+def query_file(input_path: str, endpoint_name: str, output_path: Optional[str] = None,
+               concurrency: int = QUERY_CONCURRENCY, rate: Optional[float] = None, ordered: bool = True):
+    if output_path is None:
+        output_path = f"{os.path.splitext(input_path)[0]}.out.jsonl"
+    report = asyncio.run(query_file_async(
+        input_path, endpoint_name, output_path, concurrency, rate, ordered))
+    print_report(report)
+    print_success(f"Responses written to {output_path}")
+    return report
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import os
+from src.huggingface import HuggingFaceTask
+from src.sagemaker import SagemakerTask
+from src.sagemaker.query_endpoint import QueryRequest, get_invoke_kwargs, get_target_model_for_config, make_query_request_async
+from src.sagemaker.runtime import AsyncSagemakerRuntime, get_async_runtime
+from src.schemas.deployment import Deployment
+from src.schemas.model import Model
+from src.schemas.query import Query
+from src.utils.model_utils import get_model_and_task, is_sagemaker_model
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+MAX_BATCH_SIZE = int(os.environ.get("MODEL_MANAGER_MAX_BATCH_SIZE", 32))
+MAX_BATCH_WAIT_MS = float(os.environ.get("MODEL_MANAGER_MAX_BATCH_WAIT_MS", 5))
+
+
+class BatchCodec(NamedTuple):
+    content_type: str
+    accept: str
+    # list of input texts -> request body
+    encode: Callable[[List[str]], bytes]
+    # (parsed response, batch size) -> one result per input
+    decode: Callable[[Any, int], List[Any]]
+
+
+def split_dict_response(per_item_keys: List[str]) -> Callable[[Any, int], List[Any]]:
+    """ JumpStart returns {key: [one value per input], ...} alongside shared keys such as labels """
+    def decode(response: Dict, size: int) -> List[Dict]:
+        for key in per_item_keys:
+            if len(response[key]) != size:
+                raise ValueError(
+                    f"Expected {size} values for '{key}', got {len(response[key])}")
+        shared = {key: value for key, value in response.items()
+                  if key not in per_item_keys}
+        return [{**shared, **{key: response[key][i] for key in per_item_keys}} for i in range(size)]
+    return decode
+
+
+def split_list_response(wrap: bool = False) -> Callable[[Any, int], List[Any]]:
+    """ Hugging Face pipelines return a list with one entry per input """
+    def decode(response: List, size: int) -> List[Any]:
+        if len(response) != size:
+            raise ValueError(f"Expected {size} results, got {len(response)}")
+        # Single-input text classification returns [result], so keep that shape
+        return [[item] if wrap else item for item in response]
+    return decode
+
+
+def encode_list_text(texts: List[str]) -> bytes:
+    return json.dumps(texts).encode("utf-8")
+
+
+def encode_hf_inputs(texts: List[str]) -> bytes:
+    return json.dumps({"inputs": texts}).encode("utf-8")
+
+
+BATCH_CODECS: Dict[str, BatchCodec] = {
+    SagemakerTask.TextClassification: BatchCodec(
+        "application/list-text", "application/json;verbose", encode_list_text,
+        split_dict_response(["probabilities", "predicted_label"])),
+    SagemakerTask.TextEmbedding: BatchCodec(
+        "application/list-text", "application/json", encode_list_text,
+        split_dict_response(["embedding"])),
+    SagemakerTask.TcEmbedding: BatchCodec(
+        "application/list-text", "application/json", encode_list_text,
+        split_dict_response(["embedding"])),
+    HuggingFaceTask.FeatureExtraction: BatchCodec(
+        "application/json", "application/json", encode_hf_inputs, split_list_response()),
+    HuggingFaceTask.TextClassification: BatchCodec(
+        "application/json", "application/json", encode_hf_inputs, split_list_response(wrap=True)),
+    HuggingFaceTask.FillMask: BatchCodec(
+        "application/json", "application/json", encode_hf_inputs, split_list_response()),
+}
+
+
+def get_batch_codec(endpoint_name: str, query: Query, config: Optional[Tuple[Deployment, Model]]) -> Optional[BatchCodec]:
+    """ Returns the codec to batch this query with, or None if it has to be sent on its own """
+    # Without a config resolving the task may hit the network, so don't bother batching
+    if config is None or query.parameters is not None or query.context:
+        return None
+
+    task = get_model_and_task(endpoint_name, config)['task']
+    if is_sagemaker_model(endpoint_name, config):
+        if task not in SagemakerTask.list():
+            return None
+        task = SagemakerTask(task)
+    return BATCH_CODECS.get(task)
+
+
+class PendingBatch:
+    def __init__(self, codec: BatchCodec):
+        self.codec = codec
+        self.inputs: List[str] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class MicroBatcher:
+    """ Coalesces concurrent queries to the same endpoint into one invoke_endpoint call.
+
+    A batch is sent once it holds `max_batch_size` queries or `max_wait_ms` after
+    its first query arrived, whichever comes first. Each caller gets back only
+    the result for its own input.
+    """
+
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_BATCH_WAIT_MS,
+                 runtime: Optional[AsyncSagemakerRuntime] = None):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.runtime = runtime
+        self._pending: Dict[Tuple[str, Optional[str], BatchCodec], PendingBatch] = {}
+        # Keep references so in-flight sends aren't garbage collected
+        self._sending = set()
+
+    async def query(self, endpoint_name: str, query: Query, config: Optional[Tuple[Deployment, Model]]):
+        codec = get_batch_codec(endpoint_name, query, config)
+        if codec is None:
+            return await make_query_request_async(endpoint_name, query, config)
+
+        # Models on a multi-model endpoint are batched separately
+        key = (endpoint_name, get_target_model_for_config(config), codec)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = PendingBatch(codec)
+            batch.timer = asyncio.get_running_loop().call_later(
+                self.max_wait, self._flush, key)
+
+        future = asyncio.get_running_loop().create_future()
+        batch.inputs.append(query.query)
+        batch.futures.append(future)
+        if len(batch.inputs) >= self.max_batch_size:
+            self._flush(key)
+
+        return await future
+
+    def _flush(self, key: Tuple[str, Optional[str], BatchCodec]):
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        task = asyncio.ensure_future(self._send(key[0], key[1], batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, endpoint_name: str, target_model: Optional[str], batch: PendingBatch):
+        codec = batch.codec
+        try:
+            runtime = self.runtime or get_async_runtime()
+            request = QueryRequest(task=None, content_type=codec.content_type, accept=codec.accept,
+                                   body=codec.encode(batch.inputs), target_model=target_model)
+            response = await runtime.invoke_endpoint(**get_invoke_kwargs(endpoint_name, request))
+            results = codec.decode(json.loads(
+                response['Body']), len(batch.inputs))
+        except Exception as error:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for future, result in zip(batch.futures, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import random
+import time
+from rich.table import Table
+from src.config import get_config_for_endpoint
+from src.console import console
+from src.sagemaker.batch_query import percentile
+from src.sagemaker.query_endpoint import QueryRequest, build_query_request_async, get_invoke_kwargs
+from src.sagemaker.runtime import close_async_runtime, get_async_runtime
+from src.schemas.deployment import Deployment
+from src.schemas.model import Model
+from src.schemas.query import Query, QueryParameters
+from src.utils.aws_utils import is_throttled
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+# Prompts are made of these, one token is roughly one word
+PROMPT_WORDS = ("the", "model", "endpoint", "latency", "request", "token", "batch", "query",
+                "instance", "stream", "deploy", "sagemaker", "throughput", "cloud", "answer", "question")
+
+
+class BenchResult(NamedTuple):
+    start: float
+    latency: float
+    # Time to the first streamed payload part
+    ttft: Optional[float]
+    error: Optional[str]
+    throttled: bool
+
+
+def parse_distribution(spec: str) -> Callable[[random.Random], int]:
+    """ '128' is fixed, '64:512' is uniform between the two and '64,128,256' picks one at random """
+    spec = spec.strip()
+    if ":" in spec:
+        low, high = (int(value) for value in spec.split(":", 1))
+        return lambda rng: rng.randint(low, high)
+    if "," in spec:
+        values = [int(value) for value in spec.split(",")]
+        return lambda rng: rng.choice(values)
+    value = int(spec)
+    return lambda rng: value
+
+
+class Workload:
+    """ Generates queries with prompt lengths and max_new_tokens drawn from distributions """
+
+    def __init__(self, prompt_tokens: str = "128", max_new_tokens: str = "128", seed: int = 0):
+        self.prompt_tokens = parse_distribution(prompt_tokens)
+        self.max_new_tokens = parse_distribution(max_new_tokens)
+        self.rng = random.Random(seed)
+
+    def next_query(self) -> Query:
+        words = self.rng.choices(PROMPT_WORDS, k=self.prompt_tokens(self.rng))
+        return Query(query=" ".join(words), context="",
+                     parameters=QueryParameters(max_new_tokens=self.max_new_tokens(self.rng)))
+
+
+def get_stream_request(request):
+    """ TGI streams tokens back when the payload asks for it """
+    body = json.loads(request.body)
+    body["stream"] = True
+    return request._replace(body=json.dumps(body).encode("utf-8"))
+
+
+async def build_request(endpoint_name: str, query: Query, config: Optional[Tuple[Deployment, Model]],
+                        stream: bool = False) -> QueryRequest:
+    request = await build_query_request_async(endpoint_name, query, config)
+    return get_stream_request(request) if stream else request
+
+
+async def send_query(endpoint_name: str, request: QueryRequest, stream: bool = False,
+                     scheduled: Optional[float] = None) -> BenchResult:
+    """ `scheduled` is when an open-loop query was due, latency counts from then even if it's sent late """
+    runtime = get_async_runtime()
+    start = scheduled or time.perf_counter()
+    ttft = None
+    try:
+        if stream:
+            async for _ in runtime.invoke_endpoint_with_response_stream(**get_invoke_kwargs(endpoint_name, request)):
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+        else:
+            await runtime.invoke_endpoint(**get_invoke_kwargs(endpoint_name, request))
+    except Exception as error:
+        return BenchResult(start, time.perf_counter() - start, ttft, str(error), is_throttled(error))
+    return BenchResult(start, time.perf_counter() - start, ttft, None, False)
+
+
+async def run_closed_loop(next_request: Callable, send: Callable, concurrency: int, end: float) -> List[BenchResult]:
+    """ `concurrency` clients that each send their next query as soon as the last one returns """
+    results: List[BenchResult] = []
+
+    async def client():
+        while time.perf_counter() < end:
+            request = await next_request()
+            results.append(await send(request))
+
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return results
+
+
+async def run_open_loop(next_request: Callable, send: Callable, rate: float, end: float) -> List[BenchResult]:
+    """ Queries arrive at a constant `rate` per second, however long earlier ones take """
+    start = time.perf_counter()
+    tasks = []
+    sent = 0
+    while True:
+        arrival = start + sent / rate
+        if arrival >= end:
+            break
+        # Built ahead of its arrival so building isn't counted in its latency
+        request = await next_request()
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(request, arrival)))
+        sent += 1
+    return list(await asyncio.gather(*tasks))
+
+
+def get_latency_stats(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {f"p{p:g}": percentile(values, p) for p in PERCENTILES}
+
+
+def summarize(results: List[BenchResult], measure_from: float, duration: float) -> Dict[str, Any]:
+    """ Stats over the results that started after warmup """
+    measured = [result for result in results if result.start >= measure_from]
+    succeeded = [result for result in measured if result.error is None]
+    errors = [result for result in measured if result.error is not None]
+    total = max(len(measured), 1)
+
+    report = {
+        "requests": len(measured),
+        "succeeded": len(succeeded),
+        "throughput": len(succeeded) / duration if duration > 0 else 0.0,
+        "error_rate": len(errors) / total,
+        "throttle_rate": sum(result.throttled for result in errors) / total,
+        "latency": get_latency_stats([result.latency for result in succeeded]),
+    }
+    ttfts = [result.ttft for result in succeeded if result.ttft is not None]
+    if ttfts:
+        report["ttft"] = get_latency_stats(ttfts)
+    if errors:
+        report["sample_error"] = errors[0].error
+    return report
+
+
+async def bench_async(endpoint_name: str, config: Optional[Tuple[Deployment, Model]], workload: Workload,
+                      duration: float = 30, warmup: float = 5, concurrency: int = 8,
+                      rate: Optional[float] = None, stream: bool = False) -> Dict[str, Any]:
+    """ Closed-loop at `concurrency` clients, or open-loop at `rate` queries per second when it's given """
+    async def next_request() -> QueryRequest:
+        return await build_request(endpoint_name, workload.next_query(), config, stream)
+
+    async def send(request: QueryRequest, scheduled: Optional[float] = None):
+        return await send_query(endpoint_name, request, stream, scheduled)
+
+    start = time.perf_counter()
+    measure_from = start + warmup
+    end = measure_from + duration
+    try:
+        if rate is not None:
+            results = await run_open_loop(next_request, send, rate, end)
+        else:
+            results = await run_closed_loop(next_request, send, concurrency, end)
+        # Until the last measured query returned
+        elapsed = time.perf_counter() - measure_from
+    finally:
+        await close_async_runtime()
+
+    report = {
+        "endpoint_name": endpoint_name,
+        "mode": "open" if rate is not None else "closed",
+        "rate": rate,
+        "concurrency": None if rate is not None else concurrency,
+        "duration": duration,
+        "warmup": warmup,
+        "stream": stream,
+    }
+    report.update(summarize(results, measure_from, elapsed))
+    return report
+
+
+def render_report(report: Dict[str, Any]) -> Table:
+    table = Table(title=f"{report['endpoint_name']} ({report['mode']} loop)", header_style="magenta")
+    table.add_column("Metric", style="dim")
+    table.add_column("Value", style="blue")
+    table.add_row("Requests", str(report["requests"]))
+    table.add_row("Throughput", f"{report['throughput']:.2f} req/s")
+    table.add_row("Error rate", f"{report['error_rate']:.2%}")
+    table.add_row("Throttle rate", f"{report['throttle_rate']:.2%}")
+    for name in ("latency", "ttft"):
+        for key, value in report.get(name, {}).items():
+            table.add_row(f"{'Latency' if name == 'latency' else 'TTFT'} {key}", f"{value * 1000:.0f} ms")
+    return table
+
+
+def bench(endpoint_name: str, model_id: Optional[str] = None, output_path: Optional[str] = None,
+          prompt_tokens: str = "128", max_new_tokens: str = "128", seed: int = 0, **kwargs) -> Dict[str, Any]:
+    config = get_config_for_endpoint(endpoint_name)
+    if config is not None:
+        model = config.get_model(model_id)
+        if model is None:
+            raise ValueError(
+                f"Pick one of {[model.id for model in config.models]} to benchmark on {endpoint_name}")
+        config = (config.deployment, model)
+
+    workload = Workload(prompt_tokens, max_new_tokens, seed)
+    with console.status(f"[bold green]Benchmarking {endpoint_name}..."):
+        report = asyncio.run(bench_async(endpoint_name, config, workload, **kwargs))
+
+    console.print(render_report(report))
+    if output_path is not None:
+        with open(output_path, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        console.print_json(json.dumps(report))
+    return report
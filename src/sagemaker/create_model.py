@@ -1,4 +1,5 @@
 import json
+import tempfile
 from dotenv import dotenv_values
 from rich.table import Table
 from sagemaker import image_uris, model_uris, script_uris
@@ -7,18 +8,23 @@ from sagemaker.huggingface.model import HuggingFaceModel
 from sagemaker.jumpstart.model import JumpStartModel
 from sagemaker.jumpstart.estimator import JumpStartEstimator
 from sagemaker.model import Model
+from sagemaker.multidatamodel import MultiDataModel
 from sagemaker.predictor import Predictor
-from sagemaker.s3 import S3Uploader
 from src.config import write_config
+from src.sagemaker.artifacts import get_model_data, stage_model_artifact
+from src.sagemaker.async_inference import configure_async_endpoint, get_async_inference_config
+from src.sagemaker.endpoint_index import get_endpoint_tags
 from src.schemas.model import Model, ModelSource
 from src.schemas.deployment import Deployment
 from src.session import session, sagemaker_session
 from src.console import console
 from src.utils.aws_utils import construct_s3_uri, is_s3_uri
 from src.utils.rich_utils import print_error, print_success
-from src.utils.model_utils import get_unique_endpoint_name, get_model_and_task
+from src.utils.model_utils import get_endpoint_name_prefix, get_target_model, get_unique_endpoint_name, get_model_and_task
 from src.huggingface import HuggingFaceTask
 from src.huggingface.hf_hub_api import get_hf_task
+from src.huggingface.staging import stage_huggingface_model
+from typing import List, Optional
 
 HUGGING_FACE_HUB_TOKEN = dotenv_values(".env").get("HUGGING_FACE_HUB_KEY")
 SAGEMAKER_ROLE = dotenv_values(".env")["SAGEMAKER_ROLE"]
@@ -35,8 +41,37 @@ def deploy_model(deployment: Deployment, model: Model):
             deploy_custom_huggingface_model(deployment, model)
 
 
-def deploy_huggingface_model(deployment: Deployment, model: Model):
-    region_name = session.region_name
+def build_model(deployment: Deployment, model: Model):
+    """ Resolve the SageMaker SDK model for any source without deploying it """
+    match model.source:
+        case ModelSource.HuggingFace:
+            return build_huggingface_model(deployment, model)
+        case ModelSource.Sagemaker:
+            return build_jumpstart_model(deployment, model)
+        case ModelSource.Custom:
+            return build_custom_huggingface_model(deployment, model)
+
+
+def create_endpoint(deployment: Deployment, model: Model) -> str:
+    """ Start creating the endpoint and return its name without waiting for it to be InService """
+    sagemaker_model = build_model(deployment, model)
+    kwargs = {}
+    if model.source == ModelSource.Sagemaker:
+        kwargs['accept_eula'] = True
+
+    sagemaker_model.deploy(
+        initial_instance_count=deployment.instance_count,
+        instance_type=deployment.instance_type,
+        endpoint_name=deployment.endpoint_name,
+        tags=get_endpoint_tags(model),
+        async_inference_config=get_async_inference_config(deployment),
+        wait=False,
+        **kwargs
+    )
+    return deployment.endpoint_name
+
+
+def build_huggingface_model(deployment: Deployment, model: Model) -> HuggingFaceModel:
     task = get_hf_task(model)
     model.task = task
     env = {
@@ -47,6 +82,20 @@ def deploy_huggingface_model(deployment: Deployment, model: Model):
     if HUGGING_FACE_HUB_TOKEN is not None:
         env['HUGGING_FACE_HUB_TOKEN'] = HUGGING_FACE_HUB_TOKEN
 
+    model_data = None
+    if model.stage:
+        # Serve weights staged in S3, mounted at /opt/ml/model
+        s3_path = stage_huggingface_model(
+            model, sagemaker_session.default_bucket())
+        model_data = get_model_data(s3_path)
+        if task == HuggingFaceTask.TextGeneration:
+            env['HF_MODEL_ID'] = "/opt/ml/model"
+        else:
+            # The inference toolkit loads /opt/ml/model when no hub id is given
+            del env['HF_MODEL_ID']
+    elif model.revision:
+        env['HF_MODEL_REVISION'] = model.revision
+
     image_uri = None
     if deployment.num_gpus:
         env['SM_NUM_GPUS'] = json.dumps(deployment.num_gpus)
@@ -63,6 +112,7 @@ def deploy_huggingface_model(deployment: Deployment, model: Model):
 
     huggingface_model = HuggingFaceModel(
         env=env,
+        model_data=model_data,
         role=SAGEMAKER_ROLE,
         transformers_version="4.37",
         pytorch_version="2.1",
@@ -70,10 +120,16 @@ def deploy_huggingface_model(deployment: Deployment, model: Model):
         image_uri=image_uri
     )
 
-    endpoint_name = get_unique_endpoint_name(
+    deployment.endpoint_name = get_unique_endpoint_name(
         model.id, deployment.endpoint_name)
+    return huggingface_model
+
 
-    deployment.endpoint_name = endpoint_name
+def deploy_huggingface_model(deployment: Deployment, model: Model):
+    region_name = session.region_name
+    huggingface_model = build_huggingface_model(deployment, model)
+    endpoint_name = deployment.endpoint_name
+    task = model.task
 
     console.log(
         "Deploying model to AWS. [magenta]This may take up to 10 minutes for very large models.[/magenta] See full logs here:")
@@ -96,7 +152,10 @@ def deploy_huggingface_model(deployment: Deployment, model: Model):
                 initial_instance_count=deployment.instance_count,
                 instance_type=deployment.instance_type,
                 endpoint_name=endpoint_name,
+                tags=get_endpoint_tags(model),
+                async_inference_config=get_async_inference_config(deployment),
             )
+            configure_async_endpoint(deployment)
         except Exception:
             console.print_exception()
             quit()
@@ -108,45 +167,63 @@ def deploy_huggingface_model(deployment: Deployment, model: Model):
     return predictor
 
 
+def upload_custom_model(model: Model) -> str:
+    """ Upload a local model artifact to S3 and return its S3 path """
+    if is_s3_uri(model.location):
+        return stage_model_artifact(model)
+
+    bucket = sagemaker_session.default_bucket()
+    with tempfile.TemporaryDirectory() as work_dir:
+        return stage_model_artifact(model, bucket, work_dir)
+
+
+def build_custom_huggingface_model(deployment: Deployment, model: Model, s3_path: Optional[str] = None) -> HuggingFaceModel:
+    if model.location is None:
+        raise ValueError("Missing model source location.")
+
+    if s3_path is None:
+        s3_path = upload_custom_model(model)
+
+    deployment.endpoint_name = get_unique_endpoint_name(
+        model.id, deployment.endpoint_name)
+    model.task = get_model_and_task(model.id)['task']
+
+    # create Hugging Face Model Class
+    return HuggingFaceModel(
+        # path to your trained sagemaker model. Prefixes are loaded uncompressed
+        model_data=get_model_data(s3_path),
+        role=SAGEMAKER_ROLE,  # iam role with permissions to create an Endpoint
+        transformers_version="4.37",
+        pytorch_version="2.1",
+        py_version="py310",
+    )
+
+
 def deploy_custom_huggingface_model(deployment: Deployment, model: Model):
     region_name = session.region_name
     if model.location is None:
         print_error("Missing model source location.")
         return
 
-    s3_path = model.location
     if not is_s3_uri(model.location):
         # Local file. Upload to s3 before deploying
-        bucket = sagemaker_session.default_bucket()
-        s3_path = construct_s3_uri(bucket, f"models/{model.id}")
-        with console.status(f"[bold green]Uploading custom {model.id} model to S3 at {s3_path}...") as status:
-            try:
-                s3_path = S3Uploader.upload(
-                    model.location, s3_path)
-            except Exception:
-                print_error("[red] Model failed to upload to S3")
-
-    endpoint_name = get_unique_endpoint_name(
-        model.id, deployment.endpoint_name)
-
-    deployment.endpoint_name = endpoint_name
-    model.task = get_model_and_task(model.id)['task']
+        console.log(f"Uploading custom {model.id} model to S3...")
+    try:
+        s3_path = upload_custom_model(model)
+    except Exception:
+        console.print_exception()
+        print_error("[red] Model failed to upload to S3")
+        quit()
+
+    huggingface_model = build_custom_huggingface_model(
+        deployment, model, s3_path)
+    endpoint_name = deployment.endpoint_name
 
     console.log(
         "Deploying model to AWS. [magenta]This may take up to 10 minutes for very large models.[/magenta] See full logs here:")
     console.print(
         f"https://{region_name}.console.aws.amazon.com/cloudwatch/home#logsV2:log-groups/log-group/$252Faws$252Fsagemaker$252FEndpoints$252F{endpoint_name}")
 
-    # create Hugging Face Model Class
-    huggingface_model = HuggingFaceModel(
-        # path to your trained sagemaker model
-        model_data=s3_path,
-        role=SAGEMAKER_ROLE,  # iam role with permissions to create an Endpoint
-        transformers_version="4.37",
-        pytorch_version="2.1",
-        py_version="py310",
-    )
-
     with console.status("[bold green]Deploying model...") as status:
         table = Table(show_header=False, header_style="magenta")
         table.add_column("Resource", style="dim")
@@ -161,8 +238,11 @@ def deploy_custom_huggingface_model(deployment: Deployment, model: Model):
             predictor = huggingface_model.deploy(
                 initial_instance_count=deployment.instance_count,
                 instance_type=deployment.instance_type,
-                endpoint_name=endpoint_name
+                endpoint_name=endpoint_name,
+                tags=get_endpoint_tags(model),
+                async_inference_config=get_async_inference_config(deployment),
             )
+            configure_async_endpoint(deployment)
         except Exception:
             console.print_exception()
             quit()
@@ -174,12 +254,18 @@ def deploy_custom_huggingface_model(deployment: Deployment, model: Model):
     return predictor
 
 
-def create_and_deploy_jumpstart_model(deployment: Deployment, model: Model):
-    region_name = session.region_name
-    endpoint_name = get_unique_endpoint_name(
+def build_jumpstart_model(deployment: Deployment, model: Model) -> JumpStartModel:
+    deployment.endpoint_name = get_unique_endpoint_name(
         model.id, deployment.endpoint_name)
-    deployment.endpoint_name = endpoint_name
     model.task = get_model_and_task(model.id)['task']
+    return JumpStartModel(
+        model_id=model.id, instance_type=deployment.instance_type, role=SAGEMAKER_ROLE)
+
+
+def create_and_deploy_jumpstart_model(deployment: Deployment, model: Model):
+    region_name = session.region_name
+    jumpstart_model = build_jumpstart_model(deployment, model)
+    endpoint_name = deployment.endpoint_name
 
     console.log(
         "Deploying model to AWS. [magenta]This may take up to 10 minutes for very large models.[/magenta] See full logs here:")
@@ -197,17 +283,17 @@ def create_and_deploy_jumpstart_model(deployment: Deployment, model: Model):
             deployment.instance_count))
         console.print(table)
 
-        jumpstart_model = JumpStartModel(
-            model_id=model.id, instance_type=deployment.instance_type, role=SAGEMAKER_ROLE)
-
         # Attempt to deploy to AWS
         try:
             predictor = jumpstart_model.deploy(
                 initial_instance_count=deployment.instance_count,
                 instance_type=deployment.instance_type,
                 endpoint_name=endpoint_name,
+                tags=get_endpoint_tags(model),
+                async_inference_config=get_async_inference_config(deployment),
                 accept_eula=True
             )
+            configure_async_endpoint(deployment)
             pass
         except Exception:
             console.print_exception()
@@ -218,3 +304,84 @@ def create_and_deploy_jumpstart_model(deployment: Deployment, model: Model):
         f"{model.id} is now up and running at the endpoint [blue]{predictor.endpoint_name}")
 
     return predictor
+
+
+def build_multi_data_model(deployment: Deployment, models: List[Model]) -> MultiDataModel:
+    """ Stage every model's artifact under one S3 prefix, served from a shared Hugging Face container """
+    if deployment.async_inference:
+        raise ValueError("Multi-model endpoints can't use async inference")
+    for model in models:
+        if model.source == ModelSource.Sagemaker:
+            raise ValueError(
+                f"{model.id}: JumpStart models can't be served from a multi-model endpoint")
+        if model.location is None:
+            raise ValueError(
+                f"{model.id}: multi-model endpoints need a model.tar.gz location for every model")
+
+    prefix = get_endpoint_name_prefix(models[0].id, deployment.endpoint_name)
+    deployment.endpoint_name = get_unique_endpoint_name(
+        models[0].id, deployment.endpoint_name)
+
+    bucket = sagemaker_session.default_bucket()
+    multi_data_model = MultiDataModel(
+        name=deployment.endpoint_name,
+        model_data_prefix=construct_s3_uri(bucket, f"multi-model/{prefix}/"),
+        # Container settings shared by every model on the endpoint
+        model=HuggingFaceModel(
+            role=SAGEMAKER_ROLE,
+            transformers_version="4.37",
+            pytorch_version="2.1",
+            py_version="py310",
+        ),
+        sagemaker_session=sagemaker_session,
+    )
+
+    for model in models:
+        if model.task is None:
+            model.task = get_model_and_task(model.id)['task']
+        # S3 artifacts are copied, local ones uploaded
+        multi_data_model.add_model(model.location, get_target_model(model))
+    return multi_data_model
+
+
+def deploy_multi_model(deployment: Deployment, models: List[Model]):
+    region_name = session.region_name
+    with console.status(f"[bold green]Staging {len(models)} models to S3...") as status:
+        try:
+            multi_data_model = build_multi_data_model(deployment, models)
+        except Exception:
+            console.print_exception()
+            quit()
+    endpoint_name = deployment.endpoint_name
+
+    console.log(
+        "Deploying model to AWS. [magenta]This may take up to 10 minutes for very large models.[/magenta] See full logs here:")
+    console.print(
+        f"https://{region_name}.console.aws.amazon.com/cloudwatch/home#logsV2:log-groups/log-group/$252Faws$252Fsagemaker$252FEndpoints$252F{endpoint_name}")
+
+    with console.status("[bold green]Deploying model...") as status:
+        table = Table(show_header=False, header_style="magenta")
+        table.add_column("Resource", style="dim")
+        table.add_column("Value", style="blue")
+        table.add_row("S3 Prefix", multi_data_model.model_data_prefix)
+        table.add_row("Models", ", ".join(model.id for model in models))
+        table.add_row("EC2 instance type", deployment.instance_type)
+        table.add_row("Number of instances", str(
+            deployment.instance_count))
+        console.print(table)
+
+        try:
+            multi_data_model.deploy(
+                initial_instance_count=deployment.instance_count,
+                instance_type=deployment.instance_type,
+                endpoint_name=endpoint_name
+            )
+        except Exception:
+            console.print_exception()
+            quit()
+
+    print_success(
+        f"{len(models)} models are now up and running at the endpoint [blue]{endpoint_name}")
+
+    write_config(deployment, *models)
+    return multi_data_model
@@ -1,17 +1,176 @@
-import boto3
+import datetime
+import fnmatch
+import re
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 from rich import print
-from src.utils.rich_utils import print_success
-from typing import List
+from src.config import delete_config
+from src.sagemaker.async_inference import remove_scale_to_zero
+from src.sagemaker.poller import EndpointPoller
+from src.sagemaker.resources import DESCRIBE_CONCURRENCY, describe_endpoint_config
+from src.session import get_client
+from src.utils.rich_utils import print_error, print_success
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
 
+DELETE_CONCURRENCY = 16
 
-def delete_sagemaker_model(endpoint_names: List[str] = None):
-    sagemaker_client = boto3.client('sagemaker')
+AGE_UNITS = {
+    "m": "minutes",
+    "h": "hours",
+    "d": "days",
+    "w": "weeks",
+}
 
-    if len(endpoint_names) == 0:
+
+class EndpointResources(NamedTuple):
+    endpoint_name: str
+    config_name: str
+    model_names: List[str]
+
+
+def parse_age(age: str) -> datetime.timedelta:
+    """ '30m', '12h', '7d' or '2w' """
+    match = re.fullmatch(r"(\d+)\s*([mhdw])", age.strip().lower())
+    if match is None:
+        raise ValueError(
+            f"Invalid age {age!r}, expected a number followed by m, h, d or w")
+    return datetime.timedelta(**{AGE_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def list_all_endpoints() -> List[Dict]:
+    paginator = get_client('sagemaker').get_paginator('list_endpoints')
+    return [endpoint for page in paginator.paginate(PaginationConfig={'PageSize': 100})
+            for endpoint in page['Endpoints']]
+
+
+def select_endpoints(endpoints: List[Dict], pattern: Optional[str] = None,
+                     older_than: Optional[datetime.timedelta] = None,
+                     now: Optional[datetime.datetime] = None) -> List[str]:
+    """ Names of the endpoints matching a glob `pattern` and created more than `older_than` ago """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    selected = []
+    for endpoint in endpoints:
+        if pattern is not None and not fnmatch.fnmatchcase(endpoint['EndpointName'], pattern):
+            continue
+        if older_than is not None and now - endpoint['CreationTime'] < older_than:
+            continue
+        selected.append(endpoint['EndpointName'])
+    return selected
+
+
+def describe_endpoint_resources(endpoint_name: str) -> Optional[EndpointResources]:
+    try:
+        config_name = get_client('sagemaker').describe_endpoint(
+            EndpointName=endpoint_name)['EndpointConfigName']
+    except ClientError as error:
+        # Deleted since it was listed
+        if error.response['Error']['Code'] == 'ValidationException':
+            return None
+        raise
+    endpoint_config = describe_endpoint_config(config_name)
+    model_names = [variant['ModelName']
+                   for variant in endpoint_config['ProductionVariants'] if variant.get('ModelName')]
+    return EndpointResources(endpoint_name, config_name, model_names)
+
+
+def ignore_missing(delete: Callable, **kwargs):
+    """ Deleting something that's already gone counts as done """
+    try:
+        delete(**kwargs)
+    except ClientError as error:
+        if error.response['Error']['Code'] != 'ValidationException':
+            raise
+
+
+def delete_sagemaker_model(endpoint_names: List[str] = None, poller: Optional[EndpointPoller] = None):
+    """ Delete endpoints along with the endpoint configs and models behind them.
+
+    Configs and models still used by an endpoint that isn't being deleted are
+    kept. Deletes are sent concurrently, then every endpoint is waited on in
+    one poll loop and its ./configs entry is removed once it's gone.
+    """
+    if endpoint_names is None or len(endpoint_names) == 0:
         print_success("No Endpoints to delete!")
         return
 
-    # Add validation / error handling
-    for endpoint in endpoint_names:
-        print(f"Deleting [blue]{endpoint}")
-        sagemaker_client.delete_endpoint(EndpointName=endpoint)
+    sagemaker_client = get_client('sagemaker')
+    poller = poller or EndpointPoller(initial_delay=2, max_delay=10)
+    to_delete = set(endpoint_names)
+
+    existing = [endpoint['EndpointName'] for endpoint in list_all_endpoints()]
+    for endpoint_name in to_delete.difference(existing):
+        print_error(f"Endpoint {endpoint_name} doesn't exist")
+
+    with ThreadPoolExecutor(max_workers=DESCRIBE_CONCURRENCY) as executor:
+        resources = list(executor.map(
+            describe_endpoint_resources, existing))
+
+    in_use_configs: Set[str] = set()
+    in_use_models: Set[str] = set()
+    config_names: Set[str] = set()
+    model_names: Set[str] = set()
+    for resource in resources:
+        if resource is None:
+            continue
+        if resource.endpoint_name in to_delete:
+            config_names.add(resource.config_name)
+            model_names.update(resource.model_names)
+        else:
+            in_use_configs.add(resource.config_name)
+            in_use_models.update(resource.model_names)
+    config_names -= in_use_configs
+    model_names -= in_use_models
+    deleting = [endpoint_name for endpoint_name in existing if endpoint_name in to_delete]
+
+    # The SageMaker SDK gives an endpoint, its config and its model the same name
+    failed: Dict[Tuple[str, str], Exception] = {}
+    with ThreadPoolExecutor(max_workers=DELETE_CONCURRENCY) as executor:
+        # Async endpoints that scale to zero leave their scaling policies and alarm behind
+        futures = {("autoscaling for", endpoint_name): executor.submit(remove_scale_to_zero, endpoint_name)
+                   for endpoint_name in deleting}
+        for key, future in futures.items():
+            try:
+                future.result()
+            except Exception as error:
+                failed[key] = error
+
+        futures = {}
+        for endpoint_name in deleting:
+            print(f"Deleting [blue]{endpoint_name}")
+            futures[("endpoint", endpoint_name)] = executor.submit(
+                ignore_missing, sagemaker_client.delete_endpoint, EndpointName=endpoint_name)
+        # Configs and models can go while their endpoint is still shutting down
+        for config_name in config_names:
+            futures[("endpoint config", config_name)] = executor.submit(
+                ignore_missing, sagemaker_client.delete_endpoint_config, EndpointConfigName=config_name)
+        for model_name in model_names:
+            futures[("model", model_name)] = executor.submit(
+                ignore_missing, sagemaker_client.delete_model, ModelName=model_name)
+
+        for key, future in futures.items():
+            try:
+                future.result()
+            except Exception as error:
+                failed[key] = error
+
+    for (kind, name), error in failed.items():
+        print_error(f"Failed to delete {kind} {name}: {error}")
+
+    statuses = poller.wait([endpoint_name for endpoint_name in deleting if ("endpoint", endpoint_name) not in failed],
+                           lambda endpoint_name, status: status != "Deleting")
+    deleted = [endpoint_name for endpoint_name,
+               status in statuses.items() if status is None]
+    for endpoint_name, status in statuses.items():
+        if status is not None:
+            print_error(f"{endpoint_name} is {status} instead of deleted")
+
+    for endpoint_name in deleted:
+        delete_config(endpoint_name)
+
+    deleted_configs = [name for name in config_names if (
+        "endpoint config", name) not in failed]
+    deleted_models = [name for name in model_names if (
+        "model", name) not in failed]
+    print_success(
+        f"Deleted {len(deleted)} endpoints, {len(deleted_configs)} endpoint configs and {len(deleted_models)} models")
+    return deleted
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from src.schemas.model import Model
+from src.session import get_client
+from src.utils.cache import SqliteCache, get_cache_dir
+from typing import Dict, List, Optional
+
+# Endpoint tags that record what's deployed, so any host can rebuild the index
+TAG_PREFIX = "model-manager:"
+MODEL_ID_TAG = f"{TAG_PREFIX}model-id"
+TAG_FIELDS = {
+    f"{TAG_PREFIX}model-id": "model_id",
+    f"{TAG_PREFIX}task": "task",
+    f"{TAG_PREFIX}source": "source",
+    f"{TAG_PREFIX}revision": "revision",
+}
+
+# Misses trigger a rebuild from tags at most this often
+REBUILD_INTERVAL = 300
+
+
+def get_endpoint_tags(model: Model) -> List[Dict[str, str]]:
+    """ Tags for a single-model endpoint, passed to deploy() """
+    entry = {
+        "model_id": model.id,
+        "task": model.task,
+        "source": model.source,
+        "revision": model.revision,
+    }
+    return [{"Key": key, "Value": str(entry[field])}
+            for key, field in TAG_FIELDS.items() if entry[field] is not None]
+
+
+def get_endpoint_name_from_arn(arn: str) -> str:
+    # arn:aws:sagemaker:<region>:<account>:endpoint/<name>
+    return arn.split(":endpoint/", 1)[1]
+
+
+class EndpointIndex:
+    """ Persistent endpoint name -> model id, task, source and revision.
+
+    Written whenever a config is written, and mirrored into endpoint tags at
+    deploy time. `rebuild` restores it from those tags with one paginated
+    Resource Groups Tagging API scan, e.g. on a fresh host.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.store = SqliteCache(path or os.path.join(
+            get_cache_dir(), "endpoints.sqlite"))
+        self._last_rebuild: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(endpoint_name: str) -> str:
+        # Endpoint names are case insensitive and ARNs lowercase them
+        return endpoint_name.lower()
+
+    def get(self, endpoint_name: str) -> Optional[Dict[str, Optional[str]]]:
+        return self.store.get(self.key(endpoint_name))
+
+    def put(self, endpoint_name: str, model: Model):
+        self.store.set(self.key(endpoint_name), {
+            "model_id": model.id,
+            "task": model.task,
+            "source": model.source,
+            "revision": model.revision,
+        })
+
+    def delete(self, endpoint_name: str):
+        self.store.delete(self.key(endpoint_name))
+
+    def rebuild(self) -> int:
+        """ Index every endpoint tagged with a model id and return how many were found """
+        paginator = get_client('resourcegroupstaggingapi').get_paginator('get_resources')
+        count = 0
+        for page in paginator.paginate(ResourceTypeFilters=['sagemaker:endpoint'],
+                                       TagFilters=[{'Key': MODEL_ID_TAG}]):
+            for resource in page['ResourceTagMappingList']:
+                tags = {tag['Key']: tag['Value'] for tag in resource['Tags']}
+                entry = {field: tags.get(key) for key, field in TAG_FIELDS.items()}
+                self.store.set(self.key(get_endpoint_name_from_arn(
+                    resource['ResourceARN'])), entry)
+                count += 1
+        self._last_rebuild = time.monotonic()
+        return count
+
+    def lookup(self, endpoint_name: str) -> Optional[Dict[str, Optional[str]]]:
+        """ Like get, but a miss rebuilds the index from tags unless that happened recently """
+        entry = self.get(endpoint_name)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            if self._last_rebuild is None or time.monotonic() - self._last_rebuild > REBUILD_INTERVAL:
+                try:
+                    self.rebuild()
+                except Exception:
+                    # Tagging API permissions are optional
+                    self._last_rebuild = time.monotonic()
+                    return None
+        return self.get(endpoint_name)
+
+
+_endpoint_index: Optional[EndpointIndex] = None
+_endpoint_index_lock = threading.Lock()
+
+
+def get_endpoint_index() -> EndpointIndex:
+    global _endpoint_index
+    with _endpoint_index_lock:
+        if _endpoint_index is None:
+            _endpoint_index = EndpointIndex()
+    return _endpoint_index
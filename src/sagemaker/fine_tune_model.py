@@ -2,7 +2,6 @@ import logging
 import os
 import sagemaker
 from botocore.exceptions import ClientError
-from datasets import load_dataset
 from rich import print
 from rich.table import Table
 from sagemaker.jumpstart.estimator import JumpStartEstimator
@@ -12,7 +11,6 @@ from src.schemas.training import Training
 from src.session import sagemaker_session
 from src.utils.aws_utils import is_s3_uri
 from src.utils.rich_utils import print_success, print_error
-from transformers import AutoTokenizer
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -20,6 +18,9 @@ SAGEMAKER_ROLE = os.environ.get("SAGEMAKER_ROLE")
 
 
 def prep_hf_data(s3_bucket: str, dataset_name_or_path: str, model: Model):
+    from datasets import load_dataset
+    from transformers import AutoTokenizer
+
     train_dataset, test_dataset = load_dataset(
         dataset_name_or_path, split=["train", "test"])
     tokenizer = AutoTokenizer.from_pretrained(model.id)
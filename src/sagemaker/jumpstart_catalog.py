@@ -0,0 +1,179 @@
+import bisect
+import difflib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from src.session import get_sagemaker_session, session
+from src.utils.cache import get_cache_dir
+from typing import Dict, Iterable, List, Optional, Set
+
+CATALOG_CACHE_TTL = float(os.environ.get(
+    "MODEL_MANAGER_JUMPSTART_CACHE_TTL", 24 * 60 * 60))
+
+# Weights for how a query token matched a model id token
+EXACT_MATCH = 3.0
+PREFIX_MATCH = 2.0
+FUZZY_MATCH = 1.0
+
+_catalogs: Dict[str, "JumpStartCatalog"] = {}
+_catalogs_lock = threading.Lock()
+_catalogs_refreshing = set()
+
+
+def is_offline() -> bool:
+    return os.environ.get("MODEL_MANAGER_OFFLINE", "").lower() in ("1", "true", "yes")
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in re.split(r"[\s\-_/.]+", text.lower()) if token]
+
+
+class JumpStartCatalog:
+    """ Snapshot of the JumpStart model ids, indexed for search.
+
+    Ids look like "<framework>-<task>-<name>", e.g. huggingface-tc-bert-base-cased,
+    so they're indexed by framework, by SagemakerTask code and by name token.
+    Query tokens match tokens exactly, by prefix (binary search over the
+    sorted vocabulary) or, failing that, by edit similarity, and results
+    are ranked by how well every query token matched.
+    """
+
+    def __init__(self, model_ids: Iterable[str], fetched_at: Optional[float] = None):
+        self.model_ids = sorted(set(model_ids))
+        self.fetched_at = fetched_at or time.time()
+        self.by_framework: Dict[str, List[str]] = defaultdict(list)
+        self.by_task: Dict[str, List[str]] = defaultdict(list)
+        self.by_token: Dict[str, Set[str]] = defaultdict(set)
+        for model_id in self.model_ids:
+            components = model_id.split("-")
+            self.by_framework[components[0]].append(model_id)
+            if len(components) > 1:
+                self.by_task[components[1]].append(model_id)
+            for token in tokenize(model_id):
+                self.by_token[token].add(model_id)
+        self.vocabulary = sorted(self.by_token)
+
+    def _prefixed(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + "\uffff")
+        return self.vocabulary[start:end]
+
+    def _match_token(self, query_token: str) -> Dict[str, float]:
+        """ Score per model id for a single query token """
+        scores: Dict[str, float] = {}
+        for token in self._prefixed(query_token):
+            weight = EXACT_MATCH if token == query_token else PREFIX_MATCH
+            for model_id in self.by_token[token]:
+                scores[model_id] = max(scores.get(model_id, 0.0), weight)
+
+        if not scores:
+            # Typos, e.g. "lama" for "llama"
+            for token in difflib.get_close_matches(query_token, self.vocabulary, n=5, cutoff=0.75):
+                for model_id in self.by_token[token]:
+                    scores[model_id] = max(
+                        scores.get(model_id, 0.0), FUZZY_MATCH)
+        return scores
+
+    def search(self, query: str = "", framework: Optional[str] = None, task: Optional[str] = None,
+               limit: Optional[int] = None) -> List[str]:
+        candidates: Optional[Set[str]] = None
+        if framework is not None:
+            candidates = set(self.by_framework.get(framework, []))
+        if task is not None:
+            by_task = set(self.by_task.get(task, []))
+            candidates = by_task if candidates is None else candidates & by_task
+
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            results = self.model_ids if candidates is None else sorted(candidates)
+            return results[:limit]
+
+        totals: Optional[Dict[str, float]] = None
+        for query_token in query_tokens:
+            scores = self._match_token(query_token)
+            # Every query token has to match
+            totals = scores if totals is None else {
+                model_id: totals[model_id] + score for model_id, score in scores.items() if model_id in totals}
+        if candidates is not None:
+            totals = {model_id: score for model_id, score in totals.items()
+                      if model_id in candidates}
+
+        # Best matches first, then the shortest (most general) ids
+        ranked = sorted(totals, key=lambda model_id: (-totals[model_id], len(model_id), model_id))
+        return ranked[:limit]
+
+
+def get_catalog_cache_path(region_name: str) -> str:
+    return os.path.join(get_cache_dir(), f"jumpstart-models-{region_name}.json")
+
+
+def fetch_jumpstart_model_ids(region_name: str) -> List[str]:
+    from sagemaker.jumpstart.notebook_utils import list_jumpstart_models
+    return list_jumpstart_models(region=region_name, sagemaker_session=get_sagemaker_session())
+
+
+def refresh_jumpstart_catalog(region_name: str) -> JumpStartCatalog:
+    model_ids = fetch_jumpstart_model_ids(region_name)
+    catalog = JumpStartCatalog(model_ids)
+
+    path = get_catalog_cache_path(region_name)
+    with open(f"{path}.tmp", 'w') as cache:
+        json.dump({'fetched_at': catalog.fetched_at,
+                  'model_ids': catalog.model_ids}, cache)
+    os.replace(f"{path}.tmp", path)
+
+    with _catalogs_lock:
+        _catalogs[region_name] = catalog
+    return catalog
+
+
+def _refresh_jumpstart_catalog_in_background(region_name: str):
+    with _catalogs_lock:
+        if region_name in _catalogs_refreshing:
+            return
+        _catalogs_refreshing.add(region_name)
+
+    def refresh():
+        try:
+            refresh_jumpstart_catalog(region_name)
+        except Exception:
+            logging.debug("Failed to refresh the JumpStart catalog", exc_info=True)
+        finally:
+            with _catalogs_lock:
+                _catalogs_refreshing.discard(region_name)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def get_jumpstart_catalog(region_name: Optional[str] = None) -> JumpStartCatalog:
+    """ The JumpStart catalog for a region, from memory, then the disk snapshot, then the network.
+
+    Snapshots older than MODEL_MANAGER_JUMPSTART_CACHE_TTL are still used
+    while a background thread refreshes them. With MODEL_MANAGER_OFFLINE
+    set, only the snapshot is used.
+    """
+    region_name = region_name or session.region_name
+    with _catalogs_lock:
+        catalog = _catalogs.get(region_name)
+
+    if catalog is None:
+        try:
+            with open(get_catalog_cache_path(region_name)) as cache:
+                snapshot = json.load(cache)
+            catalog = JumpStartCatalog(
+                snapshot['model_ids'], snapshot['fetched_at'])
+            with _catalogs_lock:
+                _catalogs[region_name] = catalog
+        except (OSError, ValueError, KeyError):
+            if is_offline():
+                raise LookupError(
+                    f"No JumpStart catalog snapshot for {region_name} and MODEL_MANAGER_OFFLINE is set")
+            return refresh_jumpstart_catalog(region_name)
+
+    if not is_offline() and time.time() - catalog.fetched_at > CATALOG_CACHE_TTL:
+        _refresh_jumpstart_catalog_in_background(region_name)
+    return catalog
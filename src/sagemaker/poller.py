@@ -0,0 +1,59 @@
+import time
+from src.session import get_client
+from typing import Callable, Dict, Iterable, Optional
+
+
+class EndpointPoller:
+    """ Tracks the status of many endpoints with one paginated list_endpoints sweep per poll.
+
+    The delay between polls grows by `backoff` up to `max_delay`, so long
+    rollouts don't hammer the SageMaker control plane.
+    """
+
+    def __init__(self, initial_delay: float = 5.0, max_delay: float = 30.0, backoff: float = 1.5):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+
+    def statuses(self, endpoint_names: Iterable[str]) -> Dict[str, Optional[str]]:
+        """ Current status per endpoint, or None if it doesn't exist (yet or anymore) """
+        endpoint_names = set(endpoint_names)
+        statuses = {endpoint_name: None for endpoint_name in endpoint_names}
+        paginator = get_client('sagemaker').get_paginator('list_endpoints')
+        for page in paginator.paginate(PaginationConfig={'PageSize': 100}):
+            for endpoint in page['Endpoints']:
+                if endpoint['EndpointName'] in endpoint_names:
+                    statuses[endpoint['EndpointName']] = endpoint['EndpointStatus']
+        return statuses
+
+    def wait(self, endpoint_names: Iterable[str], done: Callable[[str, Optional[str]], bool],
+             on_update: Optional[Callable[[Dict[str, Optional[str]]], None]] = None,
+             timeout: Optional[float] = None) -> Dict[str, Optional[str]]:
+        """ Poll until `done(endpoint_name, status)` holds for every endpoint, or `timeout` seconds pass.
+
+        Endpoints still pending at the timeout are left out of the results.
+        """
+        pending = set(endpoint_names)
+        results = {}
+        delay = self.initial_delay
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while pending:
+            statuses = self.statuses(pending)
+            for endpoint_name, status in statuses.items():
+                if done(endpoint_name, status):
+                    pending.discard(endpoint_name)
+                    results[endpoint_name] = status
+
+            if on_update is not None:
+                on_update(statuses)
+            if not pending:
+                break
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                delay = min(delay, remaining)
+            time.sleep(delay)
+            delay = min(delay * self.backoff, self.max_delay)
+        return results
@@ -1,28 +1,140 @@
-import boto3
+import asyncio
 import json
-import inquirer
-from InquirerPy import prompt
-from sagemaker.huggingface.model import HuggingFacePredictor
 from src.config import ModelDeployment
 from src.console import console
 from src.sagemaker import SagemakerTask
+from src.sagemaker.runtime import get_async_runtime
 from src.huggingface import HuggingFaceTask
-from src.utils.model_utils import get_model_and_task, is_sagemaker_model, get_text_generation_hyperpameters
+from src.utils.model_utils import (get_model_and_task, get_target_model, is_sagemaker_model, is_tgi_model,
+                                   get_text_generation_hyperpameters)
 from src.utils.rich_utils import print_error
 from src.schemas.deployment import Deployment
 from src.schemas.model import Model
 from src.schemas.query import Query
-from src.session import sagemaker_session
-from typing import Dict, Tuple, Optional
+from src.session import get_client
+from src.tracing import get_token_counts, is_recording, set_attributes, start_span
+from src.utils.cache import TTLCache
+from typing import Any, Dict, NamedTuple, Tuple, Optional
+
+
+class QueryRequest(NamedTuple):
+    task: Optional[str]
+    content_type: str
+    accept: str
+    body: bytes
+    target_model: Optional[str] = None
+    # The body before TGI details were asked for to trace token usage. The details are
+    # dropped from the response, and cache keys use this body so traced requests still hit.
+    untraced_body: Optional[bytes] = None
+
+
+class ResolvedEndpoint(NamedTuple):
+    is_sagemaker: bool
+    task: Optional[str]
+
+
+# Endpoints without a config -> how they were resolved, so the event loop only waits on it once
+_resolved_endpoints = TTLCache(maxsize=1024, ttl=3600)
 
 
 def make_query_request(endpoint_name: str, query: Query, config: Tuple[Deployment, Model]):
+    if config is not None and config[0].async_inference:
+        return query_async_endpoint(endpoint_name, query, config)
     if is_sagemaker_model(endpoint_name, config):
         return query_sagemaker_endpoint(endpoint_name, query, config)
     else:
         return query_hugging_face_endpoint(endpoint_name, query, config)
 
 
+async def make_query_request_async(endpoint_name: str, query: Query, config: Tuple[Deployment, Model]):
+    """ Non-blocking variant of make_query_request for the server. Errors are raised instead of exiting. """
+    request = await build_query_request_async(endpoint_name, query, config)
+    return await invoke_query_request_async(endpoint_name, request)
+
+
+async def invoke_query_request_async(endpoint_name: str, request: QueryRequest):
+    response = await get_async_runtime().invoke_endpoint(**get_invoke_kwargs(endpoint_name, request))
+    with start_span("parse_response", **{"model_manager.response_bytes": len(response['Body'])}) as span:
+        result = json.loads(response['Body'])
+        set_attributes(span, **get_token_counts(result))
+    if request.untraced_body is not None and isinstance(result, list):
+        for generation in result:
+            if isinstance(generation, dict):
+                generation.pop("details", None)
+    return result
+
+
+def resolve_endpoint(endpoint_name: str, config: Optional[Tuple[Deployment, Model]] = None) -> ResolvedEndpoint:
+    """ Without a config this reads the endpoint index, and may scan tags or search the hub """
+    return ResolvedEndpoint(is_sagemaker_model(endpoint_name, config),
+                            get_model_and_task(endpoint_name, config)['task'])
+
+
+def build_query_request(endpoint_name: str, query: Query, config: Tuple[Deployment, Model],
+                        resolved: Optional[ResolvedEndpoint] = None) -> QueryRequest:
+    with start_span("build_query_request", **{"model_manager.endpoint": endpoint_name}) as span:
+        resolved = resolved or resolve_endpoint(endpoint_name, config)
+        if resolved.is_sagemaker:
+            request = build_sagemaker_request(endpoint_name, query, config, resolved.task)
+        else:
+            request = build_hugging_face_request(endpoint_name, query, config, resolved.task)
+            # Only TGI takes details, and async results come back through S3 untouched
+            if is_recording(span) and config is not None and is_tgi_model(config[1]) and \
+                    not config[0].async_inference:
+                request = with_token_details(request)
+        set_attributes(span, **{"model_manager.task": str(request.task) if request.task else None,
+                                "model_manager.payload_bytes": len(request.body)})
+    return request
+
+
+def with_token_details(request: QueryRequest) -> QueryRequest:
+    """ Ask TGI to count the prompt and generated tokens, unless the query asked for details itself """
+    payload = json.loads(request.body)
+    parameters = payload.get("parameters") or {}
+    if "details" in parameters or "decoder_input_details" in parameters:
+        return request
+    payload["parameters"] = {**parameters, "details": True, "decoder_input_details": True}
+    return request._replace(body=json.dumps(payload).encode("utf-8"), untraced_body=request.body)
+
+
+async def build_query_request_async(endpoint_name: str, query: Query,
+                                    config: Optional[Tuple[Deployment, Model]]) -> QueryRequest:
+    """ build_query_request for the event loop.
+
+    With a config it's CPU work only. Without one, the endpoint is resolved
+    in a thread once and remembered.
+    """
+    if config is None:
+        resolved = _resolved_endpoints.get(endpoint_name)
+        if resolved is None:
+            resolved = await asyncio.to_thread(resolve_endpoint, endpoint_name)
+            _resolved_endpoints.set(endpoint_name, resolved)
+        return build_query_request(endpoint_name, query, config, resolved)
+    return build_query_request(endpoint_name, query, config)
+
+
+def get_target_model_for_config(config: Optional[Tuple[Deployment, Model]]) -> Optional[str]:
+    """ Multi-model endpoints have to be told which of their models to invoke """
+    if config is None or not config[0].multi_model:
+        return None
+    return get_target_model(config[1])
+
+
+def get_invoke_kwargs(endpoint_name: str, request: QueryRequest) -> Dict[str, Any]:
+    kwargs = dict(EndpointName=endpoint_name, ContentType=request.content_type,
+                  Body=request.body, Accept=request.accept)
+    if request.target_model is not None:
+        kwargs['TargetModel'] = request.target_model
+    return kwargs
+
+
+def invoke_endpoint(endpoint_name: str, request: QueryRequest):
+    client = get_client('sagemaker-runtime')
+    response = client.invoke_endpoint(
+        **get_invoke_kwargs(endpoint_name, request))
+    return json.loads(response['Body'].read())
+
+
 def parse_response(query_response):
     model_predictions = json.loads(query_response['Body'].read())
     probabilities, labels, predicted_label = model_predictions[
@@ -30,10 +142,10 @@ def parse_response(query_response):
     return probabilities, labels, predicted_label
 
 
-def query_hugging_face_endpoint(endpoint_name: str, user_query: Query, config: Tuple[Deployment, Model]):
-    task = get_model_and_task(endpoint_name, config)['task']
-    predictor = HuggingFacePredictor(endpoint_name=endpoint_name,
-                                     sagemaker_session=sagemaker_session)
+def build_hugging_face_request(endpoint_name: str, user_query: Query, config: Tuple[Deployment, Model],
+                               task: Optional[str] = None) -> QueryRequest:
+    if task is None:
+        task = get_model_and_task(endpoint_name, config)['task']
 
     query = user_query.query
     context = user_query.context
@@ -41,6 +153,7 @@ def query_hugging_face_endpoint(endpoint_name: str, user_query: Query, config: T
     input = {"inputs": query}
     if task is not None and task == HuggingFaceTask.QuestionAnswering:
         if context is None:
+            from InquirerPy import prompt
             questions = [{
                 "type": "input", "message": "What context would you like to provide?:", "name": "context"}]
             answers = prompt(questions)
@@ -50,7 +163,7 @@ def query_hugging_face_endpoint(endpoint_name: str, user_query: Query, config: T
             raise Exception("Must provide context for question-answering")
 
         input = {}
-        input['context'] = answers['context']
+        input['context'] = context
         input['question'] = query
 
     if task is not None and task == HuggingFaceTask.TextGeneration:
@@ -59,6 +172,7 @@ def query_hugging_face_endpoint(endpoint_name: str, user_query: Query, config: T
 
     if task is not None and task == HuggingFaceTask.ZeroShotClassification:
         if context is None:
+            import inquirer
             questions = [
                 inquirer.Text('labels',
                               message="What labels would you like to use? (comma separated values)?",
@@ -72,13 +186,25 @@ def query_hugging_face_endpoint(endpoint_name: str, user_query: Query, config: T
                 "Must provide labels for zero shot text classification")
 
         labels = context.split(',')
-        input = json.dumps({
+        input = {
             "sequences": query,
             "candidate_labels": labels
-        })
+        }
+
+    return QueryRequest(
+        task=task,
+        content_type="application/json",
+        accept="application/json",
+        body=json.dumps(input).encode("utf-8"),
+        target_model=get_target_model_for_config(config),
+    )
+
+
+def query_hugging_face_endpoint(endpoint_name: str, user_query: Query, config: Tuple[Deployment, Model]):
+    request = build_hugging_face_request(endpoint_name, user_query, config)
 
     try:
-        result = predictor.predict(input)
+        result = invoke_endpoint(endpoint_name, request)
     except Exception:
         console.print_exception()
         quit()
@@ -87,9 +213,10 @@ def query_hugging_face_endpoint(endpoint_name: str, user_query: Query, config: T
     return result
 
 
-def query_sagemaker_endpoint(endpoint_name: str, user_query: Query, config: Tuple[Deployment, Model]):
-    client = boto3.client('runtime.sagemaker')
-    task = get_model_and_task(endpoint_name, config)['task']
+def build_sagemaker_request(endpoint_name: str, user_query: Query, config: Tuple[Deployment, Model],
+                            task: Optional[str] = None) -> QueryRequest:
+    if task is None:
+        task = get_model_and_task(endpoint_name, config)['task']
 
     if task not in [
         SagemakerTask.ExtractiveQuestionAnswering,
@@ -126,6 +253,7 @@ https://docs.aws.amazon.com/sagemaker/latest/APIReference/API_runtime_InvokeEndp
     match task:
         case SagemakerTask.ExtractiveQuestionAnswering:
             if context is None:
+                from InquirerPy import prompt
                 questions = [
                     {
                         'type': 'input',
@@ -144,6 +272,7 @@ https://docs.aws.amazon.com/sagemaker/latest/APIReference/API_runtime_InvokeEndp
 
         case SagemakerTask.SentencePairClassification:
             if context is None:
+                import inquirer
                 questions = [
                     inquirer.Text('context',
                                   message="What sentence would you like to compare against?",
@@ -159,6 +288,7 @@ https://docs.aws.amazon.com/sagemaker/latest/APIReference/API_runtime_InvokeEndp
             input = json.dumps([query, context]).encode("utf-8")
         case SagemakerTask.ZeroShotTextClassification:
             if context is None:
+                import inquirer
                 questions = [
                     inquirer.Text('labels',
                                   message="What labels would you like to use? (comma separated values)?",
@@ -185,14 +315,44 @@ https://docs.aws.amazon.com/sagemaker/latest/APIReference/API_runtime_InvokeEndp
             }).encode("utf-8")
             content_type = "application/json"
 
+    return QueryRequest(
+        task=task,
+        content_type=content_type,
+        accept=accept_type,
+        body=input,
+        target_model=get_target_model_for_config(config),
+    )
+
+
+def query_async_endpoint(endpoint_name: str, user_query: Query, config: Tuple[Deployment, Model]):
+    """ Queue the query on an async endpoint and wait for its result, however long the model takes """
+    from src.sagemaker.async_inference import AsyncStatus, submit_async_request, wait_for_async_result
+    request = build_query_request(endpoint_name, user_query, config)
+
+    try:
+        inference = submit_async_request(endpoint_name, config[0], request)
+        with console.status(f"[bold green]Waiting for {inference.inference_id}..."):
+            status, result = wait_for_async_result(inference)
+    except Exception:
+        console.print_exception()
+        quit()
+
+    if status == AsyncStatus.Failed:
+        print_error(result)
+        return None
+    print(result)
+    return result
+
+
+def query_sagemaker_endpoint(endpoint_name: str, user_query: Query, config: Tuple[Deployment, Model]):
+    request = build_sagemaker_request(endpoint_name, user_query, config)
+
     try:
-        response = client.invoke_endpoint(
-            EndpointName=endpoint_name, ContentType=content_type, Body=input, Accept=accept_type)
+        model_predictions = invoke_endpoint(endpoint_name, request)
     except Exception:
         console.print_exception()
         quit()
 
-    model_predictions = json.loads(response['Body'].read())
     print(model_predictions)
     return model_predictions
 
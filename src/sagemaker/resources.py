@@ -1,25 +1,68 @@
-import boto3
-from functools import lru_cache
-from InquirerPy import inquirer
+import json
+import logging
+import os
+import threading
+import time
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from enum import StrEnum
 from src.console import console
 from src.sagemaker import EC2Instance
 from src.config import get_config_for_endpoint
+from src.session import get_client, session
+from src.utils.cache import TTLCache, get_cache_dir
 from src.utils.format import format_sagemaker_endpoint, format_python_dict
 from typing import List, Tuple, Dict, Optional
 
+# Endpoint configs are immutable, so their details can be reused between listings
+_endpoint_configs = TTLCache(maxsize=4096, ttl=300)
+DESCRIBE_CONCURRENCY = 16
 
-def list_sagemaker_endpoints(filter_str: str = None) -> List[str]:
-    sagemaker_client = boto3.client('sagemaker')
 
-    endpoints = sagemaker_client.list_endpoints()['Endpoints']
+def describe_endpoint_config(config_name: str) -> Dict:
+    endpoint_config = _endpoint_configs.get(config_name)
+    if endpoint_config is None:
+        endpoint_config = get_client('sagemaker').describe_endpoint_config(
+            EndpointConfigName=config_name)
+        _endpoint_configs.set(config_name, endpoint_config)
+    return endpoint_config
+
+
+def describe_endpoint_config_for_endpoint(endpoint_name: str) -> Dict:
+    # Endpoints deployed by the SageMaker SDK share their config's name
+    try:
+        return describe_endpoint_config(endpoint_name)
+    except ClientError as error:
+        if error.response['Error']['Code'] != 'ValidationException':
+            raise
+
+    config_name = get_client('sagemaker').describe_endpoint(
+        EndpointName=endpoint_name)['EndpointConfigName']
+    return describe_endpoint_config(config_name)
+
+
+def list_sagemaker_endpoints(filter_str: str = None) -> List[Dict]:
+    sagemaker_client = get_client('sagemaker')
+
+    kwargs = {}
+    if filter_str is not None:
+        kwargs['NameContains'] = filter_str
+
+    paginator = sagemaker_client.get_paginator('list_endpoints')
+    endpoints = [endpoint for page in paginator.paginate(**kwargs)
+                 for endpoint in page['Endpoints']]
     if filter_str is not None:
         endpoints = list(filter(lambda x: filter_str ==
                          x['EndpointName'], endpoints))
 
-    for endpoint in endpoints:
-        endpoint_config = sagemaker_client.describe_endpoint_config(
-            EndpointConfigName=endpoint['EndpointName'])['ProductionVariants'][0]
-        endpoint['InstanceType'] = endpoint_config['InstanceType']
+    if len(endpoints) == 0:
+        return endpoints
+
+    with ThreadPoolExecutor(max_workers=min(DESCRIBE_CONCURRENCY, len(endpoints))) as executor:
+        endpoint_configs = executor.map(
+            lambda endpoint: describe_endpoint_config_for_endpoint(endpoint['EndpointName']), endpoints)
+        for endpoint, endpoint_config in zip(endpoints, endpoint_configs):
+            endpoint['InstanceType'] = endpoint_config['ProductionVariants'][0]['InstanceType']
     return endpoints
 
 
@@ -49,39 +92,116 @@ def get_sagemaker_endpoint(endpoint_name: str) -> Optional[Dict[str, Optional[Di
     }
 
 
-@lru_cache
-def list_service_quotas() -> List[Tuple[str, int]]:
-    """ Gets a list of EC2 instances for inference """
+class QuotaUsage(StrEnum):
+    Endpoint = "endpoint"
+    Training = "training"
+    Transform = "transform"
+
+
+# Quota names look like "ml.m5.xlarge for endpoint usage"
+QUOTA_USAGE_SUFFIXES = {
+    QuotaUsage.Endpoint: " for endpoint usage",
+    QuotaUsage.Training: " for training job usage",
+    QuotaUsage.Transform: " for transform job usage",
+}
+
+QUOTA_CACHE_TTL = float(os.environ.get(
+    "MODEL_MANAGER_QUOTA_CACHE_TTL", 24 * 60 * 60))
+
+_quotas: Dict[str, Dict] = {}
+_quotas_lock = threading.Lock()
+_quotas_refreshing = set()
+
+
+def get_quota_cache_path(region_name: str) -> str:
+    return os.path.join(get_cache_dir(), f"service-quotas-{region_name}.json")
 
-    client = boto3.client('service-quotas')
+
+def fetch_service_quotas() -> Optional[Dict[str, List[Tuple[str, int]]]]:
+    """ Pages through the SageMaker service quotas and indexes available instances by usage """
+    client = get_client('service-quotas')
     quotas = []
     try:
-        response = client.list_service_quotas(
-            ServiceCode="sagemaker",
-            MaxResults=100,
-        )
-        next_token = response.get('NextToken')
-        quotas = response['Quotas']
-        while next_token is not None:
-            response = client.list_service_quotas(
-                ServiceCode="sagemaker",
-                NextToken=next_token,
-            )
-            quotas.extend(response['Quotas'])
-            next_token = response.get('NextToken')
+        paginator = client.get_paginator('list_service_quotas')
+        for page in paginator.paginate(ServiceCode="sagemaker", PaginationConfig={'PageSize': 100}):
+            quotas.extend(page['Quotas'])
     except client.exceptions.AccessDeniedException as error:
         console.print(
             "[red]User does not have access to Service Quotas. Grant access via IAM to get the list of available instances")
-        return []
+        return None
+
+    instances_by_usage = {usage.value: [] for usage in QuotaUsage}
+    for quota in quotas:
+        if quota['Value'] <= 0:
+            continue
+        for usage, suffix in QUOTA_USAGE_SUFFIXES.items():
+            if quota['QuotaName'].endswith(suffix):
+                # Clean up quota names
+                instances_by_usage[usage].append(
+                    (quota['QuotaName'].split(" ")[0], quota['Value']))
+    return instances_by_usage
+
+
+def refresh_service_quotas(region_name: str) -> Optional[Dict]:
+    instances_by_usage = fetch_service_quotas()
+    if instances_by_usage is None:
+        return None
+
+    entry = {'fetched_at': time.time(), 'instances': instances_by_usage}
+    path = get_quota_cache_path(region_name)
+    with open(f"{path}.tmp", 'w') as cache:
+        json.dump(entry, cache)
+    os.replace(f"{path}.tmp", path)
+
+    with _quotas_lock:
+        _quotas[region_name] = entry
+    return entry
+
+
+def _refresh_service_quotas_in_background(region_name: str):
+    with _quotas_lock:
+        if region_name in _quotas_refreshing:
+            return
+        _quotas_refreshing.add(region_name)
 
-    # TODO: Filter for different usages
-    available_instances = list(filter(lambda x: 'endpoint usage' in x[0] and x[1] > 0, [
-                               (quota['QuotaName'], quota['Value']) for quota in quotas]))
+    def refresh():
+        try:
+            refresh_service_quotas(region_name)
+        except Exception:
+            logging.debug("Failed to refresh service quotas", exc_info=True)
+        finally:
+            with _quotas_lock:
+                _quotas_refreshing.discard(region_name)
 
-    # Clean up quota names
-    available_instances = [(instance[0].split(" ")[0], instance[1])
-                           for instance in available_instances]
-    return available_instances
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def list_service_quotas(usage: QuotaUsage = QuotaUsage.Endpoint) -> List[Tuple[str, int]]:
+    """ Gets a list of EC2 instances available for the given usage.
+
+    Quotas are cached on disk. Once the cache is older than
+    MODEL_MANAGER_QUOTA_CACHE_TTL the stale list is still returned right away
+    while a background thread refreshes it.
+    """
+    region_name = session.region_name
+    with _quotas_lock:
+        entry = _quotas.get(region_name)
+
+    if entry is None:
+        try:
+            with open(get_quota_cache_path(region_name)) as cache:
+                entry = json.load(cache)
+            with _quotas_lock:
+                _quotas[region_name] = entry
+        except (OSError, ValueError):
+            entry = refresh_service_quotas(region_name)
+            if entry is None:
+                return []
+
+    if time.time() - entry['fetched_at'] > QUOTA_CACHE_TTL:
+        _refresh_service_quotas_in_background(region_name)
+
+    return [tuple(instance) for instance in entry['instances'].get(usage, [])]
 
 
 def list_service_quotas_async(instances=[]):
@@ -91,6 +211,8 @@ def list_service_quotas_async(instances=[]):
 
 
 def select_instance(available_instances=None):
+    from InquirerPy import inquirer
+
     choices = [instance[0] for instance in available_instances] or [
         instance for instance in EC2Instance]
     instance = inquirer.fuzzy(
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import json
+import os
+from src.huggingface import HuggingFaceTask
+from src.sagemaker import SagemakerTask
+from src.sagemaker.query_endpoint import QueryRequest, build_query_request_async
+from src.schemas.deployment import Deployment
+from src.schemas.model import Model
+from src.schemas.query import Query
+from src.utils.cache import SqliteCache, TTLCache, get_cache_dir
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+RESPONSE_CACHE_SIZE = int(os.environ.get(
+    "MODEL_MANAGER_RESPONSE_CACHE_SIZE", 10000))
+RESPONSE_CACHE_TTL = float(os.environ.get(
+    "MODEL_MANAGER_RESPONSE_CACHE_TTL", 3600))
+
+# Tasks whose output depends on sampling parameters
+GENERATIVE_TASKS = {
+    HuggingFaceTask.TextGeneration,
+    HuggingFaceTask.Text2TextGeneration,
+    HuggingFaceTask.Summarization,
+    HuggingFaceTask.Translation,
+    HuggingFaceTask.Conversational,
+    SagemakerTask.LLM,
+    SagemakerTask.Summarization,
+    SagemakerTask.Text2text,
+    SagemakerTask.TextGeneration,
+    SagemakerTask.TextGeneration1,
+    SagemakerTask.TextGeneration2,
+    SagemakerTask.TextGenerationJP,
+    SagemakerTask.TextGenerationNeuron,
+    SagemakerTask.Translation,
+}
+
+
+def is_deterministic(request: QueryRequest) -> bool:
+    """ Generations are only repeatable with greedy decoding (temperature 0 or do_sample off) """
+    if request.task not in GENERATIVE_TASKS:
+        return True
+
+    try:
+        parameters = json.loads(request.body).get("parameters") or {}
+    except (ValueError, AttributeError):
+        return False
+    return parameters.get("temperature") == 0 or parameters.get("do_sample") is False
+
+
+class ResponseCache:
+    """ Caches endpoint responses for repeated deterministic queries.
+
+    Keys are built from the endpoint, task and the fully resolved request
+    payload, so the query, context and effective parameters all count.
+    Entries live in an in-memory LRU, optionally backed by sqlite at `path`
+    so they survive restarts and are shared between server workers.
+    Concurrent misses on the same key share one in-flight query.
+    """
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL, path: Optional[str] = None):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.disk = SqliteCache(path, ttl=ttl, maxsize=maxsize) if path else None
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.coalesced = 0
+        # key -> the in-flight query for a miss, awaited by concurrent misses on the same key
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        # Called with (endpoint_name, "hit" | "miss" | "coalesced" | "skipped") on every lookup
+        self.on_lookup: Optional[Callable[[str, str], None]] = None
+
+    @staticmethod
+    def key(endpoint_name: str, request: QueryRequest) -> str:
+        digest = hashlib.sha256()
+        for part in (endpoint_name, str(request.task), request.target_model or "", request.content_type, request.accept):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(request.untraced_body or request.body)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Any:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    async def get_async(self, key: str) -> Any:
+        """ get without blocking the event loop on sqlite """
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = await asyncio.to_thread(self.get, key)
+        return value
+
+    async def set_async(self, key: str, value: Any):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value)
+
+    async def get_or_query(self, endpoint_name: str, query: Query, config: Optional[Tuple[Deployment, Model]],
+                           fetch: Callable[[QueryRequest], Awaitable[Any]]) -> Any:
+        """ `fetch` is passed the request built for the key, so it isn't built twice """
+        request = await build_query_request_async(endpoint_name, query, config)
+        if not is_deterministic(request):
+            self.skipped += 1
+            self._record(endpoint_name, "skipped")
+            return await fetch(request)
+
+        key = self.key(endpoint_name, request)
+        value = await self.get_async(key)
+        if value is not None:
+            self.hits += 1
+            self._record(endpoint_name, "hit")
+            return value
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.coalesced += 1
+            self._record(endpoint_name, "coalesced")
+            # One waiter being cancelled mustn't cancel the query for the others
+            return await asyncio.shield(in_flight)
+
+        self.misses += 1
+        self._record(endpoint_name, "miss")
+        in_flight = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await fetch(request)
+        except BaseException as error:
+            if isinstance(error, Exception):
+                in_flight.set_exception(error)
+                # Marks it retrieved when no one else was waiting
+                in_flight.exception()
+            else:
+                in_flight.cancel()
+            raise
+        finally:
+            del self._in_flight[key]
+        in_flight.set_result(value)
+        await self.set_async(key, value)
+        return value
+
+    def _record(self, endpoint_name: str, result: str):
+        if self.on_lookup is not None:
+            self.on_lookup(endpoint_name, result)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "coalesced": self.coalesced,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "size": len(self.memory),
+        }
+
+
+def get_response_cache_from_env() -> Optional[ResponseCache]:
+    """ MODEL_MANAGER_RESPONSE_CACHE=memory or sqlite enables the cache; it's off by default """
+    backend = os.environ.get("MODEL_MANAGER_RESPONSE_CACHE", "").lower()
+    if backend in ("", "0", "false", "off"):
+        return None
+
+    path = None
+    if backend == "sqlite":
+        path = os.environ.get("MODEL_MANAGER_RESPONSE_CACHE_PATH") or os.path.join(
+            get_cache_dir(), "responses.sqlite")
+    return ResponseCache(path=path)
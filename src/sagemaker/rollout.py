@@ -0,0 +1,171 @@
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from rich.live import Live
+from rich.table import Table
+from src.config import write_config
+from src.console import console
+from src.sagemaker.async_inference import configure_async_endpoint
+from src.sagemaker.create_model import create_endpoint
+from src.sagemaker.poller import EndpointPoller
+from src.schemas.deployment import Deployment
+from src.schemas.model import Model
+from src.session import get_client
+from src.utils.model_utils import get_endpoint_name_prefix
+from src.utils.rich_utils import print_error, print_success
+from typing import Dict, List, Optional, Set, Tuple
+
+# Concurrent create calls. Each one may resolve images or upload artifacts.
+MAX_CREATE_WORKERS = 8
+
+# Seconds to wait for every endpoint to come up before giving up on the rest
+ROLLOUT_TIMEOUT = float(os.environ.get("MODEL_MANAGER_ROLLOUT_TIMEOUT", 7200))
+# Seconds a created endpoint may be missing from list_endpoints before it counts as failed
+MISSING_GRACE = 300
+
+STATUS_STYLES = {
+    "InService": "green",
+    "Failed": "red",
+}
+
+
+class Rollout:
+    def __init__(self, deployment: Deployment, model: Model):
+        self.deployment = deployment
+        self.model = model
+        self.status = "Submitting"
+        self.error: Optional[str] = None
+        self.started = time.monotonic()
+        self.created: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("InService", "Failed")
+
+    def finish(self, status: str, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        self.finished = time.monotonic()
+
+
+def dedupe_endpoint_names(configs: List[Tuple[Deployment, Model]]):
+    """ Endpoint names are suffixed with the current minute, so configs sharing a name would collide """
+    prefixes = [get_endpoint_name_prefix(model.id, deployment.endpoint_name)
+                for deployment, model in configs]
+    counts = Counter(prefixes)
+    seen = Counter()
+    for (deployment, _), prefix in zip(configs, prefixes):
+        if counts[prefix] > 1:
+            seen[prefix] += 1
+            deployment.endpoint_name = f"{prefix[:46]}-{seen[prefix]}"
+
+
+def render(rollouts: List[Rollout]) -> Table:
+    table = Table(header_style="magenta")
+    table.add_column("Endpoint", style="blue")
+    table.add_column("Model")
+    table.add_column("Instance", style="dim")
+    table.add_column("Status")
+    table.add_column("Elapsed", justify="right")
+    for rollout in rollouts:
+        elapsed = (rollout.finished or time.monotonic()) - rollout.started
+        style = STATUS_STYLES.get(rollout.status, "yellow")
+        table.add_row(
+            rollout.deployment.endpoint_name or "-",
+            rollout.model.id,
+            rollout.deployment.instance_type,
+            f"[{style}]{rollout.status}[/{style}]",
+            f"{int(elapsed // 60)}m{int(elapsed % 60):02d}s",
+        )
+    return table
+
+
+def deploy_models(configs: List[Tuple[Deployment, Model]], poller: Optional[EndpointPoller] = None,
+                  timeout: float = ROLLOUT_TIMEOUT) -> List[Rollout]:
+    """ Create every endpoint concurrently without blocking, then wait for all of them in one poll loop.
+
+    Each config is written to ./configs as soon as its endpoint is InService.
+    Endpoints deleted mid-rollout, never listed, or not up within `timeout`
+    seconds count as failed.
+    """
+    poller = poller or EndpointPoller()
+    dedupe_endpoint_names(configs)
+    rollouts = [Rollout(deployment, model) for deployment, model in configs]
+
+    with Live(render(rollouts), console=console, refresh_per_second=2) as live:
+        with ThreadPoolExecutor(max_workers=MAX_CREATE_WORKERS) as executor:
+            futures = {executor.submit(create_endpoint, rollout.deployment, rollout.model): rollout
+                       for rollout in rollouts}
+            for future in as_completed(futures):
+                rollout = futures[future]
+                try:
+                    future.result()
+                    rollout.status = "Creating"
+                    rollout.created = time.monotonic()
+                except Exception as error:
+                    rollout.finish("Failed", str(error))
+                live.update(render(rollouts))
+
+        by_endpoint: Dict[str, Rollout] = {rollout.deployment.endpoint_name: rollout
+                                           for rollout in rollouts if not rollout.done}
+
+        # Endpoints that have been listed at least once
+        seen: Set[str] = set()
+
+        def get_missing_reason(endpoint_name: str, status: Optional[str]) -> Optional[str]:
+            if status is not None:
+                return None
+            if endpoint_name in seen:
+                return "the endpoint was deleted during the rollout"
+            if time.monotonic() - by_endpoint[endpoint_name].created > MISSING_GRACE:
+                return f"the endpoint didn't show up within {MISSING_GRACE}s of being created"
+            return None
+
+        def done(endpoint_name: str, status: Optional[str]) -> bool:
+            return status in ("InService", "Failed") or get_missing_reason(endpoint_name, status) is not None
+
+        def on_update(statuses: Dict[str, Optional[str]]):
+            for endpoint_name, status in statuses.items():
+                rollout = by_endpoint[endpoint_name]
+                if rollout.done:
+                    continue
+                if status is None:
+                    reason = get_missing_reason(endpoint_name, status)
+                    if reason is not None:
+                        rollout.finish("Failed", reason)
+                    continue
+                seen.add(endpoint_name)
+
+                if status == "InService":
+                    try:
+                        configure_async_endpoint(rollout.deployment)
+                    except Exception as error:
+                        print_error(
+                            f"Failed to configure autoscaling for {endpoint_name}: {error}")
+                    write_config(rollout.deployment, rollout.model)
+                    rollout.finish(status)
+                elif status == "Failed":
+                    reason = get_client('sagemaker').describe_endpoint(
+                        EndpointName=endpoint_name).get('FailureReason')
+                    rollout.finish(status, reason)
+                else:
+                    rollout.status = status
+            live.update(render(rollouts))
+
+        poller.wait(by_endpoint.keys(), done, on_update, timeout=timeout)
+        for rollout in by_endpoint.values():
+            if not rollout.done:
+                rollout.finish("Failed", f"still {rollout.status} after {timeout:.0f}s")
+        live.update(render(rollouts))
+
+    succeeded = [rollout for rollout in rollouts if rollout.status == "InService"]
+    failed = [rollout for rollout in rollouts if rollout.status != "InService"]
+    for rollout in failed:
+        print_error(
+            f"{rollout.deployment.endpoint_name or rollout.model.id} failed: {rollout.error}")
+    if succeeded:
+        print_success(
+            f"{len(succeeded)} of {len(rollouts)} endpoints are up and running")
+    return rollouts
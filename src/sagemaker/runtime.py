@@ -0,0 +1,159 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from src.session import session, client_config, get_client, MAX_POOL_CONNECTIONS
+from src.tracing import inject_trace_context, set_attributes, start_span
+from typing import AsyncIterator, Dict, Optional
+
+MAX_CONCURRENCY = int(os.environ.get("MODEL_MANAGER_MAX_CONCURRENCY", 1000))
+
+
+def get_aiobotocore_session():
+    # Imported on first use to keep aiohttp off the server start up path
+    try:
+        from aiobotocore.session import get_session
+    except ImportError:
+        return None
+    return get_session()
+
+
+def get_invoke_attributes(kwargs: Dict) -> Dict:
+    return {
+        "model_manager.endpoint": kwargs.get('EndpointName'),
+        "model_manager.target_model": kwargs.get('TargetModel'),
+        "model_manager.payload_bytes": len(kwargs.get('Body') or b""),
+    }
+
+
+class AsyncSagemakerRuntime:
+    """ Non-blocking SageMaker runtime client.
+
+    Uses aiobotocore when it's installed so thousands of invocations can be in
+    flight on one event loop. Otherwise the shared boto3 client is run in a
+    dedicated thread pool sized to its connection pool.
+    """
+
+    def __init__(self, region_name: Optional[str] = None, max_concurrency: int = MAX_CONCURRENCY):
+        self.region_name = region_name or session.region_name
+        self.max_concurrency = max_concurrency
+        self._lock = asyncio.Lock()
+        self._client = None
+        self._client_context = None
+        self._executor = None
+
+    async def _get_client(self):
+        if self._client is not None:
+            return self._client
+
+        async with self._lock:
+            if self._client is None:
+                aiobotocore_session = get_aiobotocore_session()
+                if aiobotocore_session is not None:
+                    self._client_context = aiobotocore_session.create_client(
+                        'sagemaker-runtime', region_name=self.region_name, config=client_config(self.max_concurrency))
+                    self._client = await self._client_context.__aenter__()
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=min(self.max_concurrency, MAX_POOL_CONNECTIONS),
+                        thread_name_prefix="sagemaker-runtime")
+                    self._client = get_client(
+                        'sagemaker-runtime', self.region_name)
+        return self._client
+
+    async def invoke_endpoint(self, **kwargs) -> Dict:
+        """ Same arguments as boto3's invoke_endpoint. The response Body is returned as bytes. """
+        with start_span("invoke_endpoint", kind="client", **get_invoke_attributes(kwargs)) as span:
+            inject_trace_context(kwargs)
+            client = await self._get_client()
+
+            if self._executor is None:
+                response = await client.invoke_endpoint(**kwargs)
+                async with response['Body'] as stream:
+                    response['Body'] = await stream.read()
+            else:
+                def invoke():
+                    response = client.invoke_endpoint(**kwargs)
+                    response['Body'] = response['Body'].read()
+                    return response
+
+                # Carries the span over to botocore's own instrumentation, if any, in the worker thread
+                response = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, contextvars.copy_context().run, invoke)
+
+            set_attributes(span, **{
+                "model_manager.response_bytes": len(response['Body']),
+                "model_manager.retries": response.get('ResponseMetadata', {}).get('RetryAttempts'),
+            })
+            return response
+
+    async def invoke_endpoint_with_response_stream(self, **kwargs) -> AsyncIterator[bytes]:
+        """ Yields the PayloadPart bytes of a streaming invocation as they arrive.
+
+        Events are pulled one at a time, so a slow consumer stops us reading
+        from the endpoint instead of buffering the whole response.
+        """
+        with start_span("invoke_endpoint_with_response_stream", current=False, kind="client",
+                        **get_invoke_attributes(kwargs)) as span:
+            inject_trace_context(kwargs, span)
+            parts = 0
+            response_bytes = 0
+            client = await self._get_client()
+
+            try:
+                if self._executor is None:
+                    response = await client.invoke_endpoint_with_response_stream(**kwargs)
+                    stream = response['Body']
+                    try:
+                        async for event in stream:
+                            if 'PayloadPart' in event:
+                                parts += 1
+                                response_bytes += len(event['PayloadPart']['Bytes'])
+                                yield event['PayloadPart']['Bytes']
+                    finally:
+                        stream.close()
+                    return
+
+                loop = asyncio.get_running_loop()
+                response = await loop.run_in_executor(
+                    self._executor, lambda: client.invoke_endpoint_with_response_stream(**kwargs))
+                stream = response['Body']
+                events = iter(stream)
+                try:
+                    while True:
+                        event = await loop.run_in_executor(self._executor, next, events, None)
+                        if event is None:
+                            break
+                        if 'PayloadPart' in event:
+                            parts += 1
+                            response_bytes += len(event['PayloadPart']['Bytes'])
+                            yield event['PayloadPart']['Bytes']
+                finally:
+                    stream.close()
+            finally:
+                set_attributes(span, **{"model_manager.payload_parts": parts,
+                                        "model_manager.response_bytes": response_bytes})
+
+    async def close(self):
+        if self._client_context is not None:
+            await self._client_context.__aexit__(None, None, None)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._client = self._client_context = self._executor = None
+
+
+_runtime: Optional[AsyncSagemakerRuntime] = None
+
+
+def get_async_runtime() -> AsyncSagemakerRuntime:
+    global _runtime
+    if _runtime is None:
+        _runtime = AsyncSagemakerRuntime()
+    return _runtime
+
+
+async def close_async_runtime():
+    global _runtime
+    if _runtime is not None:
+        await _runtime.close()
+        _runtime = None
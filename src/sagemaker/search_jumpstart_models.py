@@ -1,8 +1,8 @@
 import inquirer
 from enum import StrEnum, auto
-from sagemaker.jumpstart.notebook_utils import list_jumpstart_models
+from src.sagemaker.jumpstart_catalog import get_jumpstart_catalog
 from src.utils.rich_utils import print_error
-from src.session import session, sagemaker_session
+from src.session import session
 
 
 class Frameworks(StrEnum):
@@ -25,12 +25,17 @@ def search_sagemaker_jumpstart_model():
                       message="Which framework would you like to use?",
                       choices=[framework.value for framework in Frameworks]
                       ),
+        inquirer.Text('query',
+                      message="Search by task (e.g. eqa) or model name (e.g. llama), or leave empty to list all",
+                      ),
     ]
     answers = inquirer.prompt(questions)
     if answers is None:
         return
-    filter_value = "framework == {}".format(answers["framework"])
 
-    models = list_jumpstart_models(filter=filter_value,
-                                   region=session.region_name, sagemaker_session=sagemaker_session)
+    # Searched locally, the catalog is only fetched when its snapshot is missing
+    models = get_jumpstart_catalog(session.region_name).search(
+        answers["query"], framework=answers["framework"])
+    if len(models) == 0:
+        print_error(f"No {answers['framework']} models match \"{answers['query']}\"")
     return models
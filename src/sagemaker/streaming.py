@@ -0,0 +1,123 @@
+import asyncio
+import json
+import time
+import uuid
+from src.sagemaker.query_endpoint import get_target_model_for_config
+from src.sagemaker.runtime import get_async_runtime
+from src.schemas.deployment import Deployment
+from src.schemas.model import Model
+from src.schemas.query import ChatMessage, Query
+from src.tracing import set_attributes, start_span
+from src.utils.model_utils import get_text_generation_hyperpameters, is_tgi_model
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+# TGI finish reasons -> OpenAI finish reasons
+FINISH_REASONS = {
+    "length": "length",
+    "eos_token": "stop",
+    "stop_sequence": "stop",
+}
+
+
+def get_prompt_factory() -> Optional[Callable]:
+    # litellm takes seconds to import, so only load it once a stream is requested
+    try:
+        from litellm.litellm_core_utils.prompt_templates.factory import prompt_factory
+    except ImportError:
+        try:
+            from litellm.llms.prompt_templates.factory import prompt_factory
+        except ImportError:
+            return None
+    return prompt_factory
+
+
+def build_prompt(model_id: str, messages: List[ChatMessage]) -> str:
+    messages = [message.model_dump() for message in messages]
+    prompt_factory = get_prompt_factory()
+    if prompt_factory is not None:
+        # Same chat templating litellm applies for non-streaming completions
+        return prompt_factory(model=model_id, messages=messages, custom_llm_provider="sagemaker")
+    return "".join(f"{message['role']}: {message['content']}\n" for message in messages) + "assistant:"
+
+
+async def iter_tgi_events(payload_parts: AsyncIterator[bytes]) -> AsyncIterator[Dict]:
+    """ TGI streams server-sent events, which can be split across PayloadParts """
+    buffer = b""
+    async for part in payload_parts:
+        buffer += part
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            line = line.strip()
+            if line.startswith(b"data:"):
+                yield json.loads(line[len(b"data:"):])
+
+    line = buffer.strip()
+    if line.startswith(b"data:"):
+        yield json.loads(line[len(b"data:"):])
+
+
+def format_sse(data: Dict) -> str:
+    return f"data: {json.dumps(data)}\n\n"
+
+
+async def stream_chat_completion(endpoint_name: str, config: Tuple[Deployment, Model], messages: List[ChatMessage]) -> AsyncIterator[str]:
+    """ Yields OpenAI `chat.completion.chunk` server-sent events for a TGI endpoint """
+    _, model = config
+
+    with start_span("build_prompt", **{"model_manager.endpoint": endpoint_name, "model_manager.model": model.id}) as span:
+        # Chat templates may need to be fetched from the hub, so keep it off the event loop
+        prompt = await asyncio.to_thread(build_prompt, model.id, messages)
+        parameters = get_text_generation_hyperpameters(config, Query(query=prompt))
+        body = json.dumps({
+            "inputs": prompt,
+            "parameters": parameters,
+            "stream": True,
+        }).encode("utf-8")
+        set_attributes(span, **{"model_manager.payload_bytes": len(body)})
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    def chunk(delta: Dict, finish_reason: Optional[str] = None) -> str:
+        return format_sse({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model.id,
+            "choices": [{
+                "index": 0,
+                "delta": delta,
+                "finish_reason": finish_reason,
+            }],
+        })
+
+    kwargs = {}
+    target_model = get_target_model_for_config(config)
+    if target_model is not None:
+        kwargs['TargetModel'] = target_model
+    payload_parts = get_async_runtime().invoke_endpoint_with_response_stream(
+        EndpointName=endpoint_name, ContentType="application/json", Body=body, **kwargs)
+
+    yield chunk({"role": "assistant", "content": ""})
+    finish_reason = "stop"
+    with start_span("parse_stream", current=False, **{"model_manager.endpoint": endpoint_name}) as span:
+        tokens = 0
+        try:
+            async for event in iter_tgi_events(payload_parts):
+                token = event.get("token") or {}
+                if token:
+                    tokens += 1
+                if token.get("text") and not token.get("special"):
+                    yield chunk({"content": token["text"]})
+
+                details = event.get("details")
+                if details is not None:
+                    finish_reason = FINISH_REASONS.get(
+                        details.get("finish_reason"), "stop")
+        finally:
+            # Stops reading from the endpoint if the client disconnected
+            await payload_parts.aclose()
+            set_attributes(span, **{"gen_ai.usage.output_tokens": tokens})
+
+    yield chunk({}, finish_reason)
+    yield "data: [DONE]\n\n"
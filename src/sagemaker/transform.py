@@ -0,0 +1,239 @@
+import datetime
+import json
+import math
+import os
+import re
+import tempfile
+from src.console import console
+from src.sagemaker.batch_query import read_records
+from src.sagemaker.batching import BatchCodec, get_batch_codec
+from src.schemas.deployment import Deployment
+from src.schemas.model import Model
+from src.schemas.query import Query
+from src.session import get_client, get_sagemaker_session
+from src.utils.aws_utils import construct_s3_uri, is_s3_uri
+from src.utils.model_utils import get_endpoint_name_prefix
+from src.utils.rich_utils import print_error, print_success
+from src.utils.s3_upload import MB, ArtifactUploader
+from typing import Any, Iterable, List, NamedTuple, Optional, Tuple
+
+# Inputs per invocation, and the most bytes one invocation may carry
+TRANSFORM_BATCH_SIZE = int(os.environ.get(
+    "MODEL_MANAGER_TRANSFORM_BATCH_SIZE", 64))
+TRANSFORM_MAX_PAYLOAD_MB = int(os.environ.get(
+    "MODEL_MANAGER_TRANSFORM_MAX_PAYLOAD_MB", 6))
+
+# Records per input file. There's at least one file per instance, since
+# files are what Batch Transform spreads over instances.
+MAX_SHARD_RECORDS = 100_000
+
+# Batch Transform rejects MaxPayloadInMB, and MaxConcurrentTransforms * MaxPayloadInMB, above this
+MAX_PAYLOAD_LIMIT_MB = 100
+
+GPU_FAMILIES = ("g", "p", "inf", "trn")
+
+
+class TransformShards(NamedTuple):
+    # ids of the records in each mini-batch, per shard file
+    batch_ids: List[List[List[Any]]]
+    max_payload_bytes: int
+
+
+def get_shard_name(index: int) -> str:
+    return f"shard-{index:05d}.jsonl"
+
+
+def get_vcpus(instance_type: str) -> int:
+    """ vCPUs from the instance size, e.g. ml.m5.4xlarge -> 16 """
+    size = instance_type.rsplit(".", 1)[-1]
+    match = re.fullmatch(r"(\d*)xlarge", size)
+    if match is not None:
+        return 4 * int(match.group(1) or 1)
+    return 2 if size == "large" else 1
+
+
+def get_max_concurrent_transforms(deployment: Deployment, max_payload_mb: int = 1) -> int:
+    """ One request in flight per model server worker, as many as fit in the job's payload limit.
+
+    The Hugging Face and JumpStart containers start a worker per GPU on GPU
+    instances and a worker per vCPU otherwise.
+    """
+    family = deployment.instance_type.removeprefix("ml.").split(".")[0]
+    if family.startswith(GPU_FAMILIES):
+        workers = deployment.num_gpus or 1
+    else:
+        workers = get_vcpus(deployment.instance_type)
+    return max(1, min(workers, MAX_PAYLOAD_LIMIT_MB // max_payload_mb))
+
+
+def get_transform_job_name(model: Model) -> str:
+    # Job names must be < 63 characters
+    dt_string = datetime.datetime.now().strftime("%Y%m%d%H%M")
+    return f"{get_endpoint_name_prefix(model.id)[:38]}-transform-{dt_string}"
+
+
+def get_query_text(record: dict) -> str:
+    query = Query(**record)
+    if query.context or query.parameters is not None:
+        raise ValueError(
+            "Batch Transform only supports plain queries, without context or parameters")
+    return query.query
+
+
+def write_shards(records: Iterable[Tuple[Any, dict]], codec: BatchCodec, directory: str, num_records: int,
+                 min_shards: int = 1, batch_size: int = TRANSFORM_BATCH_SIZE,
+                 max_payload_mb: int = TRANSFORM_MAX_PAYLOAD_MB) -> TransformShards:
+    """ Encode records into mini-batches, one request body per line, across shard files.
+
+    Mini-batches hold up to `batch_size` inputs and stay under
+    `max_payload_mb`, so the job runs with BatchStrategy SingleRecord: every
+    line is already a full batch for the model.
+    """
+    num_shards = max(min_shards, math.ceil(num_records / MAX_SHARD_RECORDS), 1)
+    shard_records = max(1, math.ceil(num_records / num_shards))
+    max_payload = max_payload_mb * MB
+
+    batch_ids: List[List[List[Any]]] = []
+    max_payload_bytes = 0
+    shard = None
+    in_shard = 0
+    ids: List[Any] = []
+    texts: List[str] = []
+    size = 0
+
+    def flush_batch():
+        nonlocal ids, texts, size, max_payload_bytes
+        if len(texts) == 0:
+            return
+        body = codec.encode(texts)
+        shard.write(body + b"\n")
+        batch_ids[-1].append(ids)
+        max_payload_bytes = max(max_payload_bytes, len(body))
+        ids, texts, size = [], [], 0
+
+    try:
+        for record_id, record in records:
+            if shard is None or in_shard >= shard_records:
+                flush_batch()
+                if shard is not None:
+                    shard.close()
+                shard = open(os.path.join(
+                    directory, get_shard_name(len(batch_ids))), "wb")
+                batch_ids.append([])
+                in_shard = 0
+
+            text = get_query_text(record)
+            # A json encoded string plus its separator, the codec's wrapper is covered by the slack
+            text_size = len(json.dumps(text).encode("utf-8")) + 2
+            if len(texts) > 0 and (len(texts) >= batch_size or size + text_size + 64 > max_payload):
+                flush_batch()
+            ids.append(record_id)
+            texts.append(text)
+            size += text_size
+            in_shard += 1
+        if shard is not None:
+            flush_batch()
+    finally:
+        if shard is not None:
+            shard.close()
+
+    return TransformShards(batch_ids, max_payload_bytes)
+
+
+def join_outputs(bucket: str, output_prefix: str, shards: TransformShards, codec: BatchCodec,
+                 output_path: str, client=None) -> int:
+    """ Stream the job's outputs back as {"id": ..., "response": ...} lines, in input order """
+    client = client or get_client('s3')
+    written = 0
+    with open(output_path, "w") as output:
+        for index, batch_ids in enumerate(shards.batch_ids):
+            key = f"{output_prefix}{get_shard_name(index)}.out"
+            body = client.get_object(Bucket=bucket, Key=key)['Body']
+            lines = (line for line in body.iter_lines() if line.strip())
+            for ids in batch_ids:
+                line = next(lines, None)
+                if line is None:
+                    raise ValueError(
+                        f"{key} has fewer results than the {len(batch_ids)} batches sent")
+                for record_id, result in zip(ids, codec.decode(json.loads(line), len(ids))):
+                    output.write(json.dumps(
+                        {"id": record_id, "response": result}) + "\n")
+                    written += 1
+    return written
+
+
+def download_input(input_path: str, directory: str) -> str:
+    if not is_s3_uri(input_path):
+        return input_path
+    bucket, key = input_path.removeprefix("s3://").split("/", 1)
+    local_path = os.path.join(directory, "input.jsonl")
+    get_client('s3').download_file(bucket, key, local_path)
+    return local_path
+
+
+def transform(deployment: Deployment, model: Model, input_path: str, output_path: Optional[str] = None):
+    """ Score a local or S3 JSONL file of queries with a Batch Transform job instead of an endpoint """
+    # Loads the sagemaker SDK and needs SAGEMAKER_ROLE
+    from src.sagemaker.create_model import build_model
+
+    if output_path is None:
+        output_path = f"{os.path.splitext(os.path.basename(input_path))[0]}.out.jsonl"
+
+    # Before build_model, which may upload the whole model artifact
+    codec = get_batch_codec(model.id, Query(query=""), (deployment, model))
+    if codec is None:
+        print_error(
+            f"Batch Transform isn't supported for {model.task} models yet")
+        return
+
+    job_name = get_transform_job_name(model)
+    bucket = get_sagemaker_session().default_bucket()
+    input_prefix = f"transform/{job_name}/input"
+    output_prefix = f"transform/{job_name}/output/"
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        local_input = download_input(input_path, work_dir)
+        num_records = sum(1 for _ in read_records(local_input))
+        if num_records == 0:
+            print_error(f"{input_path} has no queries to transform")
+            return
+
+        sagemaker_model = build_model(deployment, model)
+
+        shard_dir = os.path.join(work_dir, "shards")
+        os.makedirs(shard_dir)
+        shards = write_shards(read_records(local_input), codec, shard_dir, num_records,
+                              min_shards=deployment.instance_count)
+        input_uri = ArtifactUploader(bucket).upload(
+            shard_dir, input_prefix, content_addressed=False)
+
+    max_payload = min(MAX_PAYLOAD_LIMIT_MB, max(
+        1, math.ceil(shards.max_payload_bytes / MB)))
+    max_concurrent_transforms = get_max_concurrent_transforms(deployment, max_payload)
+
+    transformer = sagemaker_model.transformer(
+        instance_count=deployment.instance_count,
+        instance_type=deployment.instance_type,
+        strategy="SingleRecord",
+        assemble_with="Line",
+        output_path=construct_s3_uri(bucket, output_prefix),
+        accept=codec.accept,
+        max_concurrent_transforms=max_concurrent_transforms,
+        max_payload=max_payload,
+    )
+
+    console.log(
+        f"Transforming {num_records} records in {sum(len(batches) for batches in shards.batch_ids)} batches "
+        f"with {max_concurrent_transforms} concurrent requests per instance")
+    try:
+        transformer.transform(input_uri, data_type="S3Prefix", content_type=codec.content_type,
+                              split_type="Line", job_name=job_name, wait=False, logs=False)
+        with console.status(f"[bold green]Running transform job {job_name}..."):
+            transformer.wait(logs=False)
+    except Exception:
+        console.print_exception()
+        return
+
+    written = join_outputs(bucket, output_prefix, shards, codec, output_path)
+    print_success(f"Wrote {written} responses to {output_path}")
+    return output_path
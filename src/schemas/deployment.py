@@ -18,6 +18,16 @@ class Deployment(BaseModel):
     instance_count: Optional[int] = 1
     num_gpus: Optional[int] = None
     quantization: Optional[str] = None
+    # Serve every model in the config from one SageMaker multi-model endpoint
+    multi_model: Optional[bool] = False
+    # Queue requests on a SageMaker Async Inference endpoint instead of invoking in real time
+    async_inference: Optional[bool] = False
+    # S3 prefix for async requests, their results (output/) and errors (failures/)
+    async_output_path: Optional[str] = None
+    # Requests each instance works on at once, the rest wait in the queue
+    max_concurrent_invocations: Optional[int] = None
+    # Scale async endpoints down to 0 instances while their queue is empty
+    scale_to_zero: Optional[bool] = False
 
 
 def deployment_representer(dumper: yaml.SafeDumper, deployment: Deployment) -> yaml.nodes.MappingNode:
@@ -28,6 +38,11 @@ def deployment_representer(dumper: yaml.SafeDumper, deployment: Deployment) -> y
         "instance_count": deployment.instance_count,
         "num_gpus": deployment.num_gpus,
         "quantization": deployment.quantization,
+        "multi_model": deployment.multi_model,
+        "async_inference": deployment.async_inference,
+        "async_output_path": deployment.async_output_path,
+        "max_concurrent_invocations": deployment.max_concurrent_invocations,
+        "scale_to_zero": deployment.scale_to_zero,
     })
 
 
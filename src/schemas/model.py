@@ -13,6 +13,13 @@ class ModelSource(StrEnum):
     Custom = "custom"
 
 
+class ArtifactFormat(StrEnum):
+    # model.tar.gz, downloaded and extracted by every instance
+    Compressed = "compressed"
+    # Files laid out under an S3 prefix, loaded as is
+    Uncompressed = "uncompressed"
+
+
 class Model(BaseModel):
     id: str
     source: ModelSource
@@ -20,6 +27,12 @@ class Model(BaseModel):
     version: Optional[str] = None
     location: Optional[str] = None
     predict: Optional[Dict[str, str]] = None
+    # Picked from the artifact size when not set
+    artifact_format: Optional[ArtifactFormat] = None
+    # Hugging Face Hub branch, tag or commit
+    revision: Optional[str] = None
+    # Copy Hugging Face Hub weights to S3 so instances don't download them from the hub
+    stage: Optional[bool] = False
 
 
 def model_representer(dumper: yaml.SafeDumper, model: Model) -> yaml.nodes.MappingNode:
@@ -30,6 +43,9 @@ def model_representer(dumper: yaml.SafeDumper, model: Model) -> yaml.nodes.Mappi
         "version": model.version,
         "location": model.location,
         "predict": model.predict,
+        "artifact_format": model.artifact_format.value if model.artifact_format else None,
+        "revision": model.revision,
+        "stage": model.stage,
     })
 
 
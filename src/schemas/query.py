@@ -16,6 +16,8 @@ class Query(BaseModel):
     query: str
     context: Optional[str] = None
     parameters: Optional[QueryParameters] = None
+    # Which model to query on a multi-model endpoint
+    model: Optional[str] = None
 
 
 class ChatMessage(BaseModel):
@@ -26,3 +28,4 @@ class ChatMessage(BaseModel):
 class ChatCompletion(BaseModel):
     model: str
     messages: List[ChatMessage]
+    stream: Optional[bool] = False
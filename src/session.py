@@ -1,5 +1,58 @@
 import boto3
-import sagemaker
+import os
+import threading
+from botocore.config import Config
+from typing import Dict, Optional, Tuple
+
+# Connections kept open per client. Raise this for servers with many concurrent queries.
+MAX_POOL_CONNECTIONS = int(os.environ.get("MODEL_MANAGER_MAX_POOL_CONNECTIONS", 100))
+
+# TCP keep-alive on pooled connections, so idle ones aren't silently dropped by NATs and load balancers
+TCP_KEEPALIVE = os.environ.get(
+    "MODEL_MANAGER_TCP_KEEPALIVE", "true").lower() not in ("0", "false", "off")
 
 session = boto3.session.Session()
-sagemaker_session = sagemaker.session.Session(boto_session=session)
+_sagemaker_session = None
+
+_clients: Dict[Tuple[str, str], object] = {}
+_clients_lock = threading.Lock()
+
+
+def client_config(max_pool_connections: int = MAX_POOL_CONNECTIONS, tcp_keepalive: bool = TCP_KEEPALIVE) -> Config:
+    return Config(max_pool_connections=max_pool_connections, tcp_keepalive=tcp_keepalive)
+
+
+def get_client(service_name: str, region_name: Optional[str] = None):
+    """ Process-wide boto3 client cache keyed by (service, region).
+
+    Building a client loads the service model and opens a new connection pool,
+    so hot paths should always go through here instead of boto3.client().
+    """
+    key = (service_name, region_name or session.region_name)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    # boto3 sessions aren't thread safe, so serialize client creation
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = session.client(
+                service_name, region_name=key[1], config=client_config())
+    return client
+
+
+def get_sagemaker_session():
+    """ The sagemaker SDK takes seconds to import, so only load it on first use """
+    global _sagemaker_session
+    if _sagemaker_session is None:
+        import sagemaker
+        _sagemaker_session = sagemaker.session.Session(boto_session=session)
+    return _sagemaker_session
+
+
+def __getattr__(name: str):
+    # Keeps `from src.session import sagemaker_session` working
+    if name == "sagemaker_session":
+        return get_sagemaker_session()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
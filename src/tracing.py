@@ -0,0 +1,123 @@
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    from opentelemetry import context as otel_context, propagate, trace
+except ImportError:
+    trace = None
+
+# Spans are made whenever opentelemetry-api is installed, set to 0 to turn them off.
+# They're only recorded and exported once a TracerProvider is set up, e.g. by opentelemetry-instrument.
+TRACING_ENABLED = trace is not None and os.environ.get(
+    "MODEL_MANAGER_TRACING", "true").lower() not in ("0", "false", "off")
+
+_tracer = trace.get_tracer("model_manager") if TRACING_ENABLED else None
+
+
+@contextmanager
+def start_span(name: str, current: bool = True, kind: str = "internal", **attributes) -> Iterator[Optional[Any]]:
+    """ Yields a span, or None when tracing is off. Attributes that are None are left out.
+
+    `kind` is "internal", "client" or "server".
+
+    Spans kept open across the yields of an async generator must pass
+    `current=False`: the generator may be closed from another context, where
+    the span can't be detached again.
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+    kind = trace.SpanKind[kind.upper()]
+    attributes = {key: value for key, value in attributes.items() if value is not None}
+    if current:
+        with _tracer.start_as_current_span(name, kind=kind, attributes=attributes) as span:
+            yield span
+        return
+
+    span = _tracer.start_span(name, kind=kind, attributes=attributes)
+    try:
+        yield span
+    except Exception as error:
+        span.record_exception(error)
+        span.set_status(trace.Status(trace.StatusCode.ERROR, str(error)))
+        raise
+    finally:
+        span.end()
+
+
+def set_attributes(span: Optional[Any], **attributes):
+    if span is not None:
+        span.set_attributes({key: value for key, value in attributes.items() if value is not None})
+
+
+def is_recording(span: Optional[Any]) -> bool:
+    """ Whether the span is sampled and exported, i.e. extra work to fill it in isn't wasted """
+    return span is not None and span.is_recording()
+
+
+def inject_trace_context(kwargs: Dict[str, Any], span: Optional[Any] = None):
+    """ Pass the trace on to the model container in the invoke's CustomAttributes, e.g. traceparent=00-... """
+    if not TRACING_ENABLED or "CustomAttributes" in kwargs:
+        return
+    carrier: Dict[str, str] = {}
+    propagate.inject(carrier, context=trace.set_span_in_context(span) if span is not None else None)
+    if carrier:
+        kwargs["CustomAttributes"] = ";".join(f"{key}={value}" for key, value in carrier.items())
+
+
+def get_token_counts(result: Any) -> Dict[str, int]:
+    """ Prompt and generated tokens from a TGI response that was asked for details.
+
+    The prompt is only counted with decoder_input_details, which returns its tokens as `prefill`.
+    """
+    counts: Dict[str, int] = {}
+    if isinstance(result, list) and len(result) > 0 and isinstance(result[0], dict):
+        details = result[0].get("details") or {}
+        if details.get("prefill"):
+            counts["gen_ai.usage.input_tokens"] = len(details["prefill"])
+        if "generated_tokens" in details:
+            counts["gen_ai.usage.output_tokens"] = details["generated_tokens"]
+    return counts
+
+
+class TracingMiddleware:
+    """ ASGI middleware that continues the caller's trace from its traceparent header.
+
+    Every request gets a server span, and the response carries a traceparent
+    header so clients can find the trace.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not TRACING_ENABLED or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        token = otel_context.attach(propagate.extract(headers))
+        try:
+            with start_span(scope["method"], kind="server",
+                            **{"http.request.method": scope["method"], "url.path": scope["path"]}) as span:
+
+                async def send_with_trace(message):
+                    if message["type"] == "http.response.start":
+                        span.set_attribute("http.response.status_code", message["status"])
+                        carrier: Dict[str, str] = {}
+                        propagate.inject(carrier)
+                        message["headers"] = list(message.get("headers", [])) + [
+                            (key.encode("latin-1"), value.encode("latin-1")) for key, value in carrier.items()]
+                    await send(message)
+
+                try:
+                    await self.app(scope, receive, send_with_trace)
+                finally:
+                    # The router puts the matched route in the scope
+                    route = getattr(scope.get("route"), "path", None)
+                    if route is not None:
+                        span.update_name(f"{scope['method']} {route}")
+                        span.set_attribute("http.route", route)
+        finally:
+            otel_context.detach(token)
@@ -1,3 +1,20 @@
+from botocore.exceptions import ClientError
+
+THROTTLING_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailable",
+    "ServiceUnavailableException",
+}
+
+
+def is_throttled(error: Exception) -> bool:
+    if not isinstance(error, ClientError):
+        return False
+    return (error.response.get('Error', {}).get('Code') in THROTTLING_CODES
+            or error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') in (429, 503))
+
+
 def construct_s3_uri(bucket: str, prefix: str) -> str:
     return f"s3://{bucket}/{prefix}"
 
@@ -0,0 +1,121 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+def get_cache_dir() -> str:
+    """ Directory for caches that should survive restarts, e.g. ~/.cache/model_manager """
+    path = os.environ.get("MODEL_MANAGER_CACHE_DIR")
+    if path is None:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+        path = os.path.join(base, "model_manager")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class TTLCache:
+    """ Thread-safe in-memory LRU cache whose entries expire after `ttl` seconds """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, Tuple[Optional[float], Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SqliteCache:
+    """ On-disk JSON key/value store with per-entry TTL.
+
+    Safe to share between processes, e.g. several uvicorn workers. When
+    `maxsize` is set, the least recently written entries are dropped first.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, maxsize: Optional[int] = None):
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL, updated_at REAL)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS cache_updated_at ON cache (updated_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite connections can't be shared across threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(
+                self.path, timeout=30)
+        return connection
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(key)
+            return default
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now))
+            if self.maxsize is not None:
+                connection.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                    (self.maxsize,))
+
+    def delete(self, key: str):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM cache")
@@ -1,27 +1,39 @@
 import datetime
 from difflib import SequenceMatcher
 from dotenv import dotenv_values
-from huggingface_hub import HfApi
+from src.huggingface import HuggingFaceTask, get_hf_api
 from src.utils.rich_utils import print_error
 from src.sagemaker import SagemakerTask
 from src.schemas.deployment import Deployment
 from src.schemas.model import Model, ModelSource
 from src.schemas.query import Query
-from src.session import sagemaker_session
+from src.sagemaker.endpoint_index import get_endpoint_index
 from typing import Dict, Tuple, Optional
 HUGGING_FACE_HUB_TOKEN = dotenv_values(".env").get("HUGGING_FACE_HUB_KEY")
 
 
-def get_unique_endpoint_name(model_id: str, endpoint_name: str = None):
-    dt_string = datetime.datetime.now().strftime("%Y%m%d%H%M")
-
+def get_endpoint_name_prefix(model_id: str, endpoint_name: str = None) -> str:
+    # Endpoint name must be < 63 characters
     if not endpoint_name:
-        # Endpoint name must be < 63 characters
-        model_string = model_id.replace(
+        return model_id.replace(
             "/", "--").replace("_", "-").replace(".", "")[:50]
-        return f"{model_string}-{dt_string}"
     else:
-        return f"{endpoint_name[:50]}-{dt_string}"
+        return endpoint_name[:50]
+
+
+def get_unique_endpoint_name(model_id: str, endpoint_name: str = None):
+    dt_string = datetime.datetime.now().strftime("%Y%m%d%H%M")
+    return f"{get_endpoint_name_prefix(model_id, endpoint_name)}-{dt_string}"
+
+
+def get_target_model(model: Model) -> str:
+    """ Artifact name of a model under a multi-model endpoint's S3 prefix, used as its TargetModel """
+    return f"{model.id.replace('/', '--')}.tar.gz"
+
+
+def is_tgi_model(model: Model) -> bool:
+    # deploy_huggingface_model serves text-generation models from the TGI image
+    return model.source == ModelSource.HuggingFace and model.task == HuggingFaceTask.TextGeneration
 
 
 def is_sagemaker_model(endpoint_name: str, config: Optional[Tuple[Deployment, Model]] = None) -> bool:
@@ -32,6 +44,10 @@ def is_sagemaker_model(endpoint_name: str, config: Optional[Tuple[Deployment, Mo
         # check task for custom sagemaker models
         return model.source == ModelSource.Sagemaker or task in SagemakerTask.list()
 
+    entry = get_endpoint_index().get(endpoint_name)
+    if entry is not None:
+        return entry['source'] == ModelSource.Sagemaker or entry['task'] in SagemakerTask.list()
+
     # fallback
     return endpoint_name.find("--") == -1
 
@@ -51,11 +67,9 @@ def get_sagemaker_model_and_task(endpoint_or_model_name: str):
 
 
 def get_hugging_face_pipeline_task(model_name: str):
-    hf_api = HfApi()
+    from src.huggingface.hub_cache import get_hub_cache
     try:
-        model_info = hf_api.model_info(
-            model_name, token=HUGGING_FACE_HUB_TOKEN)
-        task = model_info.pipeline_tag
+        task = get_hub_cache().pipeline_task(model_name)
     except Exception:
         print_error("Model not found, please try another.")
         return None
@@ -71,9 +85,24 @@ def get_model_and_task(endpoint_or_model_name: str, config: Optional[Tuple[Deplo
             'task': model.task
         }
 
+    entry = get_endpoint_index().get(endpoint_or_model_name)
+    if entry is not None:
+        return {
+            'model_id': entry['model_id'],
+            'task': entry['task']
+        }
+
     if (is_sagemaker_model(endpoint_or_model_name)):
         return get_sagemaker_model_and_task(endpoint_or_model_name)
     else:
+        # Endpoints deployed from another host are found through their tags
+        entry = get_endpoint_index().lookup(endpoint_or_model_name)
+        if entry is not None:
+            return {
+                'model_id': entry['model_id'],
+                'task': entry['task']
+            }
+
         model_id = get_model_name_from_hugging_face_endpoint(
             endpoint_or_model_name)
         task = get_hugging_face_pipeline_task(model_id)
@@ -84,6 +113,7 @@ def get_model_and_task(endpoint_or_model_name: str, config: Optional[Tuple[Deplo
 
 
 def get_model_name_from_hugging_face_endpoint(endpoint_name: str):
+    """ Best guess for endpoints deployed before they were indexed and tagged """
     endpoint_name = endpoint_name.removeprefix("custom-")
     endpoint_name = endpoint_name.replace("--", "/")
     author, rest = endpoint_name.split("/")
@@ -95,8 +125,7 @@ def get_model_name_from_hugging_face_endpoint(endpoint_name: str):
     # get first token
     search_term = fuzzy_model_name.split('-')[0]
 
-    hf_api = HfApi()
-    results = hf_api.list_models(search=search_term, author=author)
+    results = get_hf_api().list_models(search=search_term, author=author)
 
     # find results that closest match our fuzzy model name
     results_to_diff = {}
@@ -0,0 +1,256 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from rich.progress import BarColumn, DownloadColumn, Progress, TextColumn, TimeRemainingColumn, TransferSpeedColumn
+from src.console import console
+from src.session import get_client
+from src.utils.aws_utils import construct_s3_uri
+from src.utils.cache import SqliteCache, get_cache_dir
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+MB = 1024 * 1024
+
+# S3 allows at most 10,000 parts per upload
+MAX_PARTS = 10000
+
+# Memory use is roughly part size * concurrency
+UPLOAD_PART_SIZE = int(os.environ.get(
+    "MODEL_MANAGER_UPLOAD_PART_SIZE_MB", 16)) * MB
+UPLOAD_CONCURRENCY = int(os.environ.get(
+    "MODEL_MANAGER_UPLOAD_CONCURRENCY", 16))
+
+HASH_CHUNK_SIZE = 8 * MB
+
+
+class ArtifactFile(NamedTuple):
+    path: str
+    relpath: str
+    size: int
+    sha256: str
+
+
+class PendingUpload(NamedTuple):
+    file: ArtifactFile
+    key: str
+    upload_id: Optional[str]
+    parts: Dict[int, str]
+    futures: List[Future]
+
+
+def list_artifact_files(location: str) -> List[Tuple[str, str]]:
+    """ (path, path relative to the artifact root) for a file or every file in a directory """
+    if os.path.isfile(location):
+        return [(location, os.path.basename(location))]
+
+    files = []
+    for root, _, filenames in os.walk(location):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            files.append((path, os.path.relpath(
+                path, location).replace(os.sep, "/")))
+    return sorted(files, key=lambda file: file[1])
+
+
+def get_tree_digest(files: List[ArtifactFile]) -> str:
+    digest = hashlib.sha256()
+    for file in files:
+        digest.update(f"{file.relpath}\0{file.sha256}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ArtifactUploader:
+    """ Content-addressed, resumable S3 uploader for model artifacts.
+
+    Artifacts are stored under `<prefix>/<sha256>/`, so re-deploying the same
+    content uploads nothing and different content never overwrites another
+    deploy. Files are hashed in parallel and their hashes cached by path,
+    size and mtime. Objects already in S3 are skipped, and content that
+    exists under another key is copied server side. Large files go up as
+    concurrent multipart parts, and an interrupted upload resumes from the
+    parts S3 already has.
+    """
+
+    def __init__(self, bucket: str, part_size: int = UPLOAD_PART_SIZE, max_concurrency: int = UPLOAD_CONCURRENCY,
+                 client=None, state_path: Optional[str] = None, show_progress: bool = True):
+        self.bucket = bucket
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.client = client or get_client('s3')
+        self.state = SqliteCache(state_path or os.path.join(
+            get_cache_dir(), "uploads.sqlite"))
+        self.show_progress = show_progress
+        self.uploaded_bytes = 0
+        self.skipped_bytes = 0
+        self._lock = threading.Lock()
+
+    def hash_file(self, path: str) -> str:
+        stat = os.stat(path)
+        cache_key = f"sha256:{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        digest = self.state.get(cache_key)
+        if digest is not None:
+            return digest
+
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as file:
+            # hashlib releases the GIL on large buffers, so files hash in parallel
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        self.state.set(cache_key, digest)
+        return digest
+
+    def hash_files(self, location: str) -> List[ArtifactFile]:
+        paths = list_artifact_files(location)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            digests = list(executor.map(
+                self.hash_file, [path for path, _ in paths]))
+        return [ArtifactFile(path, relpath, os.path.getsize(path), digest)
+                for (path, relpath), digest in zip(paths, digests)]
+
+    def upload(self, location: str, prefix: str, content_addressed: bool = True) -> str:
+        """ Upload a local file or directory and return its S3 uri.
+
+        A file becomes `<prefix>/<sha256>/<filename>`. A directory is laid out
+        as is under `<prefix>/<tree sha256>/` and the prefix uri is returned.
+        Without `content_addressed`, the digest is left out of the key.
+        """
+        files = self.hash_files(location)
+        is_file = os.path.isfile(location)
+        base = prefix.strip('/')
+        if content_addressed:
+            digest = files[0].sha256 if is_file else get_tree_digest(files)
+            base = f"{base}/{digest}"
+
+        start = time.monotonic()
+        columns = (TextColumn("[bold green]Uploading"), BarColumn(), DownloadColumn(),
+                   TransferSpeedColumn(), TimeRemainingColumn())
+        with Progress(*columns, console=console, disable=not self.show_progress) as progress:
+            task = progress.add_task(
+                "upload", total=sum(file.size for file in files))
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                pending = [self._submit(file, f"{base}/{file.relpath}", content_addressed, executor, progress, task)
+                           for file in files]
+                for upload in pending:
+                    if upload is not None:
+                        self._finish(upload)
+
+        elapsed = time.monotonic() - start
+        if self.show_progress:
+            throughput = self.uploaded_bytes / MB / elapsed if elapsed else 0.0
+            console.log(
+                f"Uploaded {self.uploaded_bytes / MB:.1f} MB in {elapsed:.1f}s ({throughput:.1f} MB/s), "
+                f"{self.skipped_bytes / MB:.1f} MB already in S3")
+
+        if is_file:
+            return construct_s3_uri(self.bucket, f"{base}/{files[0].relpath}")
+        return construct_s3_uri(self.bucket, f"{base}/")
+
+    def _exists(self, key: str, file: ArtifactFile, content_addressed: bool = False) -> bool:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as error:
+            if error.response['Error']['Code'] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        sha256 = head.get('Metadata', {}).get('sha256')
+        # Objects uploaded by other tools have no hash, the size only vouches for them under a content-addressed key
+        if sha256 is None:
+            return content_addressed and head['ContentLength'] == file.size
+        return head['ContentLength'] == file.size and sha256 == file.sha256
+
+    def _submit(self, file: ArtifactFile, key: str, content_addressed: bool, executor: ThreadPoolExecutor,
+                progress: Progress, task) -> Optional[PendingUpload]:
+        def advance(size: int, uploaded: bool = True):
+            with self._lock:
+                if uploaded:
+                    self.uploaded_bytes += size
+                else:
+                    self.skipped_bytes += size
+            progress.advance(task, size)
+
+        if self._exists(key, file, content_addressed):
+            advance(file.size, uploaded=False)
+            return None
+
+        # Same content under another key, e.g. a different model id
+        existing_key = self.state.get(f"blob:{self.bucket}:{file.sha256}")
+        if existing_key is not None and self._exists(existing_key, file):
+            def copy():
+                self.client.copy({'Bucket': self.bucket, 'Key': existing_key}, self.bucket, key,
+                                 ExtraArgs={'Metadata': {'sha256': file.sha256}, 'MetadataDirective': 'REPLACE'})
+                advance(file.size, uploaded=False)
+            return PendingUpload(file, key, None, {}, [executor.submit(copy)])
+
+        if file.size <= self.part_size:
+            def put():
+                with open(file.path, "rb") as body:
+                    self.client.put_object(Bucket=self.bucket, Key=key, Body=body.read(),
+                                           Metadata={'sha256': file.sha256})
+                advance(file.size)
+            return PendingUpload(file, key, None, {}, [executor.submit(put)])
+
+        upload_id, part_size, parts = self._start_multipart(file, key)
+        for part_number in parts:
+            advance(min(part_size, file.size - (part_number - 1) * part_size), uploaded=False)
+
+        def upload_part(part_number: int, offset: int, size: int) -> Tuple[int, str]:
+            with open(file.path, "rb") as body:
+                body.seek(offset)
+                data = body.read(size)
+            response = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                               PartNumber=part_number, Body=data)
+            advance(size)
+            return part_number, response['ETag']
+
+        futures = []
+        for part_number in range(1, math.ceil(file.size / part_size) + 1):
+            if part_number in parts:
+                continue
+            offset = (part_number - 1) * part_size
+            futures.append(executor.submit(upload_part, part_number,
+                           offset, min(part_size, file.size - offset)))
+        return PendingUpload(file, key, upload_id, parts, futures)
+
+    def _start_multipart(self, file: ArtifactFile, key: str) -> Tuple[str, int, Dict[int, str]]:
+        """ Resume the upload left behind by an interrupted run, or start a new one """
+        state_key = f"multipart:{self.bucket}/{key}"
+        state = self.state.get(state_key)
+        if state is not None:
+            try:
+                parts = {}
+                paginator = self.client.get_paginator('list_parts')
+                for page in paginator.paginate(Bucket=self.bucket, Key=key, UploadId=state['upload_id']):
+                    for part in page.get('Parts', []):
+                        parts[part['PartNumber']] = part['ETag']
+                return state['upload_id'], state['part_size'], parts
+            except ClientError as error:
+                if error.response['Error']['Code'] != "NoSuchUpload":
+                    raise
+
+        part_size = max(self.part_size, math.ceil(file.size / MAX_PARTS))
+        response = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=key, Metadata={'sha256': file.sha256})
+        self.state.set(state_key, {
+            "upload_id": response['UploadId'], "part_size": part_size})
+        return response['UploadId'], part_size, {}
+
+    def _finish(self, upload: PendingUpload):
+        parts = dict(upload.parts)
+        for future in upload.futures:
+            result = future.result()
+            if upload.upload_id is not None:
+                part_number, etag = result
+                parts[part_number] = etag
+
+        if upload.upload_id is not None:
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=upload.key, UploadId=upload.upload_id,
+                MultipartUpload={'Parts': [{'PartNumber': part_number, 'ETag': parts[part_number]}
+                                           for part_number in sorted(parts)]})
+            self.state.delete(f"multipart:{self.bucket}/{upload.key}")
+
+        self.state.set(f"blob:{self.bucket}:{upload.file.sha256}", upload.key)
@@ -0,0 +1,14 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# Tests run against local stubs; never pick up real AWS credentials or regions.
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+
+# Nor read or write the user's ~/.cache/model_manager
+CACHE_DIR = tempfile.mkdtemp(prefix="model_manager-tests-")
+os.environ["MODEL_MANAGER_CACHE_DIR"] = CACHE_DIR
+atexit.register(shutil.rmtree, CACHE_DIR, ignore_errors=True)
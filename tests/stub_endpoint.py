@@ -0,0 +1,108 @@
+import asyncio
+import binascii
+import socket
+import struct
+import threading
+import time
+import uvicorn
+from contextlib import contextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import Any, Callable, Iterable, Optional
+
+
+def echo(endpoint_name: str, body: bytes) -> Any:
+    return {
+        "endpoint_name": endpoint_name,
+        "inputs": body.decode("utf-8"),
+    }
+
+
+def encode_payload_part(payload: bytes) -> bytes:
+    """ Encodes a PayloadPart event in the AWS event stream binary format """
+    headers = b""
+    for name, value in ((":event-type", "PayloadPart"), (":message-type", "event"),
+                        (":content-type", "application/octet-stream")):
+        name, value = name.encode("utf-8"), value.encode("utf-8")
+        # header value type 7 is a utf-8 string
+        headers += struct.pack(">B", len(name)) + name + \
+            struct.pack(">BH", 7, len(value)) + value
+
+    total_length = 12 + len(headers) + len(payload) + 4
+    prelude = struct.pack(">II", total_length, len(headers))
+    prelude += struct.pack(">I", binascii.crc32(prelude))
+    message = prelude + headers + payload
+    return message + struct.pack(">I", binascii.crc32(message))
+
+
+def create_stub_app(latency: float = 0.0, handler: Optional[Callable[[str, bytes], Any]] = None,
+                    stream_handler: Optional[Callable[[str, bytes], Iterable[bytes]]] = None) -> FastAPI:
+    """ Mimics the SageMaker runtime InvokeEndpoint APIs. Echoes the request body back by default.
+
+    `stream_handler` returns the payload parts for InvokeEndpointWithResponseStream.
+    """
+    app = FastAPI()
+    app.state.invocations = 0
+    # TargetModel of each invocation, for multi-model endpoints
+    app.state.target_models = []
+    # CustomAttributes of each invocation, which carry the trace context
+    app.state.custom_attributes = []
+    # Invocations being served right now, and the most there have been at once
+    app.state.in_flight = 0
+    app.state.max_in_flight = 0
+    handler = handler or echo
+
+    @app.post("/endpoints/{endpoint_name}/invocations")
+    async def invocations(endpoint_name: str, request: Request):
+        body = await request.body()
+        app.state.invocations += 1
+        app.state.target_models.append(
+            request.headers.get("X-Amzn-SageMaker-Target-Model"))
+        app.state.custom_attributes.append(
+            request.headers.get("X-Amzn-SageMaker-Custom-Attributes"))
+        app.state.in_flight += 1
+        app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            app.state.in_flight -= 1
+        result = handler(endpoint_name, body)
+        # Handlers can return a Response to fail, e.g. with a 429
+        if isinstance(result, Response):
+            return result
+        return JSONResponse(result)
+
+    @app.post("/endpoints/{endpoint_name}/invocations-response-stream")
+    async def invocations_response_stream(endpoint_name: str, request: Request):
+        body = await request.body()
+        app.state.invocations += 1
+
+        async def events():
+            for part in stream_handler(endpoint_name, body):
+                await asyncio.sleep(latency)
+                yield encode_payload_part(part)
+
+        return StreamingResponse(events(), media_type="application/vnd.amazon.eventstream")
+
+    return app
+
+
+@contextmanager
+def run_stub_endpoint(app: FastAPI):
+    """ Serve `app` on a free local port and yield its base url """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(
+        app, host="127.0.0.1", port=port, log_level="warning", backlog=4096))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
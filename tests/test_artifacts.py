@@ -0,0 +1,61 @@
+import boto3
+import os
+import tarfile
+from moto import mock_aws
+from pathlib import Path
+from src.sagemaker import artifacts
+from src.sagemaker.artifacts import get_model_data, package_model, stage_model_artifact, unpack_model
+from src.schemas.model import ArtifactFormat, Model, ModelSource
+from src.utils.s3_upload import ArtifactUploader
+
+BUCKET = "model-artifacts"
+
+
+def write_model(path):
+    (path / "tokenizer").mkdir(parents=True)
+    (path / "model.safetensors").write_bytes(os.urandom(4096))
+    (path / "config.json").write_text('{"architectures": ["BertModel"]}')
+    (path / "tokenizer" / "vocab.txt").write_text("[CLS]\n[SEP]\n")
+    return path
+
+
+def test_package_and_unpack_round_trip(tmp_path):
+    model_dir = write_model(tmp_path / "model")
+    (tmp_path / "packaged").mkdir()
+    archive = package_model(str(model_dir), str(tmp_path / "packaged"))
+    with tarfile.open(archive) as tar:
+        assert sorted(tar.getnames()) == ["config.json", "model.safetensors", "tokenizer/vocab.txt"]
+
+    unpacked = unpack_model(archive, str(tmp_path / "unpacked"))
+    assert (tmp_path / "unpacked" / "tokenizer" / "vocab.txt").read_text() == "[CLS]\n[SEP]\n"
+    assert unpacked == str(tmp_path / "unpacked")
+
+    # Repackaging unchanged files gives the same archive, so the upload dedups
+    first = Path(archive).read_bytes()
+    os.utime(model_dir / "config.json", (0, 0))
+    (tmp_path / "repackaged").mkdir()
+    assert Path(package_model(str(model_dir), str(tmp_path / "repackaged"))).read_bytes() == first
+
+
+@mock_aws
+def test_large_models_are_staged_uncompressed(tmp_path, monkeypatch):
+    client = boto3.client("s3")
+    client.create_bucket(Bucket=BUCKET)
+    model_dir = write_model(tmp_path / "model")
+    uploader = ArtifactUploader(BUCKET, client=client, state_path=str(tmp_path / "uploads.sqlite"),
+                                show_progress=False)
+    model = Model(id="acme/bert", source=ModelSource.Custom, location=str(model_dir))
+
+    monkeypatch.setattr(artifacts, "UNCOMPRESSED_THRESHOLD", 1024)
+    s3_path = stage_model_artifact(model, BUCKET, str(tmp_path), uploader)
+    assert s3_path.endswith("/")
+    prefix = s3_path[len(f"s3://{BUCKET}/"):]
+    keys = [obj["Key"] for obj in client.list_objects_v2(Bucket=BUCKET, Prefix=prefix)["Contents"]]
+    assert f"{prefix}config.json" in keys
+    assert get_model_data(s3_path) == {"S3DataSource": {
+        "S3Uri": s3_path, "S3DataType": "S3Prefix", "CompressionType": "None"}}
+
+    model.artifact_format = ArtifactFormat.Compressed
+    s3_path = stage_model_artifact(model, BUCKET, str(tmp_path), uploader)
+    assert s3_path.endswith("/model.tar.gz")
+    assert get_model_data(s3_path) == s3_path
@@ -0,0 +1,93 @@
+import boto3
+import json
+from moto import mock_aws
+from src.sagemaker import async_inference
+from src.sagemaker.async_inference import (AsyncInferenceStore, AsyncStatus, configure_scale_to_zero,
+                                           get_async_result, get_async_status, remove_scale_to_zero, split_s3_uri,
+                                           submit_async_request)
+from src.sagemaker.query_endpoint import QueryRequest
+from src.schemas.deployment import Deployment, Destination
+
+BUCKET = "async-inference"
+ENDPOINT_NAME = "meta-llama--Llama-2-70b-chat-hf-202405011200"
+DEPLOYMENT = Deployment(destination=Destination.AWS, instance_type="ml.g5.48xlarge", endpoint_name=ENDPOINT_NAME,
+                        async_inference=True, async_output_path=f"s3://{BUCKET}/llama")
+REQUEST = QueryRequest(task="text-generation", content_type="application/json", accept="application/json",
+                       body=json.dumps({"inputs": "Write a novel"}).encode("utf-8"))
+
+
+@mock_aws
+def test_async_requests_are_submitted_through_s3_and_polled(tmp_path, monkeypatch):
+    client = boto3.client("s3")
+    client.create_bucket(Bucket=BUCKET)
+    monkeypatch.setattr(async_inference, "get_client", lambda service: boto3.client(service))
+    monkeypatch.setattr(async_inference, "_async_store",
+                        AsyncInferenceStore(str(tmp_path / "async.sqlite")))
+
+    inference = submit_async_request(ENDPOINT_NAME, DEPLOYMENT, REQUEST)
+    assert client.get_object(Bucket=BUCKET, Key=f"llama/input/{inference.inference_id}")[
+        'Body'].read() == REQUEST.body
+    # Any server process can pick the request up by its id
+    assert AsyncInferenceStore(str(tmp_path / "async.sqlite")).get(inference.inference_id) == inference
+
+    # moto writes a result straight away, so take it back to simulate a queued request
+    bucket, key = split_s3_uri(inference.output_location)
+    client.delete_object(Bucket=bucket, Key=key)
+    assert get_async_status(inference) == AsyncStatus.InProgress
+    assert get_async_result(inference) == (AsyncStatus.InProgress, None)
+
+    client.put_object(Bucket=bucket, Key=key, Body=b'[{"generated_text": "Once upon a time"}]')
+    assert get_async_status(inference) == AsyncStatus.Completed
+    assert get_async_result(inference) == (
+        AsyncStatus.Completed, [{"generated_text": "Once upon a time"}])
+
+
+@mock_aws
+def test_scale_to_zero_registers_backlog_scaling(monkeypatch):
+    monkeypatch.setattr(async_inference, "get_client", lambda service: boto3.client(service))
+    configure_scale_to_zero(ENDPOINT_NAME, max_capacity=4)
+
+    autoscaling = boto3.client("application-autoscaling")
+    target = autoscaling.describe_scalable_targets(ServiceNamespace="sagemaker")['ScalableTargets'][0]
+    assert (target['MinCapacity'], target['MaxCapacity']) == (0, 4)
+    policies = autoscaling.describe_scaling_policies(ServiceNamespace="sagemaker")['ScalingPolicies']
+    assert sorted(policy['PolicyType'] for policy in policies) == ["StepScaling", "TargetTrackingScaling"]
+
+    alarm = boto3.client("cloudwatch").describe_alarms()['MetricAlarms'][0]
+    assert alarm['MetricName'] == "HasBacklogWithoutCapacity"
+    assert alarm['AlarmActions'] == [policy['PolicyARN'] for policy in policies
+                                     if policy['PolicyType'] == "StepScaling"]
+
+    # Deleting the endpoint tears it all down again
+    assert remove_scale_to_zero(ENDPOINT_NAME)
+    assert autoscaling.describe_scalable_targets(ServiceNamespace="sagemaker")['ScalableTargets'] == []
+    assert autoscaling.describe_scaling_policies(ServiceNamespace="sagemaker")['ScalingPolicies'] == []
+    assert boto3.client("cloudwatch").describe_alarms()['MetricAlarms'] == []
+    assert not remove_scale_to_zero(ENDPOINT_NAME)
+
+
+def test_chat_completions_skip_async_endpoints(monkeypatch):
+    import server
+    from fastapi.testclient import TestClient
+    from src.config import ModelDeployment
+    from src.schemas.model import Model, ModelSource
+
+    model = Model(id="meta-llama/Llama-2-70b-chat-hf", source=ModelSource.HuggingFace, task="text-generation")
+    realtime = Deployment(destination=Destination.AWS, instance_type="ml.g5.48xlarge", endpoint_name="llama-realtime")
+    endpoints = [ModelDeployment(DEPLOYMENT, [model]), ModelDeployment(realtime, [model])]
+
+    async def stream_chat_completion(endpoint_name, config, messages):
+        yield endpoint_name
+
+    monkeypatch.setattr(server, "stream_chat_completion", stream_chat_completion)
+    client = TestClient(server.app)
+    body = {"model": model.id, "messages": [{"role": "user", "content": "hi"}], "stream": True}
+
+    monkeypatch.setattr(server, "get_endpoints_for_model", lambda model_id: endpoints)
+    for _ in range(3):
+        assert client.post("/chat/completions", json=body).text == "llama-realtime"
+
+    monkeypatch.setattr(server, "get_endpoints_for_model", lambda model_id: endpoints[:1])
+    response = client.post("/chat/completions", json=body)
+    assert response.status_code == 400
+    assert f"/endpoint/{ENDPOINT_NAME}/async" in response.json()["detail"]
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from src.sagemaker import query_endpoint
+from src.sagemaker.query_endpoint import ResolvedEndpoint, build_query_request_async, make_query_request_async
+from src.sagemaker.runtime import close_async_runtime
+from src.schemas.deployment import Deployment, Destination
+from src.schemas.model import Model, ModelSource
+from src.schemas.query import Query
+from tests.stub_endpoint import create_stub_app, run_stub_endpoint
+
+STUB_LATENCY = 1.0
+
+# uvicorn's default threadpool size, which capped the old sync handlers
+SYNC_WORKERS = 40
+# More than the sync handlers could have in flight, fewer than the connection pool holds
+NUM_REQUESTS = 2 * SYNC_WORKERS
+
+ENDPOINT_NAME = "huggingface-tc-bert-base-cased-202403291810"
+CONFIG = (
+    Deployment(destination=Destination.AWS,
+               instance_type="ml.m5.xlarge", endpoint_name=ENDPOINT_NAME),
+    Model(id="huggingface-tc-bert-base-cased",
+          source=ModelSource.Sagemaker, task="tc"),
+)
+
+
+def test_async_queries_are_all_in_flight_at_once(monkeypatch):
+    """ Async queries aren't capped by a threadpool, the endpoint sees every one of them at the same time """
+    query = Query(query="hello world")
+    app = create_stub_app(latency=STUB_LATENCY)
+    with run_stub_endpoint(app) as url:
+        monkeypatch.setenv("AWS_ENDPOINT_URL_SAGEMAKER_RUNTIME", url)
+
+        async def run_async():
+            try:
+                return await asyncio.gather(*[
+                    make_query_request_async(ENDPOINT_NAME, query, CONFIG) for _ in range(NUM_REQUESTS)])
+            finally:
+                await close_async_runtime()
+
+        results = asyncio.run(run_async())
+
+    assert results[0] == {"endpoint_name": ENDPOINT_NAME, "inputs": "hello world"}
+    assert app.state.invocations == NUM_REQUESTS
+    assert app.state.max_in_flight == NUM_REQUESTS > SYNC_WORKERS
+
+
+def test_endpoints_without_config_are_resolved_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def resolve_endpoint(endpoint_name, config=None):
+        threads.append(threading.current_thread())
+        return ResolvedEndpoint(is_sagemaker=True, task="tc")
+
+    monkeypatch.setattr(query_endpoint, "resolve_endpoint", resolve_endpoint)
+    monkeypatch.setattr(query_endpoint, "_resolved_endpoints", query_endpoint.TTLCache())
+
+    async def build():
+        return [await build_query_request_async("unconfigured-tc-endpoint", Query(query="hello"), None)
+                for _ in range(3)]
+
+    requests = asyncio.run(build())
+    # Resolved once, in a worker thread
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+    assert requests[0] == requests[2] and requests[0].task == "tc"
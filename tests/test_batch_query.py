@@ -0,0 +1,80 @@
+import asyncio
+import functools
+import json
+from fastapi.responses import JSONResponse
+from src.config import ModelDeployment
+from src.sagemaker import batch_query
+from src.sagemaker.batch_query import AdaptiveRateLimiter, percentile, query_file_async
+from src.schemas.deployment import Deployment, Destination
+from src.schemas.model import Model, ModelSource
+from tests.stub_endpoint import create_stub_app, run_stub_endpoint
+
+ENDPOINT_NAME = "huggingface-tc-bert-base-cased-202403291810"
+CONFIG = ModelDeployment(
+    deployment=Deployment(destination=Destination.AWS,
+                          instance_type="ml.m5.xlarge", endpoint_name=ENDPOINT_NAME),
+    models=[Model(id="huggingface-tc-bert-base-cased",
+                  source=ModelSource.Sagemaker, task="tc")],
+)
+NUM_RECORDS = 200
+
+
+def throttle_some(endpoint_name, body):
+    # Throttles every tenth query the first time it's sent
+    text = body.decode("utf-8")
+    if text.endswith("0") and text not in throttle_some.seen:
+        throttle_some.seen.add(text)
+        return JSONResponse({"message": "Rate exceeded"}, status_code=429,
+                            headers={"x-amzn-ErrorType": "ThrottlingException"})
+    return {"inputs": text}
+
+
+def test_query_file_is_ordered_resumable_and_retries_throttling(tmp_path, monkeypatch):
+    throttle_some.seen = set()
+    input_path = tmp_path / "input.jsonl"
+    input_path.write_text("".join(
+        json.dumps({"id": f"record-{i}", "query": f"text {i}"}) + "\n" for i in range(NUM_RECORDS)))
+    output_path = tmp_path / "output.jsonl"
+    # A previous run that crashed mid-write
+    output_path.write_text(
+        json.dumps({"id": "record-0", "response": {"inputs": "text 0"}}) + "\n" + '{"id": "rec')
+
+    monkeypatch.setattr(batch_query, "get_config_for_endpoint", lambda endpoint_name: CONFIG)
+    monkeypatch.setattr(batch_query, "RETRY_BASE_DELAY", 0.01)
+    # Backing off is covered below, here it would only slow the test down
+    monkeypatch.setattr(batch_query, "AdaptiveRateLimiter",
+                        functools.partial(AdaptiveRateLimiter, min_rate=1000))
+    monkeypatch.setenv("AWS_MAX_ATTEMPTS", "1")
+    app = create_stub_app(latency=0.01, handler=throttle_some)
+    with run_stub_endpoint(app) as url:
+        monkeypatch.setenv("AWS_ENDPOINT_URL_SAGEMAKER_RUNTIME", url)
+        report = asyncio.run(query_file_async(
+            str(input_path), ENDPOINT_NAME, str(output_path), concurrency=16, show_progress=False))
+
+    lines = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert [line["id"] for line in lines] == [f"record-{i}" for i in range(NUM_RECORDS)]
+    assert all(line["response"] == {"inputs": f"text {i}"} for i, line in enumerate(lines))
+    assert report.skipped == 1
+    assert report.succeeded == NUM_RECORDS - 1
+    assert report.failed == 0
+    assert report.throttled == len(throttle_some.seen) == 19
+    assert app.state.invocations == NUM_RECORDS - 1 + 19
+
+
+def test_rate_limiter_backs_off_on_throttling():
+    async def run():
+        limiter = AdaptiveRateLimiter(rate=100, cooldown=1)
+        limiter.on_throttle()
+        limiter.on_throttle()
+        assert limiter.rate == 50
+        limiter.on_success()
+        assert limiter.rate == 50.02
+        return limiter
+    asyncio.run(run())
+
+
+def test_percentile():
+    values = sorted(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 90) == 0.0
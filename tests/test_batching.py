@@ -0,0 +1,48 @@
+import asyncio
+import json
+from src.sagemaker.batching import MicroBatcher
+from src.sagemaker.runtime import AsyncSagemakerRuntime
+from src.schemas.deployment import Deployment, Destination
+from src.schemas.model import Model, ModelSource
+from src.schemas.query import Query
+from tests.stub_endpoint import create_stub_app, run_stub_endpoint
+
+ENDPOINT_NAME = "huggingface-tc-bert-base-cased-202403291810"
+CONFIG = (
+    Deployment(destination=Destination.AWS,
+               instance_type="ml.m5.xlarge", endpoint_name=ENDPOINT_NAME),
+    Model(id="huggingface-tc-bert-base-cased",
+          source=ModelSource.Sagemaker, task="tc"),
+)
+
+
+def classify(endpoint_name, body):
+    texts = json.loads(body)
+    return {
+        "labels": ["negative", "positive"],
+        "probabilities": [[0.1, 0.9] for _ in texts],
+        "predicted_label": [text for text in texts],
+    }
+
+
+def test_micro_batcher_coalesces_concurrent_queries(monkeypatch):
+    app = create_stub_app(latency=0.05, handler=classify)
+    with run_stub_endpoint(app) as url:
+        monkeypatch.setenv("AWS_ENDPOINT_URL_SAGEMAKER_RUNTIME", url)
+
+        async def run():
+            runtime = AsyncSagemakerRuntime()
+            batcher = MicroBatcher(max_batch_size=16,
+                                   max_wait_ms=50, runtime=runtime)
+            try:
+                return await asyncio.gather(*[
+                    batcher.query(ENDPOINT_NAME, Query(query=f"text {i}"), CONFIG) for i in range(64)])
+            finally:
+                await runtime.close()
+
+        results = asyncio.run(run())
+
+    assert app.state.invocations == 4
+    assert [result["predicted_label"] for result in results] == [
+        f"text {i}" for i in range(64)]
+    assert results[0]["labels"] == ["negative", "positive"]
@@ -0,0 +1,60 @@
+import asyncio
+import json
+from src.sagemaker.bench import Workload, bench_async, parse_distribution
+from src.schemas.deployment import Deployment, Destination
+from src.schemas.model import Model, ModelSource
+from tests.stub_endpoint import create_stub_app, run_stub_endpoint
+from tests.test_streaming import tgi_stream
+
+ENDPOINT_NAME = "meta-llama--Meta-Llama-3-8B-Instruct-202405101200"
+CONFIG = (
+    Deployment(destination=Destination.AWS,
+               instance_type="ml.g5.12xlarge", endpoint_name=ENDPOINT_NAME),
+    Model(id="meta-llama/Meta-Llama-3-8B-Instruct",
+          source=ModelSource.HuggingFace, task="text-generation"),
+)
+STUB_LATENCY = 0.05
+
+
+def generate(endpoint_name, body):
+    payload = json.loads(body)
+    assert payload["parameters"]["max_new_tokens"] in (16, 32)
+    return [{"generated_text": payload["inputs"]}]
+
+
+def test_workload_draws_from_distributions():
+    workload = Workload(prompt_tokens="8:16", max_new_tokens="16,32")
+    queries = [workload.next_query() for _ in range(50)]
+    assert all(8 <= len(query.query.split()) <= 16 for query in queries)
+    assert {query.parameters.max_new_tokens for query in queries} == {16, 32}
+    assert parse_distribution("128")(None) == 128
+
+
+def test_closed_and_open_loop_against_stub(monkeypatch):
+    with run_stub_endpoint(create_stub_app(latency=STUB_LATENCY, handler=generate)) as url:
+        monkeypatch.setenv("AWS_ENDPOINT_URL_SAGEMAKER_RUNTIME", url)
+        closed = asyncio.run(bench_async(ENDPOINT_NAME, CONFIG, Workload("8:16", "16,32"),
+                                         duration=1, warmup=0.2, concurrency=4))
+        open_loop = asyncio.run(bench_async(ENDPOINT_NAME, CONFIG, Workload("8:16", "16,32"),
+                                            duration=1, warmup=0.2, rate=50))
+
+    # Each of the 4 clients waits at least 50ms per query, however loaded the machine is
+    assert closed["error_rate"] == 0
+    assert 0 < closed["succeeded"] == closed["requests"] <= 4 * (1 / STUB_LATENCY + 1)
+    assert closed["throughput"] > 0
+    assert closed["latency"]["p50"] >= STUB_LATENCY
+    assert set(closed["latency"]) == {"p50", "p90", "p99", "p99.9"}
+
+    assert open_loop["mode"] == "open"
+    assert open_loop["error_rate"] == 0
+    assert 45 <= open_loop["requests"] <= 51
+
+
+def test_streaming_reports_time_to_first_token(monkeypatch):
+    with run_stub_endpoint(create_stub_app(latency=STUB_LATENCY, stream_handler=tgi_stream)) as url:
+        monkeypatch.setenv("AWS_ENDPOINT_URL_SAGEMAKER_RUNTIME", url)
+        report = asyncio.run(bench_async(ENDPOINT_NAME, CONFIG, Workload("8", "16"),
+                                         duration=0.5, warmup=0, concurrency=2, stream=True))
+
+    assert report["error_rate"] == 0
+    assert STUB_LATENCY <= report["ttft"]["p50"] < report["latency"]["p50"]
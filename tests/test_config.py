@@ -0,0 +1,49 @@
+import os
+import yaml
+from src.config import ConfigRegistry
+from src.schemas.deployment import Deployment, Destination
+from src.schemas.model import Model, ModelSource
+from src.yaml import dumper
+
+
+def write_yaml(path, endpoint_name, model_id):
+    out = {
+        "deployment": Deployment(destination=Destination.AWS, instance_type="ml.m5.xlarge", endpoint_name=endpoint_name),
+        "models": [Model(id=model_id, source=ModelSource.HuggingFace)],
+    }
+    with open(path, 'w') as config:
+        config.write(yaml.dump(out, Dumper=dumper))
+
+
+def test_config_registry_lookups_and_invalidation(tmp_path):
+    write_yaml(tmp_path / "a.yaml", "endpoint-a", "model-1")
+    write_yaml(tmp_path / "b.yaml", "endpoint-b", "model-1")
+    (tmp_path / "train.yaml").write_text("training: null\n")
+
+    registry = ConfigRegistry(str(tmp_path / "*.yaml"), refresh_interval=0)
+    assert registry.get_config_for_endpoint("endpoint-a").models[0].id == "model-1"
+    assert len(registry.get_endpoints_for_model("model-1")) == 2
+    assert len(registry.configs()) == 2
+
+    # Modified file is re-parsed and re-indexed
+    write_yaml(tmp_path / "b.yaml", "endpoint-b", "model-2")
+    os.utime(tmp_path / "b.yaml", ns=(1, 1))
+    assert len(registry.get_endpoints_for_model("model-1")) == 1
+    assert registry.get_endpoints_for_model("model-2")[0].deployment.endpoint_name == "endpoint-b"
+
+    # Removed file drops out of both indexes
+    os.remove(tmp_path / "a.yaml")
+    assert registry.get_config_for_endpoint("endpoint-a") is None
+    assert registry.get_endpoints_for_model("model-1") == []
+
+
+def test_config_registry_does_not_rescan_within_interval(tmp_path):
+    write_yaml(tmp_path / "a.yaml", "endpoint-a", "model-1")
+    registry = ConfigRegistry(str(tmp_path / "*.yaml"), refresh_interval=3600)
+    assert registry.get_config_for_endpoint("endpoint-a") is not None
+
+    write_yaml(tmp_path / "b.yaml", "endpoint-b", "model-1")
+    assert registry.get_config_for_endpoint("endpoint-b") is None
+
+    registry.invalidate()
+    assert registry.get_config_for_endpoint("endpoint-b") is not None
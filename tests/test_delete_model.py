@@ -0,0 +1,55 @@
+import boto3
+import datetime
+from moto import mock_aws
+from src import config
+from src.sagemaker import async_inference, delete_model, poller, resources
+from src.sagemaker.delete_model import delete_sagemaker_model, parse_age, select_endpoints
+from src.sagemaker.poller import EndpointPoller
+from src.utils.cache import TTLCache
+from tests.test_resources import create_endpoint
+
+
+def test_select_endpoints_by_pattern_and_age():
+    now = datetime.datetime(2024, 5, 10, tzinfo=datetime.timezone.utc)
+    endpoints = [
+        {"EndpointName": "bert-a-202405010000", "CreationTime": now - datetime.timedelta(days=9)},
+        {"EndpointName": "bert-b-202405090000", "CreationTime": now - datetime.timedelta(days=1)},
+        {"EndpointName": "llama-202405010000", "CreationTime": now - datetime.timedelta(days=9)},
+    ]
+    assert parse_age("7d") == datetime.timedelta(days=7)
+    assert select_endpoints(endpoints, "bert-*") == ["bert-a-202405010000", "bert-b-202405090000"]
+    assert select_endpoints(endpoints, "bert-*", parse_age("7d"), now) == ["bert-a-202405010000"]
+    assert select_endpoints(endpoints, older_than=parse_age("1w"), now=now) == [
+        "bert-a-202405010000", "llama-202405010000"]
+
+
+@mock_aws
+def test_delete_reaps_configs_and_models_not_used_elsewhere(tmp_path, monkeypatch):
+    client = boto3.client("sagemaker")
+    for module in (delete_model, poller, resources):
+        monkeypatch.setattr(module, "get_client", lambda service: client)
+    monkeypatch.setattr(async_inference, "get_client", lambda service: boto3.client(service))
+    monkeypatch.setattr(resources, "_endpoint_configs", TTLCache())
+    monkeypatch.setattr(config, "_registries", {})
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "configs").mkdir()
+
+    for name in ("old-1", "old-2", "keep"):
+        create_endpoint(client, name)
+        (tmp_path / "configs" / f"{name}.yaml").write_text(
+            f"deployment: !Deployment\n  destination: aws\n  instance_type: ml.m5.xlarge\n  endpoint_name: {name}\n"
+            "models:\n- !Model\n  id: bert\n  source: huggingface\n")
+    # Shares old-1's config, so that config and its model have to stay
+    client.create_endpoint(EndpointName="shared", EndpointConfigName="old-1")
+
+    deleted = delete_sagemaker_model(["old-1", "old-2"], EndpointPoller(initial_delay=0))
+
+    assert sorted(deleted) == ["old-1", "old-2"]
+    endpoints = {endpoint["EndpointName"] for endpoint in client.list_endpoints()["Endpoints"]}
+    assert endpoints == {"keep", "shared"}
+    configs = {c["EndpointConfigName"] for c in client.list_endpoint_configs()["EndpointConfigs"]}
+    assert configs == {"old-1", "keep"}
+    models = {model["ModelName"] for model in client.list_models()["Models"]}
+    assert models == {"old-1", "keep"}
+    assert sorted(path.name for path in (tmp_path / "configs").iterdir()) == ["keep.yaml"]
+    assert config.get_config_for_endpoint("old-1") is None
@@ -0,0 +1,41 @@
+import boto3
+from moto import mock_aws
+from src.sagemaker import endpoint_index
+from src.sagemaker.endpoint_index import EndpointIndex, get_endpoint_tags
+from src.schemas.model import Model, ModelSource
+from src.utils import model_utils
+from tests.test_resources import ROLE
+
+ENDPOINT_NAME = "meta-llama--Meta-Llama-3-8B-Instruct-202405011200"
+MODEL = Model(id="meta-llama/Meta-Llama-3-8B-Instruct", source=ModelSource.HuggingFace,
+              task="text-generation", revision="main")
+
+
+@mock_aws
+def test_index_is_rebuilt_from_endpoint_tags(tmp_path, monkeypatch):
+    client = boto3.client("sagemaker")
+    monkeypatch.setattr(endpoint_index, "get_client", lambda service: boto3.client(service))
+    client.create_model(ModelName=ENDPOINT_NAME, ExecutionRoleArn=ROLE,
+                        PrimaryContainer={"Image": "123456789012.dkr.ecr.us-east-1.amazonaws.com/tgi:latest"})
+    client.create_endpoint_config(EndpointConfigName=ENDPOINT_NAME, ProductionVariants=[{
+        "VariantName": "AllTraffic", "ModelName": ENDPOINT_NAME,
+        "InitialInstanceCount": 1, "InstanceType": "ml.g4dn.xlarge"}])
+    client.create_endpoint(EndpointName=ENDPOINT_NAME, EndpointConfigName=ENDPOINT_NAME,
+                           Tags=get_endpoint_tags(MODEL))
+
+    # A host that didn't deploy the endpoint
+    index = EndpointIndex(str(tmp_path / "endpoints.sqlite"))
+    assert index.get(ENDPOINT_NAME) is None
+    assert index.lookup(ENDPOINT_NAME) == {
+        "model_id": MODEL.id, "task": "text-generation", "source": "huggingface", "revision": "main"}
+
+    # Resolving the model no longer searches the hub
+    monkeypatch.setattr(model_utils, "get_endpoint_index", lambda: index)
+    monkeypatch.setattr(model_utils, "get_model_name_from_hugging_face_endpoint", None)
+    assert model_utils.get_model_and_task(ENDPOINT_NAME) == {
+        "model_id": MODEL.id, "task": "text-generation"}
+    assert not model_utils.is_sagemaker_model(ENDPOINT_NAME)
+
+    index.delete(ENDPOINT_NAME)
+    # Misses don't rescan tags again right away
+    assert index.lookup(ENDPOINT_NAME) is None
@@ -0,0 +1,43 @@
+from src.huggingface import hub_cache
+from src.huggingface.hub_cache import HubMetadataCache
+
+MODEL_INFO = {
+    "id": "google-bert/bert-base-uncased",
+    "sha": "86b5e0934494bd15c9632b12f734a8a67f723594",
+    "pipeline_tag": "fill-mask",
+    "transformersInfo": {"pipeline_tag": "fill-mask"},
+}
+
+
+def test_model_info_is_cached_revalidated_and_served_offline(tmp_path, monkeypatch):
+    requests = []
+
+    def fetch_model_info(model_id, revision=None, etag=None):
+        requests.append(etag)
+        if etag == '"v1"':
+            return 304, etag, None
+        return 200, '"v1"', MODEL_INFO
+    monkeypatch.setattr(hub_cache, "fetch_model_info", fetch_model_info)
+
+    path = str(tmp_path / "hub.sqlite")
+    cache = HubMetadataCache(ttl=3600, path=path)
+    assert cache.pipeline_task("google-bert/bert-base-uncased") == "fill-mask"
+    assert cache.pipeline_task("google-bert/bert-base-uncased") == "fill-mask"
+    assert requests == [None]
+
+    # A new process reads the disk cache
+    assert HubMetadataCache(ttl=3600, path=path).model_info("google-bert/bert-base-uncased") == MODEL_INFO
+    assert requests == [None]
+
+    # Expired entries are revalidated with their ETag
+    stale = HubMetadataCache(ttl=0, path=path)
+    assert stale.model_info("google-bert/bert-base-uncased") == MODEL_INFO
+    assert requests == [None, '"v1"']
+
+    def unreachable(model_id, revision=None, etag=None):
+        raise ConnectionError("hub unreachable")
+    monkeypatch.setattr(hub_cache, "fetch_model_info", unreachable)
+    assert stale.model_info("google-bert/bert-base-uncased") == MODEL_INFO
+
+    monkeypatch.setenv("HF_HUB_OFFLINE", "1")
+    assert stale.model_info("google-bert/bert-base-uncased") == MODEL_INFO
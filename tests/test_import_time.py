@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that take seconds to import and must only load in the code path that needs them
+HEAVY_MODULES = {"sagemaker", "litellm", "transformers", "datasets"}
+
+# Cumulative import time budget per entry point, in seconds
+IMPORT_BUDGETS = {
+    "model_manager": (1.0, HEAVY_MODULES | {"inquirer", "InquirerPy", "huggingface_hub.hf_api"}),
+    "server": (2.0, HEAVY_MODULES | {"inquirer", "InquirerPy", "aiobotocore", "src.sagemaker.batch_query"}),
+    "src.main": (1.5, HEAVY_MODULES),
+}
+
+
+def import_time(module: str):
+    """ Returns the cumulative import time of `module` and the modules it imported, via -X importtime """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+        env={**os.environ, "LITELLM_LOCAL_MODEL_COST_MAP": "True"})
+    assert result.returncode == 0, result.stderr
+
+    total, imported = 0, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        imported.add(name.strip())
+        if not name.startswith("  "):
+            total += int(cumulative)
+    return total / 1e6, imported
+
+
+@pytest.mark.parametrize("module", IMPORT_BUDGETS)
+def test_import_time_budget(module):
+    budget, forbidden = IMPORT_BUDGETS[module]
+    # Best of three to smooth out a cold filesystem cache
+    elapsed, imported = min(import_time(module) for _ in range(3))
+    assert forbidden.isdisjoint(imported), forbidden & imported
+    assert elapsed < budget, f"{module}: {elapsed:.3f}s"
@@ -0,0 +1,59 @@
+from src.sagemaker import jumpstart_catalog
+from src.sagemaker.jumpstart_catalog import JumpStartCatalog, get_jumpstart_catalog
+
+MODEL_IDS = [
+    "huggingface-eqa-bert-base-cased",
+    "huggingface-eqa-distilbert-base-cased",
+    "huggingface-tc-bert-base-cased",
+    "huggingface-llm-falcon-7b-instruct-bf16",
+    "meta-textgeneration-llama-2-7b",
+    "meta-textgeneration-llama-2-7b-f",
+    "meta-textgeneration-llama-2-13b",
+    "pytorch-ic-mobilenet-v2",
+]
+
+
+def test_search_ranks_by_framework_task_and_name():
+    catalog = JumpStartCatalog(MODEL_IDS)
+
+    assert catalog.search("llama 7b") == [
+        "meta-textgeneration-llama-2-7b", "meta-textgeneration-llama-2-7b-f"]
+    assert catalog.search("bert", framework="huggingface", task="eqa") == [
+        "huggingface-eqa-bert-base-cased"]
+    # Prefixes and typos still match
+    assert catalog.search("distil") == ["huggingface-eqa-distilbert-base-cased"]
+    assert catalog.search("lama", framework="meta", limit=1) == ["meta-textgeneration-llama-2-7b"]
+    assert catalog.search("", framework="pytorch") == ["pytorch-ic-mobilenet-v2"]
+    assert catalog.search("whisper") == []
+
+
+def test_catalog_snapshot_is_reused_and_refreshed(tmp_path, monkeypatch):
+    fetches = []
+
+    def fetch_jumpstart_model_ids(region_name):
+        fetches.append(region_name)
+        return MODEL_IDS
+    monkeypatch.setattr(jumpstart_catalog, "fetch_jumpstart_model_ids", fetch_jumpstart_model_ids)
+    monkeypatch.setattr(jumpstart_catalog, "get_cache_dir", lambda: str(tmp_path))
+    monkeypatch.setattr(jumpstart_catalog, "_catalogs", {})
+
+    assert len(get_jumpstart_catalog("us-east-1").model_ids) == len(MODEL_IDS)
+    assert fetches == ["us-east-1"]
+
+    # A new process loads the snapshot from disk
+    monkeypatch.setattr(jumpstart_catalog, "_catalogs", {})
+    assert get_jumpstart_catalog("us-east-1").search("falcon") == [
+        "huggingface-llm-falcon-7b-instruct-bf16"]
+    assert fetches == ["us-east-1"]
+
+    # Stale snapshots are refreshed in the background, but not offline
+    monkeypatch.setattr(jumpstart_catalog, "CATALOG_CACHE_TTL", -1)
+    monkeypatch.setenv("MODEL_MANAGER_OFFLINE", "1")
+    get_jumpstart_catalog("us-east-1")
+    assert fetches == ["us-east-1"]
+
+    monkeypatch.delenv("MODEL_MANAGER_OFFLINE")
+    monkeypatch.setattr(jumpstart_catalog.threading, "Thread",
+                        lambda target, daemon: type("Thread", (), {"start": staticmethod(target)}))
+    get_jumpstart_catalog("us-east-1")
+    assert fetches == ["us-east-1", "us-east-1"]
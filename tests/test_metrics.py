@@ -0,0 +1,102 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.responses import Response
+from src.sagemaker.query_endpoint import make_query_request_async
+from src.sagemaker.runtime import close_async_runtime
+from src.schemas.deployment import Deployment, Destination
+from src.schemas.model import Model, ModelSource
+from src.schemas.query import Query
+from tests.stub_endpoint import create_stub_app, run_stub_endpoint
+
+pytest.importorskip("prometheus_client")
+from prometheus_client import REGISTRY  # noqa: E402
+from src import metrics  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINT_NAME = "huggingface-tc-bert-base-cased-202403291810"
+CONFIG = (
+    Deployment(destination=Destination.AWS,
+               instance_type="ml.m5.xlarge", endpoint_name=ENDPOINT_NAME),
+    Model(id="huggingface-tc-bert-base-cased",
+          source=ModelSource.Sagemaker, task="tc"),
+)
+LABELS = {"endpoint": ENDPOINT_NAME,
+          "model": "huggingface-tc-bert-base-cased", "instance_type": "ml.m5.xlarge"}
+
+
+def sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_invocations_are_tracked_by_deployment(monkeypatch):
+    monkeypatch.setenv("AWS_MAX_ATTEMPTS", "1")
+    labels = metrics.get_labels(ENDPOINT_NAME, CONFIG)
+    throttle = {"throttle": False}
+
+    def handler(endpoint_name, body):
+        if throttle["throttle"]:
+            return Response(status_code=429, content=b'{"message": "slow down"}',
+                            headers={"x-amzn-ErrorType": "ThrottlingException"})
+        return {"ok": True}
+
+    async def query():
+        with metrics.track_invoke(labels):
+            return await make_query_request_async(ENDPOINT_NAME, Query(query="hello"), CONFIG)
+
+    async def run():
+        try:
+            await query()
+            throttle["throttle"] = True
+            with pytest.raises(Exception):
+                await query()
+        finally:
+            await close_async_runtime()
+
+    invokes = sample("model_manager_invoke_duration_seconds_count", LABELS)
+    throttles = sample("model_manager_invoke_throttles_total", LABELS)
+    with run_stub_endpoint(create_stub_app(handler=handler)) as url:
+        monkeypatch.setenv("AWS_ENDPOINT_URL_SAGEMAKER_RUNTIME", url)
+        asyncio.run(run())
+
+    assert sample("model_manager_invoke_duration_seconds_count", LABELS) == invokes + 1
+    assert sample("model_manager_invoke_throttles_total", LABELS) == throttles + 1
+    assert sample("model_manager_invoke_errors_total",
+                  {**LABELS, "error": "ThrottlingException"}) >= 1
+    assert sample("model_manager_in_flight_requests", LABELS) == 0
+
+
+def test_requests_are_labelled_by_route():
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/endpoint/{endpoint_name}")
+    def get_endpoint(endpoint_name: str):
+        return {"endpoint_name": endpoint_name}
+
+    client = TestClient(app)
+    for name in ("a", "b"):
+        assert client.get(f"/endpoint/{name}").status_code == 200
+    assert client.get("/nowhere").status_code == 404
+
+    assert sample("model_manager_request_duration_seconds_count",
+                  {"method": "GET", "route": "/endpoint/{endpoint_name}", "status": "200"}) == 2
+    assert sample("model_manager_request_duration_seconds_count",
+                  {"method": "GET", "route": "unmatched", "status": "404"}) == 1
+
+
+def test_metrics_are_merged_across_workers(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    record = "from src import metrics; metrics.record_cache_lookup('endpoint', 'hit')"
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", record], cwd=ROOT, env=env, check=True)
+
+    render = "from src import metrics; print(metrics.render_metrics()[0].decode())"
+    result = subprocess.run([sys.executable, "-c", render], cwd=ROOT, env=env,
+                            check=True, capture_output=True, text=True)
+    assert 'model_manager_response_cache_lookups_total{endpoint="endpoint",result="hit"} 2.0' in result.stdout
@@ -0,0 +1,54 @@
+import asyncio
+import json
+from src.config import ModelDeployment
+from src.sagemaker.batching import MicroBatcher
+from src.sagemaker.runtime import AsyncSagemakerRuntime
+from src.schemas.deployment import Deployment, Destination
+from src.schemas.model import Model, ModelSource
+from src.schemas.query import Query
+from tests.stub_endpoint import create_stub_app, run_stub_endpoint
+
+ENDPOINT_NAME = "bert-classifiers-202405011200"
+DEPLOYMENT = Deployment(destination=Destination.AWS, instance_type="ml.m5.xlarge",
+                        endpoint_name=ENDPOINT_NAME, multi_model=True)
+MODELS = [
+    Model(id="acme/bert-sentiment", source=ModelSource.Custom,
+          task="text-classification", location="s3://acme-models/bert-sentiment/model.tar.gz"),
+    Model(id="acme/bert-toxicity", source=ModelSource.Custom,
+          task="text-classification", location="s3://acme-models/bert-toxicity/model.tar.gz"),
+]
+
+
+def classify(endpoint_name, body):
+    return [{"label": "POSITIVE", "score": 0.9} for _ in json.loads(body)["inputs"]]
+
+
+def test_get_model_requires_an_id_on_multi_model_endpoints():
+    config = ModelDeployment(deployment=DEPLOYMENT, models=MODELS)
+    assert config.get_model() is None
+    assert config.get_model("acme/bert-toxicity") is MODELS[1]
+    assert config.get_model("acme/missing") is None
+    assert ModelDeployment(deployment=DEPLOYMENT, models=MODELS[:1]).get_model() is MODELS[0]
+
+
+def test_queries_are_routed_to_their_target_model(monkeypatch):
+    app = create_stub_app(handler=classify)
+    with run_stub_endpoint(app) as url:
+        monkeypatch.setenv("AWS_ENDPOINT_URL_SAGEMAKER_RUNTIME", url)
+
+        async def run():
+            runtime = AsyncSagemakerRuntime()
+            batcher = MicroBatcher(max_batch_size=8, max_wait_ms=50, runtime=runtime)
+            try:
+                return await asyncio.gather(*[
+                    batcher.query(ENDPOINT_NAME, Query(query=f"text {i}"), (DEPLOYMENT, MODELS[i % 2]))
+                    for i in range(8)])
+            finally:
+                await runtime.close()
+
+        results = asyncio.run(run())
+
+    assert len(results) == 8
+    # One batch per model on the endpoint
+    assert sorted(app.state.target_models) == [
+        "acme--bert-sentiment.tar.gz", "acme--bert-toxicity.tar.gz"]
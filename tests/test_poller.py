@@ -0,0 +1,61 @@
+import boto3
+from moto import mock_aws
+from src.sagemaker import poller
+from src.sagemaker.poller import EndpointPoller
+from tests.test_resources import create_endpoint
+
+
+@mock_aws
+def test_endpoint_poller_sweeps_statuses_in_one_listing(monkeypatch):
+    client = boto3.client("sagemaker")
+    monkeypatch.setattr(poller, "get_client", lambda service: client)
+    for i in range(3):
+        create_endpoint(client, f"endpoint-{i}")
+
+    lists = []
+    client.meta.events.register(
+        "before-call.sagemaker.ListEndpoints", lambda **kwargs: lists.append(1))
+
+    names = ["endpoint-0", "endpoint-1", "endpoint-2", "missing"]
+    statuses = EndpointPoller().statuses(names)
+    assert statuses["missing"] is None
+    assert all(statuses[name] is not None for name in names[:3])
+    assert len(lists) == 1
+
+    updates = []
+    results = EndpointPoller(initial_delay=0).wait(
+        names[:3], lambda name, status: status is not None, updates.append)
+    assert set(results) == set(names[:3])
+    assert len(updates) == 1
+
+
+def test_endpoint_poller_gives_up_at_the_timeout():
+    class NeverListed(EndpointPoller):
+        def statuses(self, endpoint_names):
+            return {endpoint_name: None for endpoint_name in endpoint_names}
+
+    assert NeverListed(initial_delay=0).wait(
+        ["missing"], lambda name, status: status is not None, timeout=0) == {}
+
+
+def test_rollouts_fail_when_their_endpoint_is_deleted(monkeypatch, tmp_path):
+    # create_model reads the role from ./.env when it's imported
+    (tmp_path / ".env").write_text("SAGEMAKER_ROLE=arn:aws:iam::123456789012:role/sagemaker\n")
+    monkeypatch.chdir(tmp_path)
+    from src.sagemaker import rollout
+    from src.schemas.deployment import Deployment, Destination
+    from src.schemas.model import Model, ModelSource
+
+    class Deleted(EndpointPoller):
+        # Listed while it's being created, then gone
+        polls = iter([{"llama": "Creating"}, {"llama": None}])
+
+        def statuses(self, endpoint_names):
+            return next(self.polls)
+
+    monkeypatch.setattr(rollout, "create_endpoint", lambda deployment, model: None)
+    deployment = Deployment(destination=Destination.AWS, instance_type="ml.g5.2xlarge", endpoint_name="llama")
+    model = Model(id="meta-llama/Llama-2-7b-hf", source=ModelSource.HuggingFace)
+    deployed, = rollout.deploy_models([(deployment, model)], poller=Deleted(initial_delay=0))
+    assert deployed.status == "Failed"
+    assert "deleted" in deployed.error
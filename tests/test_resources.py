@@ -0,0 +1,35 @@
+import boto3
+from moto import mock_aws
+from src.sagemaker import resources
+from src.sagemaker.resources import list_sagemaker_endpoints
+
+ROLE = "arn:aws:iam::123456789012:role/SageMakerRole"
+
+
+def create_endpoint(client, name):
+    client.create_model(ModelName=name, ExecutionRoleArn=ROLE,
+                        PrimaryContainer={"Image": "123456789012.dkr.ecr.us-east-1.amazonaws.com/image:latest"})
+    client.create_endpoint_config(EndpointConfigName=name, ProductionVariants=[{
+        "VariantName": "AllTraffic", "ModelName": name,
+        "InitialInstanceCount": 1, "InstanceType": "ml.m5.xlarge"}])
+    client.create_endpoint(EndpointName=name, EndpointConfigName=name)
+
+
+@mock_aws
+def test_list_sagemaker_endpoints_paginates_and_caches_configs(monkeypatch):
+    client = boto3.client("sagemaker")
+    monkeypatch.setattr(resources, "get_client", lambda service: client)
+    for i in range(120):
+        create_endpoint(client, f"endpoint-{i}")
+
+    describes = []
+    client.meta.events.register(
+        "before-call.sagemaker.DescribeEndpointConfig", lambda **kwargs: describes.append(1))
+
+    endpoints = list_sagemaker_endpoints()
+    assert len(endpoints) == 120
+    assert {endpoint["InstanceType"] for endpoint in endpoints} == {"ml.m5.xlarge"}
+    assert len(describes) == 120
+
+    assert len(list_sagemaker_endpoints("endpoint-7")) == 1
+    assert len(describes) == 120
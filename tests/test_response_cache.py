@@ -0,0 +1,72 @@
+import asyncio
+from src.sagemaker.response_cache import ResponseCache
+from src.schemas.deployment import Deployment, Destination
+from src.schemas.model import Model, ModelSource
+from src.schemas.query import Query, QueryParameters
+
+
+def config(task):
+    return (
+        Deployment(destination=Destination.AWS,
+                   instance_type="ml.m5.xlarge", endpoint_name="endpoint"),
+        Model(id="google-bert/bert-base-uncased", source=ModelSource.HuggingFace, task=task),
+    )
+
+
+def run_queries(cache, queries, task):
+    calls = []
+
+    async def fetch(request):
+        calls.append(1)
+        return {"result": len(calls)}
+
+    async def run():
+        return [await cache.get_or_query("endpoint", query, config(task), fetch) for query in queries]
+
+    return asyncio.run(run()), len(calls)
+
+
+def test_response_cache_hits_identical_queries(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite"))
+    results, calls = run_queries(
+        cache, [Query(query="hello"), Query(query="hello"), Query(query="world")], "fill-mask")
+    assert calls == 2
+    assert results[0] == results[1] != results[2]
+    assert cache.stats()["hits"] == 1
+
+    # A fresh process picks the response up from disk
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite"))
+    _, calls = run_queries(cache, [Query(query="hello")], "fill-mask")
+    assert calls == 0
+
+
+def test_response_cache_skips_sampled_generations():
+    cache = ResponseCache()
+    sampled = Query(query="hello", parameters=QueryParameters(temperature=0.9))
+    greedy = Query(query="hello", parameters=QueryParameters(temperature=0))
+
+    _, calls = run_queries(cache, [sampled, sampled], "text-generation")
+    assert calls == 2
+    _, calls = run_queries(cache, [greedy, greedy], "text-generation")
+    assert calls == 1
+    assert cache.stats()["skipped"] == 2
+
+
+def test_response_cache_coalesces_concurrent_misses():
+    cache = ResponseCache()
+    requests = []
+
+    async def fetch(request):
+        requests.append(request)
+        await asyncio.sleep(0.05)
+        return {"result": len(requests)}
+
+    async def run():
+        return await asyncio.gather(*[
+            cache.get_or_query("endpoint", Query(query="hello"), config("fill-mask"), fetch) for _ in range(5)])
+
+    results = asyncio.run(run())
+    assert len(requests) == 1 and results == [{"result": 1}] * 5
+    # fetch is handed the request the key was built from
+    assert requests[0].body == b'{"inputs": "hello"}'
+    assert cache.stats()["coalesced"] == 4
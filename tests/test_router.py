@@ -0,0 +1,55 @@
+import pytest
+from src.config import ModelDeployment
+from src.router import LatencyEWMA, LeastOutstandingRequests, RoundRobin, Router, RoutingPolicy
+from src.schemas.deployment import Deployment, Destination
+from src.schemas.model import Model, ModelSource
+
+ENDPOINTS = [
+    ModelDeployment(
+        deployment=Deployment(destination=Destination.AWS,
+                              instance_type="ml.g5.12xlarge", endpoint_name=f"llama-{i}"),
+        models=[Model(id="meta-llama/Meta-Llama-3-8B-Instruct", source=ModelSource.HuggingFace)])
+    for i in range(3)
+]
+
+
+def names(endpoints):
+    return [endpoint.deployment.endpoint_name for endpoint in endpoints]
+
+
+def test_round_robin():
+    router = Router(RoundRobin())
+    assert names(router.select(ENDPOINTS) for _ in range(4)) == [
+        "llama-0", "llama-1", "llama-2", "llama-0"]
+
+
+def test_least_outstanding_requests():
+    router = Router(LeastOutstandingRequests())
+    with router.track("llama-0"), router.track("llama-1"):
+        assert router.select(ENDPOINTS).deployment.endpoint_name == "llama-2"
+
+
+def test_latency_ewma_prefers_fast_endpoints():
+    router = Router(LatencyEWMA())
+    for name, latency in (("llama-0", 2.0), ("llama-1", 0.5), ("llama-2", 1.0)):
+        router.stats(name).latency_ewma = latency
+    assert router.select(ENDPOINTS).deployment.endpoint_name == "llama-1"
+
+
+def test_failing_endpoint_is_ejected():
+    router = Router(RoundRobin(), max_errors=2)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            with router.track("llama-0"):
+                raise RuntimeError("throttled")
+
+    assert "llama-0" not in names(router.select(ENDPOINTS) for _ in range(6))
+    assert router.stats("llama-0").in_flight == 0
+
+
+def test_policies_must_implement_choose():
+    class Incomplete(RoutingPolicy):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
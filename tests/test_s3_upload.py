@@ -0,0 +1,90 @@
+import boto3
+import os
+import pytest
+from moto import mock_aws
+from src.utils.s3_upload import ArtifactUploader
+
+BUCKET = "model-artifacts"
+MB = 1024 * 1024
+
+
+def make_uploader(client, tmp_path):
+    return ArtifactUploader(BUCKET, part_size=5 * MB, max_concurrency=4, client=client,
+                            state_path=str(tmp_path / "uploads.sqlite"), show_progress=False)
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    path = tmp_path / "model"
+    (path / "tokenizer").mkdir(parents=True)
+    (path / "model.safetensors").write_bytes(os.urandom(12 * MB))
+    (path / "config.json").write_text('{"architectures": ["BertModel"]}')
+    (path / "tokenizer" / "vocab.txt").write_text("[CLS]\n[SEP]\n")
+    return path
+
+
+@mock_aws
+def test_upload_is_content_addressed_and_skips_existing_objects(tmp_path, model_dir):
+    client = boto3.client("s3")
+    client.create_bucket(Bucket=BUCKET)
+
+    uploader = make_uploader(client, tmp_path)
+    uri = uploader.upload(str(model_dir), "models/acme/bert")
+    assert uri.startswith(f"s3://{BUCKET}/models/acme/bert/") and uri.endswith("/")
+
+    prefix = uri[len(f"s3://{BUCKET}/"):]
+    keys = {obj["Key"][len(prefix):]
+            for obj in client.list_objects_v2(Bucket=BUCKET, Prefix=prefix)["Contents"]}
+    assert keys == {"model.safetensors", "config.json", "tokenizer/vocab.txt"}
+    body = client.get_object(Bucket=BUCKET, Key=f"{prefix}model.safetensors")["Body"].read()
+    assert body == (model_dir / "model.safetensors").read_bytes()
+
+    again = make_uploader(client, tmp_path)
+    assert again.upload(str(model_dir), "models/acme/bert") == uri
+    assert again.uploaded_bytes == 0
+
+    # Changed content gets a new address instead of overwriting
+    (model_dir / "config.json").write_text('{"architectures": ["BertForMaskedLM"]}')
+    changed = make_uploader(client, tmp_path)
+    assert changed.upload(str(model_dir), "models/acme/bert") != uri
+    # Unchanged files are copied within S3
+    assert changed.uploaded_bytes == (model_dir / "config.json").stat().st_size
+
+
+@mock_aws
+def test_reused_keys_without_a_hash_are_uploaded_again(tmp_path):
+    client = boto3.client("s3")
+    client.create_bucket(Bucket=BUCKET)
+    # Same size, different content and no sha256 metadata, e.g. written by another tool
+    client.put_object(Bucket=BUCKET, Key="transform/input/shard.jsonl", Body=b'{"query": "old"}\n')
+    shard = tmp_path / "shard.jsonl"
+    shard.write_bytes(b'{"query": "new"}\n')
+
+    uploader = make_uploader(client, tmp_path)
+    uploader.upload(str(shard), "transform/input", content_addressed=False)
+    assert uploader.uploaded_bytes == shard.stat().st_size
+    body = client.get_object(Bucket=BUCKET, Key="transform/input/shard.jsonl")["Body"].read()
+    assert body == shard.read_bytes()
+
+
+@mock_aws
+def test_interrupted_multipart_upload_resumes(tmp_path, model_dir):
+    client = boto3.client("s3")
+    client.create_bucket(Bucket=BUCKET)
+    artifact = model_dir / "model.safetensors"
+
+    def fail_last_part(params, **kwargs):
+        if params["PartNumber"] == 3:
+            raise ConnectionError("connection reset")
+
+    client.meta.events.register("provide-client-params.s3.UploadPart", fail_last_part)
+    with pytest.raises(ConnectionError):
+        make_uploader(client, tmp_path).upload(str(artifact), "models/acme/bert")
+    client.meta.events.unregister("provide-client-params.s3.UploadPart", fail_last_part)
+
+    uploader = make_uploader(client, tmp_path)
+    uri = uploader.upload(str(artifact), "models/acme/bert")
+    # Only the missing part is sent again
+    assert uploader.uploaded_bytes == 2 * MB
+    key = uri[len(f"s3://{BUCKET}/"):]
+    assert client.get_object(Bucket=BUCKET, Key=key)["Body"].read() == artifact.read_bytes()
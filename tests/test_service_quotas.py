@@ -0,0 +1,42 @@
+import json
+import time
+from src.sagemaker import resources
+from src.sagemaker.resources import QuotaUsage, get_quota_cache_path, list_service_quotas
+
+
+def test_service_quotas_are_cached_on_disk_and_refreshed_when_stale(tmp_path, monkeypatch):
+    monkeypatch.setenv("MODEL_MANAGER_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(resources, "_quotas", {})
+    fetches = []
+
+    def fetch_service_quotas():
+        fetches.append(1)
+        return {
+            "endpoint": [("ml.m5.xlarge", 2), ("ml.g5.12xlarge", 1)],
+            "training": [("ml.p3.2xlarge", 1)],
+            "transform": [],
+        }
+    monkeypatch.setattr(resources, "fetch_service_quotas", fetch_service_quotas)
+
+    assert list_service_quotas() == [("ml.m5.xlarge", 2), ("ml.g5.12xlarge", 1)]
+    assert list_service_quotas(QuotaUsage.Training) == [("ml.p3.2xlarge", 1)]
+    assert len(fetches) == 1
+
+    # A new process reads the disk cache without fetching
+    monkeypatch.setattr(resources, "_quotas", {})
+    assert len(list_service_quotas()) == 2
+    assert len(fetches) == 1
+
+    # Stale entries are served immediately and refreshed in the background
+    path = get_quota_cache_path(resources.session.region_name)
+    with open(path) as cache:
+        entry = json.load(cache)
+    entry["fetched_at"] = 0
+    monkeypatch.setattr(resources, "_quotas", {
+                        resources.session.region_name: entry})
+    assert len(list_service_quotas()) == 2
+    for _ in range(100):
+        if len(fetches) == 2:
+            break
+        time.sleep(0.01)
+    assert len(fetches) == 2
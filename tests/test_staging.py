@@ -0,0 +1,49 @@
+import boto3
+import huggingface_hub
+from moto import mock_aws
+from src.huggingface import staging
+from src.huggingface.staging import stage_huggingface_model
+from src.schemas.model import Model, ModelSource
+from src.utils.s3_upload import ArtifactUploader
+from types import SimpleNamespace
+
+BUCKET = "model-artifacts"
+COMMIT = "5f1c5d2b4a3e2b1c0d9e8f7a6b5c4d3e2f1a0b9c"
+
+
+@mock_aws
+def test_revisions_are_staged_once(tmp_path, monkeypatch):
+    client = boto3.client("s3")
+    client.create_bucket(Bucket=BUCKET)
+
+    snapshot = tmp_path / "snapshot"
+    snapshot.mkdir()
+    (snapshot / "config.json").write_text('{"architectures": ["LlamaForCausalLM"]}')
+    (snapshot / "model.safetensors").write_bytes(b"weights")
+
+    files = [SimpleNamespace(rfilename=name)
+             for name in ("config.json", "model.safetensors", "pytorch_model.bin")]
+    monkeypatch.setattr(staging, "get_hf_api", lambda: SimpleNamespace(
+        model_info=lambda model_id, revision, token: SimpleNamespace(sha=COMMIT, siblings=files)))
+    downloads = []
+
+    def snapshot_download(repo_id, revision, ignore_patterns, **kwargs):
+        downloads.append((repo_id, revision, ignore_patterns))
+        return str(snapshot)
+    monkeypatch.setattr(huggingface_hub, "snapshot_download", snapshot_download)
+
+    model = Model(id="acme/llama-8b", source=ModelSource.HuggingFace, revision="v1.0", stage=True)
+    uploader = ArtifactUploader(BUCKET, client=client, state_path=str(tmp_path / "uploads.sqlite"),
+                                show_progress=False)
+    s3_path = stage_huggingface_model(model, BUCKET, uploader, client)
+
+    assert s3_path == f"s3://{BUCKET}/huggingface/acme/llama-8b/{COMMIT}/"
+    assert downloads[0][1] == COMMIT
+    assert "*.bin" in downloads[0][2]
+    body = client.get_object(Bucket=BUCKET, Key=f"huggingface/acme/llama-8b/{COMMIT}/model.safetensors")["Body"]
+    assert body.read() == b"weights"
+
+    # Another tag pointing at the same commit skips the download
+    model.revision = "main"
+    assert stage_huggingface_model(model, BUCKET, uploader, client) == s3_path
+    assert len(downloads) == 1
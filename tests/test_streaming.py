@@ -0,0 +1,54 @@
+import asyncio
+import json
+import src.sagemaker.streaming as streaming
+from src.sagemaker.runtime import close_async_runtime
+from src.sagemaker.streaming import stream_chat_completion
+from src.schemas.deployment import Deployment, Destination
+from src.schemas.model import Model, ModelSource
+from src.schemas.query import ChatMessage
+from tests.stub_endpoint import create_stub_app, run_stub_endpoint
+
+ENDPOINT_NAME = "meta-llama--Meta-Llama-3-8B-Instruct-202405101200"
+CONFIG = (
+    Deployment(destination=Destination.AWS,
+               instance_type="ml.g5.12xlarge", endpoint_name=ENDPOINT_NAME),
+    Model(id="meta-llama/Meta-Llama-3-8B-Instruct",
+          source=ModelSource.HuggingFace, task="text-generation"),
+)
+
+
+def tgi_stream(endpoint_name, body):
+    assert json.loads(body)["stream"] is True
+    events = [
+        {"token": {"id": 1, "text": "Hello", "special": False}},
+        {"token": {"id": 2, "text": " world", "special": False}},
+        {"token": {"id": 3, "text": "</s>", "special": True},
+         "generated_text": "Hello world", "details": {"finish_reason": "eos_token"}},
+    ]
+    data = b"".join(
+        b"data:" + json.dumps(event).encode("utf-8") + b"\n\n" for event in events)
+    # Split events across payload parts like SageMaker does
+    return [data[i:i + 7] for i in range(0, len(data), 7)]
+
+
+def test_stream_chat_completion(monkeypatch):
+    monkeypatch.setattr(streaming, "get_prompt_factory", lambda: None)
+    with run_stub_endpoint(create_stub_app(stream_handler=tgi_stream)) as url:
+        monkeypatch.setenv("AWS_ENDPOINT_URL_SAGEMAKER_RUNTIME", url)
+
+        async def run():
+            try:
+                messages = [ChatMessage(role="user", content="Say hello")]
+                return [event async for event in stream_chat_completion(ENDPOINT_NAME, CONFIG, messages)]
+            finally:
+                await close_async_runtime()
+
+        events = asyncio.run(run())
+
+    assert events[-1] == "data: [DONE]\n\n"
+    chunks = [json.loads(event.removeprefix("data: ")) for event in events[:-1]]
+    assert {chunk["object"] for chunk in chunks} == {"chat.completion.chunk"}
+    assert chunks[0]["choices"][0]["delta"]["role"] == "assistant"
+    assert "".join(chunk["choices"][0]["delta"].get("content", "")
+                   for chunk in chunks) == "Hello world"
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
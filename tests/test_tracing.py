@@ -0,0 +1,143 @@
+import asyncio
+import httpx
+import json
+import pytest
+from fastapi import FastAPI
+from src.config import get_config_for_endpoint
+from src.sagemaker.query_endpoint import build_query_request, make_query_request_async
+from src.sagemaker.response_cache import ResponseCache
+from src.sagemaker.runtime import close_async_runtime
+from src.schemas.deployment import Deployment, Destination
+from src.schemas.model import Model, ModelSource
+from src.schemas.query import Query
+from src.tracing import TracingMiddleware
+from tests.stub_endpoint import create_stub_app, run_stub_endpoint
+
+pytest.importorskip("opentelemetry.sdk")
+from opentelemetry import trace  # noqa: E402
+from opentelemetry.sdk.trace import TracerProvider  # noqa: E402
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor  # noqa: E402
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter  # noqa: E402
+
+ENDPOINT_NAME = "huggingface-tc-bert-base-cased-202403291810"
+CONFIG = (
+    Deployment(destination=Destination.AWS,
+               instance_type="ml.m5.xlarge", endpoint_name=ENDPOINT_NAME),
+    Model(id="huggingface-tc-bert-base-cased",
+          source=ModelSource.Sagemaker, task="tc"),
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+TRACEPARENT = f"00-{TRACE_ID}-00f067aa0ba902b7-01"
+
+
+@pytest.fixture(scope="module")
+def exporter():
+    # The global provider can only be set once per process
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    return exporter
+
+
+def test_query_spans_continue_the_callers_trace(exporter, monkeypatch):
+    exporter.clear()
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.post("/endpoint/{endpoint_name}/query")
+    async def query(endpoint_name: str):
+        return await make_query_request_async(endpoint_name, Query(query="hello world"), CONFIG)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.post(f"/endpoint/{ENDPOINT_NAME}/query", headers={"traceparent": TRACEPARENT})
+        finally:
+            await close_async_runtime()
+
+    stub = create_stub_app()
+    with run_stub_endpoint(stub) as url:
+        monkeypatch.setenv("AWS_ENDPOINT_URL_SAGEMAKER_RUNTIME", url)
+        response = asyncio.run(run())
+
+    assert response.status_code == 200
+    assert TRACE_ID in response.headers["traceparent"]
+    # The model container gets the trace in CustomAttributes
+    assert TRACE_ID in stub.state.custom_attributes[0]
+
+    # Only this package's spans, FastAPI and the in-process stub endpoint add their own
+    spans = {span.name: span for span in exporter.get_finished_spans()
+             if span.instrumentation_scope.name == "model_manager"}
+    assert set(spans) == {"build_query_request", "invoke_endpoint", "parse_response",
+                          "POST /endpoint/{endpoint_name}/query"}
+    assert all(format(span.context.trace_id, "032x") == TRACE_ID for span in spans.values())
+
+    server = spans["POST /endpoint/{endpoint_name}/query"]
+    invoke = spans["invoke_endpoint"]
+    assert invoke.parent.span_id == server.context.span_id
+    assert invoke.kind == trace.SpanKind.CLIENT
+    assert invoke.attributes["model_manager.endpoint"] == ENDPOINT_NAME
+    assert invoke.attributes["model_manager.retries"] == 0
+    assert spans["build_query_request"].attributes["model_manager.task"] == "tc"
+    assert spans["build_query_request"].attributes["model_manager.payload_bytes"] == \
+        invoke.attributes["model_manager.payload_bytes"]
+    assert server.attributes["http.response.status_code"] == 200
+
+
+def test_traced_generations_record_token_usage(exporter, monkeypatch):
+    exporter.clear()
+    config = (Deployment(destination=Destination.AWS, instance_type="ml.g5.2xlarge", endpoint_name="llama"),
+              Model(id="meta-llama/Llama-2-7b-hf", source=ModelSource.HuggingFace, task="text-generation"))
+    parameters = []
+
+    def generate(endpoint_name, body):
+        parameters.append(json.loads(body)["parameters"])
+        details = {"generated_tokens": 3, "prefill": [{"id": 1}, {"id": 22172}, {"id": 3186}]}
+        return [{"generated_text": "Once upon a time", "details": details}]
+
+    async def run():
+        try:
+            return await make_query_request_async("llama", Query(query="hello world"), config)
+        finally:
+            await close_async_runtime()
+
+    with run_stub_endpoint(create_stub_app(handler=generate)) as url:
+        monkeypatch.setenv("AWS_ENDPOINT_URL_SAGEMAKER_RUNTIME", url)
+        result = asyncio.run(run())
+
+    assert parameters[0]["details"] is True and parameters[0]["decoder_input_details"] is True
+    # The details were only asked for the trace, the caller gets the plain generation
+    assert result == [{"generated_text": "Once upon a time"}]
+    span, = [span for span in exporter.get_finished_spans() if span.name == "parse_response"]
+    assert span.attributes["gen_ai.usage.input_tokens"] == 3
+    assert span.attributes["gen_ai.usage.output_tokens"] == 3
+
+
+def test_only_tgi_requests_ask_for_token_details(exporter):
+    deployment = Deployment(destination=Destination.AWS, instance_type="ml.g5.2xlarge", endpoint_name="llama")
+    tgi = Model(id="meta-llama/Llama-2-7b-hf", source=ModelSource.HuggingFace, task="text-generation")
+    custom = Model(id="gpt2-finetuned", source=ModelSource.Custom, task="text-generation", location="./gpt2")
+    query = Query(query="hello world")
+
+    traced = build_query_request("llama", query, (deployment, tgi))
+    assert json.loads(traced.body)["parameters"]["details"] is True
+    # Traced and untraced requests share cache entries
+    untraced = traced._replace(body=traced.untraced_body, untraced_body=None)
+    assert ResponseCache.key("llama", traced) == ResponseCache.key("llama", untraced)
+
+    # The plain Hugging Face inference container rejects unknown generate kwargs
+    request = build_query_request("llama", query, (deployment, custom))
+    assert "details" not in json.loads(request.body)["parameters"] and request.untraced_body is None
+
+
+def test_config_lookups_are_traced(exporter, tmp_path):
+    exporter.clear()
+    assert get_config_for_endpoint("missing", path=str(tmp_path / "*.yaml")) is None
+
+    span, = exporter.get_finished_spans()
+    assert span.name == "get_config_for_endpoint"
+    assert span.attributes["model_manager.endpoint"] == "missing"
+    assert span.attributes["model_manager.found"] is False
@@ -0,0 +1,57 @@
+import boto3
+import json
+from moto import mock_aws
+from src.huggingface import HuggingFaceTask
+from src.sagemaker.batch_query import read_records
+from src.sagemaker.batching import BATCH_CODECS
+from src.sagemaker.transform import get_max_concurrent_transforms, get_shard_name, join_outputs, write_shards
+from src.schemas.deployment import Deployment, Destination
+
+BUCKET = "transform-jobs"
+OUTPUT_PREFIX = "transform/job/output/"
+CODEC = BATCH_CODECS[HuggingFaceTask.TextClassification]
+NUM_RECORDS = 250
+
+
+def classify(body: bytes) -> bytes:
+    """ What the container returns for one line of a shard """
+    return json.dumps([{"label": text, "score": 0.5} for text in json.loads(body)["inputs"]]).encode("utf-8")
+
+
+@mock_aws
+def test_shards_are_batched_and_joined_in_input_order(tmp_path):
+    input_path = tmp_path / "input.jsonl"
+    input_path.write_text("".join(json.dumps({"query": f"text {i}"}) + "\n" for i in range(NUM_RECORDS)))
+    shard_dir = tmp_path / "shards"
+    shard_dir.mkdir()
+
+    shards = write_shards(read_records(str(input_path)), CODEC, str(shard_dir), NUM_RECORDS,
+                          min_shards=2, batch_size=32)
+    assert [sum(len(ids) for ids in batches) for batches in shards.batch_ids] == [125, 125]
+    assert max(len(ids) for batches in shards.batch_ids for ids in batches) == 32
+
+    # Batch Transform writes <input file>.out with one line per input line
+    client = boto3.client("s3")
+    client.create_bucket(Bucket=BUCKET)
+    for index in range(len(shards.batch_ids)):
+        lines = (shard_dir / get_shard_name(index)).read_bytes().splitlines()
+        client.put_object(Bucket=BUCKET, Key=f"{OUTPUT_PREFIX}{get_shard_name(index)}.out",
+                          Body=b"\n".join(classify(line) for line in lines))
+
+    output_path = tmp_path / "output.jsonl"
+    assert join_outputs(BUCKET, OUTPUT_PREFIX, shards, CODEC, str(output_path), client) == NUM_RECORDS
+    lines = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert lines[0] == {"id": 0, "response": [{"label": "text 0", "score": 0.5}]}
+    assert [line["response"][0]["label"] for line in lines] == [f"text {i}" for i in range(NUM_RECORDS)]
+
+
+def test_max_concurrent_transforms_matches_model_server_workers():
+    def deployment(instance_type, num_gpus=None):
+        return Deployment(destination=Destination.AWS, instance_type=instance_type, num_gpus=num_gpus)
+    assert get_max_concurrent_transforms(deployment("ml.m5.xlarge")) == 4
+    assert get_max_concurrent_transforms(deployment("ml.c5.4xlarge")) == 16
+    assert get_max_concurrent_transforms(deployment("ml.g5.12xlarge", num_gpus=4)) == 4
+    assert get_max_concurrent_transforms(deployment("ml.p3.2xlarge")) == 1
+    # Concurrency times the payload limit has to stay within 100 MB
+    assert get_max_concurrent_transforms(deployment("ml.m5.24xlarge"), max_payload_mb=6) == 16
+    assert get_max_concurrent_transforms(deployment("ml.m5.xlarge"), max_payload_mb=100) == 1